@@ -154,7 +154,17 @@ def main(global_config, **settings):
 
     config.scan(ignore='.tests')
     config.include('cnxarchive.events.main')
+    config.include('cnxarchive.pool.main')
+    config.include('cnxarchive.replicas.main')
+    config.include('cnxarchive.database.main')
+    config.include('cnxarchive.invalidation.main')
+    config.include('cnxarchive.health.main')
+    config.include('cnxarchive.compression.main')
+    config.include('cnxarchive.cache.main')
+    config.include('cnxarchive.response_cache.main')
 
     config.add_tween('cnxarchive.tweens.conditional_http_tween_factory')
+    config.add_tween('cnxarchive.tweens.replica_fallback_tween_factory')
+    config.add_tween('cnxarchive.tweens.response_cache_tween_factory')
 
     return config.make_wsgi_app()
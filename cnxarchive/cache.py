@@ -5,16 +5,368 @@
 # Public License version 3 (AGPLv3).
 # See LICENCE.txt for details.
 # ###
-"""Memcached utilities."""
+"""Caching of search results in memcached, redis and/or in process."""
 
 import binascii
-import copy
 import hashlib
+import logging
+import threading
+import time
+
+try:
+    import cPickle as pickle
+except ImportError:  # pragma: no cover
+    import pickle
 
 import memcache
 from pyramid.threadlocal import get_current_registry
 
-from .search import search as database_search
+from . import config
+from .search import fetch_records, search as database_search
+from .utils import LRUCache
+
+try:
+    import redis
+except ImportError:  # pragma: no cover
+    redis = None
+
+
+__all__ = (
+    'MemcachedBackend',
+    'MemoryBackend',
+    'RedisBackend',
+    'TieredBackend',
+    'search_cache_from_settings',
+    )
+
+
+logger = logging.getLogger('cnxarchive')
+
+MEMORY = 'memory'
+MEMCACHED = 'memcached'
+REDIS = 'redis'
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024  # bytes
+# The most seconds an entry found in a later tier is kept in the earlier
+# tiers, since how long it has left in the later tier isn't known.
+REFILL_EXPIRATION = 60
+# The number of seconds stale search results may be served while they
+# are being searched again
+DEFAULT_MAX_STALE = 600
+# The most seconds a search is expected to take. Until then, other
+# workers wait for the worker that holds the lock to cache its result.
+LOCK_EXPIRATION = 30
+LOCK_POLL_INTERVAL = 0.1  # seconds
+
+
+class MemoryBackend(object):
+    """Keeps values in a least recently used cache in the process,
+    bounded by the total ``sizeof`` the values.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE, sizeof=len):
+        self.sizeof = sizeof
+        self._cache = LRUCache(max_size)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        item = self._cache.get(key)
+        if item is None:
+            return None
+        expires, value = item
+        if expires is not None and expires < time.time():
+            self._cache.delete(key)
+            return None
+        return value
+
+    def set(self, key, value, expire):
+        # Like memcached, an ``expire`` of 0 means never
+        expires = expire and time.time() + expire or None
+        self._cache.set(key, (expires, value,), size=self.sizeof(value))
+
+    def add(self, key, value, expire):
+        """Set the ``value`` unless there is one; tell whether it was set."""
+        with self._lock:
+            if self.get(key) is not None:
+                return False
+            self.set(key, value, expire)
+            return True
+
+    def delete(self, key):
+        self._cache.delete(key)
+
+
+class PickledMemoryBackend(MemoryBackend):
+    """A ``MemoryBackend`` that keeps values pickled, so that they are
+    measured by their pickled size and never shared between callers.
+    """
+
+    def get(self, key):
+        value = super(PickledMemoryBackend, self).get(key)
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, expire):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        super(PickledMemoryBackend, self).set(key, value, expire)
+
+    def add(self, key, value, expire):
+        with self._lock:
+            if MemoryBackend.get(self, key) is not None:
+                return False
+            self.set(key, value, expire)
+            return True
+
+
+class MemcachedBackend(object):
+    """Keeps values in the memcached ``servers``.
+
+    The client is made once; it keeps a connection to each server open
+    per thread.
+    """
+
+    def __init__(self, servers):
+        self._client = memcache.Client(
+            servers, server_max_value_length=128*1024*1024, debug=0,
+            pickleProtocol=pickle.HIGHEST_PROTOCOL)
+
+    def get(self, key):
+        return self._client.get(key)
+
+    def set(self, key, value, expire):
+        self._client.set(key, value, time=expire,
+                         min_compress_len=1024*1024)  # compress when > 1MB
+
+    def add(self, key, value, expire):
+        return bool(self._client.add(key, value, time=expire))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+class RedisBackend(object):
+    """Keeps values in the redis server at ``url``, through a pool of
+    connections.
+    """
+
+    def __init__(self, url):
+        if redis is None:
+            raise ValueError('the redis search cache requires the redis '
+                             'package')
+        self._client = redis.StrictRedis.from_url(url)
+
+    def get(self, key):
+        value = self._client.get(key)
+        if value is None:
+            return None
+        return pickle.loads(value)
+
+    def set(self, key, value, expire):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        self._client.set(key, value, ex=expire or None)
+
+    def add(self, key, value, expire):
+        value = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        return bool(self._client.set(key, value, ex=expire or None, nx=True))
+
+    def delete(self, key):
+        self._client.delete(key)
+
+
+class TieredBackend(object):
+    """Keeps values in each of the ``backends``, looked up in order.
+
+    A value found in a later backend (e.g. memcached) is put back in the
+    earlier ones (e.g. in process), for at most ``REFILL_EXPIRATION``
+    seconds.
+    """
+
+    def __init__(self, backends):
+        self.backends = tuple(backends)
+
+    def get(self, key):
+        for i, backend in enumerate(self.backends):
+            value = backend.get(key)
+            if value is not None:
+                for earlier in self.backends[:i]:
+                    earlier.set(key, value, REFILL_EXPIRATION)
+                return value
+        return None
+
+    def set(self, key, value, expire):
+        for backend in self.backends:
+            backend.set(key, value, expire)
+
+    def add(self, key, value, expire):
+        # The last backend is the one shared the most widely
+        return self.backends[-1].add(key, value, expire)
+
+    def delete(self, key):
+        for backend in self.backends:
+            backend.delete(key)
+
+
+def _backend_from_settings(name, settings):
+    if name == MEMORY:
+        return PickledMemoryBackend(int(settings.get(
+            config.SEARCH_CACHE_MAX_SIZE, DEFAULT_MAX_SIZE)))
+    elif name == MEMCACHED:
+        return MemcachedBackend(settings['memcache-servers'].split())
+    elif name == REDIS:
+        return RedisBackend(settings[config.SEARCH_CACHE_REDIS_URL])
+    raise ValueError("unknown search cache '{}'".format(name))
+
+
+def search_cache_from_settings(settings):
+    """Create the search cache backend from the application ``settings``.
+
+    The ``search-cache`` setting lists the backends, looked up in order.
+    Without it, memcached is used when there are ``memcache-servers``.
+    Returns None when there is no backend.
+    """
+    names = settings.get(config.SEARCH_CACHE)
+    if names is None:
+        names = settings.get('memcache-servers', '').split() and MEMCACHED
+    names = (names or '').split()
+    backends = [_backend_from_settings(name, settings) for name in names]
+    if not backends:
+        return None
+    elif len(backends) == 1:
+        return backends[0]
+    return TieredBackend(backends)
+
+
+def get_search_cache():
+    """Return the search cache backend, or None when disabled."""
+    registry = get_current_registry()
+    try:
+        return registry.search_cache
+    except AttributeError:
+        # Not set up by ``main`` (e.g. with a test configuration)
+        registry.search_cache = search_cache_from_settings(registry.settings)
+        return registry.search_cache
+
+
+def _digest(key):
+    # Short enough for memcached's key length limit (250)
+    return binascii.hexlify(hashlib.sha1(key).digest())
+
+
+class _Flight(object):
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.failed = False
+        self.value = None
+
+
+class SingleFlight(object):
+    """Runs one computation of a key at a time in the process."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # {key: _Flight}
+        self._flights = {}
+
+    def run(self, key, compute, wait=True):
+        """Return what ``compute`` returns, unless it's already running
+        for ``key``. Then wait for and return the result of that run,
+        or return None without waiting if not to ``wait``.
+        """
+        with self._lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            if not wait:
+                return None
+            flight.done.wait(LOCK_EXPIRATION)
+            if flight.done.is_set() and not flight.failed:
+                return flight.value
+            # The first run failed or is taking too long
+            return compute()
+        try:
+            flight.value = compute()
+        except Exception:
+            flight.failed = True
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+            flight.done.set()
+        return flight.value
+
+
+_flights = SingleFlight()
+
+
+def _store(cache, key, value, expire, max_stale):
+    # The backend keeps the value past its (soft) expiration, so that it
+    # can be served stale while it's being computed again.
+    if expire:
+        cache.set(key, (time.time() + expire, value,), expire + max_stale)
+    else:
+        cache.set(key, (None, value,), 0)
+
+
+def _cached(cache, key, compute, expire, nocache=False):
+    """Return the value cached under ``key`` or, when it's missing,
+    what ``compute`` returns, after caching it for ``expire`` seconds.
+
+    Concurrent misses are computed once per process. Across processes,
+    the first one to miss locks the key (for up to ``LOCK_EXPIRATION``
+    seconds) and the others wait for its result. Once expired, the value
+    is served stale (for up to ``search-cache-max-stale`` seconds) while
+    the process that locks the key computes it again.
+    """
+    settings = get_current_registry().settings
+    max_stale = int(settings.get(config.SEARCH_CACHE_MAX_STALE,
+                                 DEFAULT_MAX_STALE))
+    lock_key = key + ':lock'
+
+    def refresh():
+        try:
+            value = compute()
+            _store(cache, key, value, expire, max_stale)
+            return value
+        finally:
+            cache.delete(lock_key)
+
+    if nocache:
+        value = compute()
+        _store(cache, key, value, expire, max_stale)
+        return value
+
+    entry = cache.get(key)
+    if entry is not None:
+        fresh_until, value = entry
+        if fresh_until is None or time.time() < fresh_until:
+            return value
+
+        def revalidate():
+            if not cache.add(lock_key, 1, LOCK_EXPIRATION):
+                return None
+            return refresh()
+
+        return _flights.run(key, revalidate, wait=False) or value
+
+    def fill():
+        if cache.add(lock_key, 1, LOCK_EXPIRATION):
+            return refresh()
+        # Another process is computing the value
+        for i in range(int(LOCK_EXPIRATION / LOCK_POLL_INTERVAL)):
+            time.sleep(LOCK_POLL_INTERVAL)
+            entry = cache.get(key)
+            if entry is not None:
+                return entry[1]
+        logger.warning("Gave up waiting for the search cache key '{}'"
+                       .format(key))
+        value = compute()
+        _store(cache, key, value, expire, max_stale)
+        return value
+
+    return _flights.run(key, fill)
 
 
 def search(query, query_type, nocache=False):
@@ -24,56 +376,89 @@ def search(query, query_type, nocache=False):
     do a database search and cache the result
     """
     settings = get_current_registry().settings
-    memcache_servers = settings['memcache-servers'].split()
-    if not memcache_servers:
-        # memcache is not enabled, do a database search directly
+    cache = get_search_cache()
+    if cache is None:
+        # caching is not enabled, do a database search directly
         return database_search(query, query_type)
 
-    # sort query params and create a key for the search
-    search_params = []
-    search_params += copy.deepcopy(query.terms)
-    search_params += copy.deepcopy(query.filters)
-    search_params += [('sort', i) for i in query.sorts]
-    search_params.sort(key=lambda record: (record[0], record[1]))
+    # create a key for the search from its canonical form, shared by the
+    # equivalent queries
+    canonical_query = query.canonical()
+    search_params = (canonical_query.terms + canonical_query.filters +
+                     [('sort', i) for i in canonical_query.sorts])
     search_params.append(('query_type', query_type))
 
     # search_key should look something like:
-    # '"sort:pubDate" "text:college physics" "query_type:weakAND"'
+    # '"text:college physics" "sort:pubdate" "query_type:weakAND"'
     search_key = u' '.join([u'"{}"'.format(u':'.join(param))
                            for param in search_params])
-    # hash the search_key so it never exceeds the key length limit (250) in
-    # memcache
-    mc_search_key = binascii.hexlify(
-        hashlib.pbkdf2_hmac('sha1', search_key.encode('utf-8'), b'', 1))
+    cache_key = _digest(search_key.encode('utf-8'))
 
-    # look for search results in memcache first, unless nocache
-    mc = memcache.Client(memcache_servers,
-                         server_max_value_length=128*1024*1024, debug=0)
+    cache_length = int(settings['search-cache-expiration'])
 
-    if not nocache:
-        search_results = mc.get(mc_search_key)
-    else:
-        search_results = None
-
-    if not search_results:
-        # search results is not in memcache, do a database search
-        search_results = database_search(query, query_type)
-
-        cache_length = int(settings['search-cache-expiration'])
-
-        # for particular searches, store in memcache for longer
-        if (len(search_params) == 2 and
-                # search by subject
-                search_params[0][0] == 'subject' or
-                # search single terms
-                search_params[0][0] == 'text' and
-                                       ' ' not in search_params[0][1]):
-                # search with one term or one filter, plus query_type
-            cache_length = int(settings['search-long-cache-expiration'])
-
-        # store in memcache
-        mc.set(mc_search_key, search_results, time=cache_length,
-               min_compress_len=1024*1024)  # compress when > 1MB
-
-    # return search results
-    return search_results
+    # for particular searches, store in cache for longer
+    if (len(search_params) == 2 and
+            # search by subject
+            search_params[0][0] == 'subject' or
+            # search single terms
+            search_params[0][0] == 'text' and
+                                   ' ' not in search_params[0][1]):
+            # search with one term or one filter, plus query_type
+        cache_length = int(settings['search-long-cache-expiration'])
+
+    # look for search results in cache first, unless nocache,
+    # otherwise do a database search and cache the results
+    return _cached(cache, cache_key,
+                   lambda: database_search(query, query_type),
+                   cache_length, nocache=nocache)
+
+
+def search_page(results, start, stop, nocache=False):
+    """Return the records of the search ``results`` from ``start`` to
+    ``stop``.
+
+    Look up the records in cache, if not in cache, fetch them from the
+    database and cache them. They are cached apart from the results,
+    by the matches they are the records of, so a page is never out of
+    step with the results it's from.
+    """
+    hits = results.hits[start:stop]
+    settings = get_current_registry().settings
+    cache = get_search_cache()
+    if cache is None or not hits:
+        # caching is not enabled, fetch the records directly
+        return fetch_records(hits, results.arguments)
+
+    # The records' highlights depend on the search terms
+    cache_key = _digest(repr((hits, sorted(results.arguments.items()),)))
+    cache_length = int(settings['search-cache-expiration'])
+    return _cached(cache, cache_key,
+                   lambda: fetch_records(hits, results.arguments),
+                   cache_length, nocache=nocache)
+
+
+def search_facets(results, nocache=False):
+    """Count the search ``results`` by facet (see ``QueryResults.facets``).
+
+    Look up the counts in cache, if not in cache, count them in the
+    database and cache them. Like pages, they are cached by the matches
+    they count.
+    """
+    settings = get_current_registry().settings
+    cache = get_search_cache()
+    if cache is None or not results.hits:
+        # caching is not enabled, count in the database directly
+        return results.facets
+
+    cache_key = _digest(repr(('facets', results.hits,)))
+    cache_length = int(settings['search-cache-expiration'])
+    facets = _cached(cache, cache_key, lambda: results.facets,
+                     cache_length, nocache=nocache)
+    results.facets = facets
+    return facets
+
+
+def main(config):
+    """Attach the search cache backend to the application registry."""
+    registry = config.registry
+    registry.search_cache = search_cache_from_settings(registry.settings)
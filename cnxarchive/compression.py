@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Precompressed (gzip and, when available, brotli) response bodies."""
+import gzip
+import hashlib
+import io
+
+from pyramid.threadlocal import get_current_registry
+from webob.acceptparse import create_accept_encoding_header
+
+from . import config
+from .utils import DirectoryStore
+
+try:
+    import brotli
+except ImportError:  # pragma: no cover
+    brotli = None
+
+
+__all__ = (
+    'CompressedCache',
+    'compress',
+    'compress_response',
+    'compressed_cache_from_settings',
+    'is_compressible',
+    'negotiate_encoding',
+    )
+
+
+GZIP = 'gzip'
+BROTLI = 'br'
+# In order of preference
+ENCODINGS = (GZIP,) if brotli is None else (BROTLI, GZIP,)
+# Smaller bodies aren't worth compressing
+MIN_SIZE = 1024  # bytes
+COMPRESSIBLE_MIMETYPES = (
+    'application/javascript',
+    'application/json',
+    'application/mathml+xml',
+    'application/xhtml+xml',
+    'application/xml',
+    'image/svg+xml',
+    )
+# Bodies are compressed while the request waits, so these trade a little
+# size for much less time than the highest levels.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+# The size of the compressed cache directory
+DEFAULT_MAX_SIZE = 256 * 1024 * 1024  # bytes
+
+
+def is_compressible(mimetype):
+    """Tell whether content of the ``mimetype`` compresses well."""
+    mimetype = (mimetype or '').split(';')[0].strip().lower()
+    return mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def negotiate_encoding(request):
+    """Return the preferred encoding the client accepts, or None."""
+    accept_encoding = request.headers.get('Accept-Encoding')
+    if not accept_encoding:
+        return None
+    header = create_accept_encoding_header(accept_encoding)
+    offers = header.acceptable_offers(ENCODINGS)
+    return offers and offers[0][0] or None
+
+
+def compress(data, encoding):
+    """Compress ``data`` with ``encoding`` at a moderate level."""
+    if encoding == GZIP:
+        buf = io.BytesIO()
+        # A fixed mtime makes the output depend only on the data.
+        with gzip.GzipFile(fileobj=buf, mode='wb', compresslevel=GZIP_LEVEL,
+                           mtime=0) as f:
+            f.write(data)
+        return buf.getvalue()
+    elif encoding == BROTLI and brotli is not None:
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    raise ValueError("unsupported encoding '{}'".format(encoding))
+
+
+class CompressedCache(object):
+    """Keeps compressed data in files under the private ``directory``,
+    taking up to about ``max_size`` bytes, so that every worker process
+    shares the work of compressing.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.store = DirectoryStore(directory, max_size)
+
+    @property
+    def directory(self):
+        return self.store.directory
+
+    def _key(self, key, encoding):
+        digest = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return '{}.{}'.format(digest, encoding)
+
+    def get(self, key, encoding):
+        return self.store.get(self._key(key, encoding))
+
+    def set(self, key, encoding, data):
+        self.store.set(self._key(key, encoding), data)
+
+
+def _get_compressed(key, encoding, data):
+    """Return ``data`` compressed with ``encoding``, looked up with
+    ``key`` in the compressed cache, or the content cache when there's
+    no compressed cache, if the ``key`` is given.
+    """
+    if key is None:
+        return compress(data, encoding)
+    registry = get_current_registry()
+    cache = getattr(registry, 'compressed_cache', None)
+    if cache is not None:
+        compressed = cache.get(key, encoding)
+        if compressed is None:
+            compressed = compress(data, encoding)
+            cache.set(key, encoding, compressed)
+        return compressed
+    cache = getattr(registry, 'content_cache', None)
+    if cache is None:
+        return compress(data, encoding)
+    cache_key = ('compressed', key, encoding,)
+    compressed = cache.get(cache_key)
+    if compressed is None:
+        compressed = compress(data, encoding)
+        cache.set(cache_key, compressed)
+    return compressed
+
+
+def compress_response(response, encoding, key=None):
+    """Compress the buffered body of ``response`` with ``encoding``
+    when its content compresses well.
+
+    The compressed body is kept under ``key``, which must identify the
+    (immutable) body. Without a ``key`` the body is compressed every time.
+    """
+    if not is_compressible(response.content_type):
+        return
+    vary = tuple(response.vary or ())
+    if 'Accept-Encoding' not in vary:
+        response.vary = vary + ('Accept-Encoding',)
+    if encoding is None or response.content_encoding:
+        return
+    body = response.body
+    if len(body) < MIN_SIZE:
+        return
+    response.body = _get_compressed(key, encoding, body)
+    response.content_encoding = encoding
+
+
+def compressed_cache_from_settings(settings):
+    """Create a ``CompressedCache`` from the application ``settings``.
+
+    Returns None when no directory is configured, in which case
+    compressed data is kept in the content cache.
+    """
+    directory = settings.get(config.COMPRESSED_CACHE_DIRECTORY)
+    if not directory:
+        return None
+    max_size = int(settings.get(config.COMPRESSED_CACHE_MAX_SIZE,
+                                DEFAULT_MAX_SIZE))
+    return CompressedCache(directory, max_size)
+
+
+def main(config):
+    """Attach the compressed cache to the application registry."""
+    registry = config.registry
+    registry.compressed_cache = compressed_cache_from_settings(
+        registry.settings)
@@ -12,6 +12,35 @@ import os.path
 
 # Configuration keys
 CONNECTION_STRING = 'db-connection-string'
+POOL_MIN_SIZE = 'db-pool-min-size'
+POOL_MAX_SIZE = 'db-pool-max-size'
+POOL_MAX_AGE = 'db-pool-max-age'
+POOL_MAX_IDLE = 'db-pool-max-idle'
+POOL_TIMEOUT = 'db-pool-timeout'
+POOL_PRE_PING = 'db-pool-pre-ping'
+PREPARED_STATEMENTS = 'db-prepared-statements'
+REPLICA_CONNECTION_STRINGS = 'db-replica-connection-strings'
+REPLICA_SELECTION = 'db-replica-selection'
+REPLICA_MAX_LAG = 'db-replica-max-lag'
+REPLICA_LAG_CHECK_INTERVAL = 'db-replica-lag-check-interval'
+CONTENT_CACHE_MAX_SIZE = 'content-cache-max-size'
+CACHE_INVALIDATION = 'cache-invalidation'
+RESOURCE_CHUNK_SIZE = 'resource-chunk-size'
+EXPORTS_OFFLOAD = 'exports-offload'
+EXPORTS_CHECK_INTERVAL = 'exports-check-interval'
+EXPORTS_CHECK_TIMEOUT = 'exports-check-timeout'
+EXPORTS_INDEX = 'exports-index'
+COMPRESSED_CACHE_DIRECTORY = 'compressed-cache-directory'
+COMPRESSED_CACHE_MAX_SIZE = 'compressed-cache-max-size'
+RESPONSE_CACHE = 'response-cache'
+RESPONSE_CACHE_MAX_SIZE = 'response-cache-max-size'
+RESPONSE_CACHE_DIRECTORY = 'response-cache-directory'
+RESPONSE_CACHE_ROUTES = 'response-cache-routes'
+EXPORTS_OFFLOAD_PREFIX = 'exports-offload-prefix'
+SEARCH_CACHE = 'search-cache'
+SEARCH_CACHE_MAX_SIZE = 'search-cache-max-size'
+SEARCH_CACHE_REDIS_URL = 'search-cache-redis-url'
+SEARCH_CACHE_MAX_STALE = 'search-cache-max-stale'
 
 # Data directory and test data location
 here = os.path.abspath(os.path.dirname(__file__))
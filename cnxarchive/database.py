@@ -9,11 +9,20 @@
 import contextlib
 import os
 import json
+import re
+import sys
+import weakref
 import psycopg2
+import psycopg2.errorcodes
+import psycopg2.extensions
+import psycopg2.extras
 import logging
 
 import cnxdb
-from pyramid.threadlocal import get_current_registry
+from cnxcommon.ident_hash import IdentHashError
+from cnxepub.models import flatten_tree_to_ident_hashes
+from pyramid.settings import asbool
+from pyramid.threadlocal import get_current_registry, get_current_request
 from cnxtransforms import (
     produce_cnxml_for_module,
     produce_html_for_module,
@@ -22,14 +31,21 @@ from cnxtransforms import (
 )
 
 from . import config
-from .utils import split_ident_hash, IdentHashMissingVersion
+from .replicas import is_replica_connection
+from .utils import split_ident_hash, IdentHashMissingVersion, LRUCache
 
 here = os.path.abspath(os.path.dirname(__file__))
 CNXDB_DIRECTORY = os.path.abspath(os.path.dirname(cnxdb.__file__))
 SQL_DIRECTORY = os.path.join(CNXDB_DIRECTORY, 'archive-sql')
+# Queries that are specific to this application rather than shared via cnxdb
+LOCAL_SQL_DIRECTORY = os.path.join(here, 'sql')
 
 logger = logging.getLogger('cnxarchive')
 
+# The ``modulestates`` id of content that is done being processed
+CURRENT_STATEID = 1
+DEFAULT_CONTENT_CACHE_MAX_SIZE = 64 * 1024 * 1024  # bytes
+
 
 class ContentNotFound(Exception):
     """Used when database retrival fails."""
@@ -37,8 +53,14 @@ class ContentNotFound(Exception):
     pass
 
 
-def _read_sql_file(name):
-    path = os.path.join(SQL_DIRECTORY, '{}.sql'.format(name))
+class StaleReplicaRead(Exception):
+    """Used when content that is still changing was read from a replica."""
+
+    pass
+
+
+def _read_sql_file(name, directory=SQL_DIRECTORY):
+    path = os.path.join(directory, '{}.sql'.format(name))
     with open(path, 'r') as fp:
         return fp.read()
 
@@ -56,7 +78,6 @@ SQL = {
     'get-resourceid-by-filename': _read_sql_file('get-resourceid-by-filename'),
     'get-tree-by-uuid-n-version': _read_sql_file('get-tree-by-uuid-n-version'),
     'get-module-latest-version': _read_sql_file('get-module-latest-version'),
-    'get-module-head-version': _read_sql_file('get-module-head-version'),
     'get-module-versions': _read_sql_file('get-module-versions'),
     'get-module-uuid': _read_sql_file('get-module-uuid'),
     'get-subject-list': _read_sql_file('get-subject-list'),
@@ -79,18 +100,161 @@ SQL = {
         'query-module_files-by-xpath'),
     'query-collated_file_associations-by-xpath': _read_sql_file(
         'query-collated_file_associations-by-xpath'),
-    'get-books-containing-page': _read_sql_file('get-books-containing-page'),
     'get-book-latest-version-with-page': _read_sql_file(
         'get-book-latest-version-with-page'),
+    'get-content-extras': _read_sql_file(
+        'get-content-extras', directory=LOCAL_SQL_DIRECTORY),
+    'get-resource-info': _read_sql_file(
+        'get-resource-info', directory=LOCAL_SQL_DIRECTORY),
+    'get-resource-chunk': _read_sql_file(
+        'get-resource-chunk', directory=LOCAL_SQL_DIRECTORY),
     }
 
 
+# Hot statements from ``SQL`` that are prepared once per connection
+# when the ``db-prepared-statements`` setting is enabled.
+PREPARED_STATEMENTS = (
+    'get-module-metadata',
+    'get-tree-by-uuid-n-version',
+    'get-resource',
+    'get-resource-info',
+    'get-resource-chunk',
+    'get-collated-content',
+    'get-module-latest-version',
+    )
+_PLACEHOLDER_PATTERN = re.compile(r'%(?:\((\w+)\))?s|%%')
+# Names of the statements prepared on each connection, {connection: set},
+# or None when they're unknown.
+_prepared_names = weakref.WeakKeyDictionary()
+# Errors executing a prepared statement that re-preparing it fixes: the
+# statement is gone (e.g. after ``DISCARD ALL``) or its cached plan is no
+# longer valid ("cached plan must not change result type").
+_REPREPARE_ERRORS = (
+    psycopg2.errorcodes.INVALID_SQL_STATEMENT_NAME,
+    psycopg2.errorcodes.FEATURE_NOT_SUPPORTED,
+    )
+
+
+def _as_prepared_statement(statement):
+    """Convert a psycopg2 ``statement`` to use ``$n`` placeholders.
+
+    Returns the converted statement and the argument names in placeholder
+    order (or positions, for a statement using positional arguments).
+    """
+    params = []
+
+    def replace(match):
+        if match.group(0) == '%%':
+            return '%'
+        name = match.group(1)
+        if name is None:
+            name = len(params)
+        if name not in params:
+            params.append(name)
+        return '${}'.format(params.index(name) + 1)
+
+    return _PLACEHOLDER_PATTERN.sub(replace, statement), params
+
+
+PREPARED_SQL = dict([(name, _as_prepared_statement(SQL[name]))
+                     for name in PREPARED_STATEMENTS])
+
+
+def _use_prepared_statements():
+    settings = get_current_registry().settings or {}
+    return asbool(settings.get(config.PREPARED_STATEMENTS, False))
+
+
+def execute_sql(cursor, name, args=None):
+    """Execute the ``SQL[name]`` statement with ``args`` on ``cursor``.
+
+    When the ``db-prepared-statements`` setting is enabled, statements
+    listed in ``PREPARED_STATEMENTS`` are prepared (named after their key)
+    the first time they are used on a connection and are executed by name
+    from then on. A new connection prepares them again. When a prepared
+    statement has been dropped or no longer matches the schema, and it was
+    the first statement of the transaction, the transaction is rolled back
+    and the statement is prepared again and executed once more. Later in a
+    transaction the error is raised, and the connection's statements are
+    all prepared again the next time they're used.
+    """
+    if name not in PREPARED_SQL or not _use_prepared_statements():
+        cursor.execute(SQL[name], args)
+        return
+
+    conn = cursor.connection
+    # Nothing is lost rolling back a transaction this starts
+    starts_transaction = conn.autocommit or (
+        conn.get_transaction_status() ==
+        psycopg2.extensions.TRANSACTION_STATUS_IDLE)
+    prepared = _prepared_names.get(conn, ())
+    if prepared is None:
+        # Left unknown by an error (see below), so start over.
+        cursor.execute('DEALLOCATE ALL')
+    if not prepared:
+        prepared = _prepared_names[conn] = set()
+    statement, params = PREPARED_SQL[name]
+    prepare = 'PREPARE "{}" AS\n{}'.format(name, statement)
+    if name not in prepared:
+        cursor.execute(prepare)
+        prepared.add(name)
+
+    if isinstance(args, dict):
+        values = [args[param] for param in params]
+    else:
+        values = list(args or ())
+    execute = 'EXECUTE "{}"'.format(name)
+    if values:
+        execute += '({})'.format(', '.join(['%s'] * len(values)))
+    try:
+        cursor.execute(execute, values)
+    except psycopg2.Error as exc:
+        if exc.pgcode not in _REPREPARE_ERRORS:
+            raise
+        if not starts_transaction:
+            _prepared_names[conn] = None
+            raise
+        if not conn.autocommit:
+            conn.rollback()
+        # Prepared statements outlive the transaction
+        if exc.pgcode != psycopg2.errorcodes.INVALID_SQL_STATEMENT_NAME:
+            cursor.execute('DEALLOCATE "{}"'.format(name))
+        cursor.execute(prepare)
+        cursor.execute(execute, values)
+
+
 @contextlib.contextmanager
-def db_connect(connection_string=None):
-    """Function to supply a database connection object."""
+def db_connect(connection_string=None, registry=None, replica=False):
+    """Function to supply a database connection object.
+
+    When no ``connection_string`` is given and the application has a
+    connection pool (see ``cnxarchive.pool``), the connection is checked
+    out of the pool and returned to it afterwards instead of being closed.
+    With ``replica``, for read-only work, the connection is checked out of
+    a read replica if one is usable (see ``cnxarchive.replicas``).
+    The application ``registry`` is needed when used outside of a request,
+    for example while streaming a response.
+    """
     if connection_string is None:
-        settings = get_current_registry().settings
-        connection_string = settings[config.CONNECTION_STRING]
+        if registry is None:
+            registry = get_current_registry()
+        replicas = getattr(registry, 'db_replicas', None)
+        if replica and replicas is not None:
+            db_replica, db_conn = replicas.getconn()
+            if db_conn is not None:
+                try:
+                    with db_conn:
+                        yield db_conn
+                finally:
+                    replicas.putconn(db_replica, db_conn)
+                return
+        pool = getattr(registry, 'db_pool', None)
+        if pool is not None:
+            with pool.connection() as db_conn:
+                with db_conn:
+                    yield db_conn
+            return
+        connection_string = registry.settings[config.CONNECTION_STRING]
     db_conn = psycopg2.connect(connection_string)
     try:
         with db_conn:
@@ -99,6 +263,142 @@ def db_connect(connection_string=None):
         db_conn.close()
 
 
+def request_db_connection(request):
+    """Lazily supply the request's shared database connection.
+
+    The connection is checked out of a read replica (see
+    ``cnxarchive.replicas``), unless ``request.db_primary`` is set or no
+    replica is usable, otherwise out of the pool (or opened) on first use.
+    A finished callback commits it, or rolls it back when the request
+    raised an exception, and then returns it to the pool (or closes it).
+    """
+    registry = request.registry
+    pool = getattr(registry, 'db_pool', None)
+    replicas = getattr(registry, 'db_replicas', None)
+    replica = db_conn = None
+    if replicas is not None and not getattr(request, 'db_primary', False):
+        replica, db_conn = replicas.getconn()
+    if db_conn is None and pool is not None:
+        db_conn = pool.getconn()
+    elif db_conn is None:
+        db_conn = psycopg2.connect(registry.settings[config.CONNECTION_STRING])
+
+    def release(request):
+        cursor = request.__dict__.get('db_cursor')
+        try:
+            if cursor is not None and cursor.connection is db_conn:
+                cursor.close()
+            if request.exception is None:
+                db_conn.commit()
+            else:
+                db_conn.rollback()
+        finally:
+            if replica is not None:
+                replicas.putconn(replica, db_conn)
+            elif pool is not None:
+                pool.putconn(db_conn)
+            else:
+                db_conn.close()
+
+    request.add_finished_callback(release)
+    return db_conn
+
+
+def request_db_cursor(request):
+    """Lazily supply a cursor on the request's shared connection."""
+    return request.db_connection.cursor()
+
+
+@contextlib.contextmanager
+def db_cursor(cursor_factory=None):
+    """Supply a cursor, sharing the current request's connection.
+
+    Within a request the request's connection is used and the cursor
+    is left open for the next caller, unless a ``cursor_factory`` is
+    given, in which case a new cursor is made on the shared connection.
+    Outside of a request, a connection is supplied by ``db_connect``.
+    """
+    request = get_current_request()
+    db_conn = getattr(request, 'db_connection', None)
+    if db_conn is None:
+        with db_connect() as db_conn:
+            with db_conn.cursor(cursor_factory=cursor_factory) as cursor:
+                yield cursor
+    elif cursor_factory is None:
+        yield request.db_cursor
+    else:
+        with db_conn.cursor(cursor_factory=cursor_factory) as cursor:
+            yield cursor
+
+
+def check_replica_state(cursor, stateid):
+    """Raise ``StaleReplicaRead`` if content in a non-current state
+    (i.e. content that is still being processed) was read from a replica.
+    """
+    if stateid in (None, CURRENT_STATEID):
+        return
+    if is_replica_connection(cursor.connection):
+        raise StaleReplicaRead()
+
+
+def content_cache_from_settings(settings):
+    """Create the content cache from the application ``settings``.
+
+    Returns None when the cache is disabled (``content-cache-max-size = 0``).
+    """
+    max_size = int(settings.get(config.CONTENT_CACHE_MAX_SIZE,
+                                DEFAULT_CONTENT_CACHE_MAX_SIZE))
+    if max_size <= 0:
+        return None
+    return LRUCache(max_size)
+
+
+def get_content_cache(invalidated=False):
+    """Return the in-process cache of content data that no longer changes.
+
+    It holds the JSON encoded metadata and trees of versioned content in
+    the current state, keyed by ``('metadata', uuid, version)`` and
+    ``('tree', uuid, version, as_collated)``, as well as the ``TreeIndex``
+    of those trees, keyed by ``('tree-index', uuid, version, as_collated)``.
+    None when disabled.
+
+    With ``invalidated`` the cache is only returned while database changes
+    are being listened for (see ``cnxarchive.invalidation``), so that data
+    that does change, like the latest version of a content keyed by
+    ``('latest', uuid)`` (with its expiration time), can be cached.
+    """
+    registry = get_current_registry()
+    listener = getattr(registry, 'cache_invalidation', None)
+    if listener is not None:
+        listener.ensure_running()
+    elif invalidated:
+        return None
+    if invalidated and not listener.active:
+        return None
+    return getattr(registry, 'content_cache', None)
+
+
+def is_current(cursor, uuid, version):
+    """Tell whether the content is done being processed."""
+    cursor.execute("""\
+SELECT stateid FROM modules
+WHERE uuid = %s AND module_version(major_version, minor_version) = %s""",
+                   (uuid, version,))
+    row = cursor.fetchone()
+    return row is not None and row[0] == CURRENT_STATEID
+
+
+def main(config):
+    """Declare the request's shared database connection and cursor,
+    and attach the content cache to the application registry.
+    """
+    config.registry.content_cache = content_cache_from_settings(
+        config.registry.settings)
+    config.add_request_method(request_db_connection, 'db_connection',
+                              reify=True)
+    config.add_request_method(request_db_cursor, 'db_cursor', reify=True)
+
+
 def get_module_ident_from_ident_hash(ident_hash, cursor):
     """Return the moduleid for a given ``ident_hash``."""
     try:
@@ -127,25 +427,123 @@ def get_module_ident_from_ident_hash(ident_hash, cursor):
     return module_ident
 
 
+def get_tree_json(ident_hash, cursor, as_collated=False):
+    """Return the binder tree for ``ident_hash`` as JSON text, as it comes
+    from the database (i.e. without decoding it). Returns None when there
+    is no such tree.
+    """
+    uuid, version = split_ident_hash(ident_hash)
+    cache = get_content_cache()
+    cache_key = ('tree', uuid, version, bool(as_collated),)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    with cursor.connection.cursor() as raw_cursor:
+        # Leave the json value as text on this cursor only.
+        psycopg2.extras.register_default_json(raw_cursor, loads=_as_is)
+        execute_sql(raw_cursor, 'get-tree-by-uuid-n-version',
+                    (uuid, version, as_collated,))
+        try:
+            tree = raw_cursor.fetchone()[0]
+        except TypeError:  # NoneType
+            raise ContentNotFound()
+
+    if cache is not None and tree and is_current(cursor, uuid, version):
+        cache.set(cache_key, tree)
+    return tree
+
+
+def _as_is(value):
+    return value
+
+
 def get_tree(ident_hash, cursor, as_collated=False):
     """Return a JSON representation of the binder tree for ``ident_hash``."""
+    tree = get_tree_json(ident_hash, cursor, as_collated=as_collated)
+    if tree is None:
+        return None
+    return json.loads(tree)
+
+
+class TreeIndex(object):
+    """Lookup of the ident-hashes in a tree by ident-hash or by id.
+
+    The position of an ident-hash is its position in
+    ``flatten_tree_to_ident_hashes(tree)``. Where a document appears
+    more than once, the first position is used.
+    """
+
+    def __init__(self, tree):
+        self.ident_hashes = []
+        self._positions = {}  # {ident_hash: position}
+        self._by_version = {}  # {(id, version): position}
+        self._by_id = {}  # {id: position}
+        for position, ident_hash in enumerate(
+                flatten_tree_to_ident_hashes(tree)):
+            self.ident_hashes.append(ident_hash)
+            self._positions.setdefault(ident_hash, position)
+            try:
+                id, version = split_ident_hash(ident_hash)
+            except IdentHashError:
+                continue
+            self._by_version.setdefault((id, version), position)
+            self._by_id.setdefault(id, position)
+        # Approximate memory use, for the content cache
+        self.size = (sum([sys.getsizeof(i) for i in self.ident_hashes]) +
+                     sys.getsizeof(self.ident_hashes) +
+                     sys.getsizeof(self._positions) +
+                     sys.getsizeof(self._by_version) +
+                     sys.getsizeof(self._by_id))
+
+    def __contains__(self, ident_hash):
+        return ident_hash in self._positions
+
+    def __len__(self):
+        return len(self.ident_hashes)
+
+    def position(self, id, version=None):
+        """Return the position of the document ``id`` at ``version``
+        (at any version when not given) or None when it isn't in the tree.
+        """
+        if version:
+            return self._by_version.get((id, version))
+        return self._by_id.get(id)
+
+    def find(self, id, version=None):
+        """Return the ident-hash of the document ``id`` at ``version``
+        (at any version when not given) or None when it isn't in the tree.
+        """
+        position = self.position(id, version)
+        if position is not None:
+            return self.ident_hashes[position]
+
+
+def get_tree_index(ident_hash, tree, as_collated=False):
+    """Return the ``TreeIndex`` of ``tree``, the tree of ``ident_hash``.
+
+    The index is cached along with the tree, when the tree is cached.
+    """
     uuid, version = split_ident_hash(ident_hash)
-    cursor.execute(SQL['get-tree-by-uuid-n-version'],
-                   (uuid, version, as_collated,))
-    try:
-        tree = cursor.fetchone()[0]
-    except TypeError:  # NoneType
-        raise ContentNotFound()
-    if type(tree) in (type(''), type(u'')):
-        return json.loads(tree)
-    else:
-        return tree
+    cache = get_content_cache()
+    tree_key = ('tree', uuid, version, bool(as_collated),)
+    cache_key = ('tree-index',) + tree_key[1:]
+    if cache is not None:
+        index = cache.get(cache_key)
+        if index is not None:
+            return index
+
+    index = TreeIndex(tree)
+    if cache is not None and tree_key in cache:
+        cache.set(cache_key, index, size=index.size)
+    return index
 
 
 def get_collated_content(ident_hash, context_ident_hash, cursor):
     """Return collated content for ``ident_hash``."""
-    cursor.execute(SQL['get-collated-content'],
-                   (ident_hash, context_ident_hash,))
+    execute_sql(cursor, 'get-collated-content',
+                (ident_hash, context_ident_hash,))
     try:
         return cursor.fetchone()[0]
     except TypeError:  # NoneType
@@ -828,12 +1226,3 @@ def get_collection_tree(collection_ident, cursor):
     ON t.document = m.module_ident''', [collection_ident])
     for i in cursor.fetchall():
         yield i
-
-
-def get_module_can_publish(cursor, id):
-    """Return userids allowed to publish this book."""
-    cursor.execute("""
-SELECT DISTINCT user_id
-FROM document_acl
-WHERE uuid = %s AND permission = 'publish'""", (id,))
-    return [i[0] for i in cursor.fetchall()]
@@ -0,0 +1,248 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Background monitoring of the export directories."""
+import collections
+import errno
+import logging
+import os
+import stat
+import threading
+import time
+
+from pyramid.settings import asbool
+
+from . import config
+from .utils import safe_stat
+
+try:
+    from os import scandir
+except ImportError:  # pragma: no cover
+    try:
+        from scandir import scandir
+    except ImportError:
+        scandir = None
+
+
+__all__ = (
+    'DirectoryMonitor',
+    'ExportIndex',
+    'monitor_from_settings',
+    )
+
+
+logger = logging.getLogger('cnxarchive')
+
+DEFAULT_CHECK_INTERVAL = 10  # seconds
+DEFAULT_CHECK_TIMEOUT = 1  # seconds
+
+# The part of a file's ``os.stat`` result kept in an ``ExportIndex``
+FileStats = collections.namedtuple('FileStats', 'st_size st_mtime')
+
+
+def _list_directory(path):
+    """Return ``{name: inode number}`` for the entries of the directory
+    ``path``. The inode numbers come from the listing itself, when the
+    ``scandir`` package is available, and are None otherwise.
+    """
+    if scandir is None:
+        return dict.fromkeys(os.listdir(path))
+    return dict([(entry.name, entry.inode()) for entry in scandir(path)])
+
+
+class DirectoryMonitor(object):
+    """Checks every ``interval`` seconds, in a background thread, which of
+    the ``paths`` can be stat'ed within ``timeout`` seconds.
+
+    The result is published as the ``reachable`` frozenset, so readers
+    never wait on a (possibly hung) file system.
+    """
+
+    def __init__(self, paths, interval=DEFAULT_CHECK_INTERVAL,
+                 timeout=DEFAULT_CHECK_TIMEOUT, stat=safe_stat):
+        self.paths = tuple(paths)
+        self.interval = interval
+        self.timeout = timeout
+        self._stat = stat
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        # The process the thread was started in, see ``_ensure_running``
+        self._pid = None
+        self._reachable = None
+
+    @property
+    def reachable(self):
+        """The set of paths found reachable by the last check."""
+        self._ensure_running()
+        return self._reachable
+
+    def check(self):
+        """Check the paths now and publish the result."""
+        reachable = frozenset([path for path in self.paths
+                               if self._stat(path, self.timeout)])
+        for path in set(self.paths) - reachable:
+            logger.warning("Directory '{}' is unreachable".format(path))
+        self._reachable = reachable
+        return reachable
+
+    def start(self):
+        """Check the paths and start checking them in the background."""
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._stopped.clear()
+            self.check()
+            self._thread = threading.Thread(target=self._run,
+                                            name='directory-monitor')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = self._pid = None
+
+    def _ensure_running(self):
+        # Threads don't survive a fork, so a worker process forked
+        # from the one that started the monitor starts its own.
+        if self._pid != os.getpid():
+            self.start()
+
+    def refresh(self):
+        """Called by the background thread every ``interval`` seconds."""
+        self.check()
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            try:
+                self.refresh()
+            except Exception:
+                logger.exception('Directory check failed')
+
+
+class ExportIndex(DirectoryMonitor):
+    """A ``DirectoryMonitor`` that also keeps the names, sizes and
+    modification times of the files in the reachable directories.
+
+    A directory is listed again when its modification time changes,
+    meaning files were added, removed or replaced. Then only the files
+    that are new or were replaced, as told by their inode numbers in the
+    listing, are stat'ed again, along with the files modified too recently
+    to be sure they were completely written, or that couldn't be stat'ed.
+    Every file is stat'ed again when the listing has no inode numbers.
+    Until a directory has been scanned, and for paths outside the
+    monitored directories, ``stat`` falls back to ``os.stat``.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(ExportIndex, self).__init__(*args, **kwargs)
+        # {normalized directory path: {filename: FileStats}}
+        self._files = {}
+        # {normalized directory path: {name: inode} of the last listing}
+        self._listed = {}
+        # {normalized directory path: names of files to stat again}
+        self._recheck = {}
+        # {directory: modification time when last scanned}
+        self._scanned = {}
+
+    def refresh(self):
+        for path in self.check():
+            try:
+                self.scan(path)
+            except EnvironmentError as exc:
+                logger.warning("Could not scan directory '{}': {}"
+                               .format(path, exc))
+
+    def scan(self, path):
+        """Index the files in the directory ``path`` that changed."""
+        mtime = os.stat(path).st_mtime
+        dir = os.path.normpath(path)
+        listed = self._listed.get(dir, {})
+        recheck = self._recheck.get(dir, set())
+        if self._scanned.get(path) != mtime:
+            listing = _list_directory(path)
+            changed = set([name for name, inode in listing.items()
+                           if inode is None or name not in listed or
+                           listed[name] != inode])
+        elif recheck:
+            listing, changed = listed, set()
+        else:
+            return
+        names = set(listing)
+        files = dict([(name, stats)
+                      for name, stats in self._files.get(dir, {}).items()
+                      if name in names and name not in changed | recheck])
+        now = time.time()
+        pending = set()
+        for name in changed | (names & recheck):
+            try:
+                stats = os.stat(os.path.join(path, name))
+            except EnvironmentError:
+                pending.add(name)
+                continue
+            if stat.S_ISREG(stats.st_mode):
+                files[name] = FileStats(stats.st_size, stats.st_mtime)
+                if now - stats.st_mtime <= 1:
+                    pending.add(name)
+        self._files[dir] = files
+        self._listed[dir] = listing
+        self._recheck[dir] = pending
+        # A change within the (possibly one second) resolution of the
+        # modification time could go unnoticed, so scan again next time.
+        if now - mtime > 1:
+            self._scanned[path] = mtime
+
+    def add(self, path, stats):
+        """Record a file created at ``path`` in an indexed directory."""
+        dir, name = os.path.split(path)
+        files = self._files.get(dir)
+        if files is not None:
+            files[name] = FileStats(stats.st_size, stats.st_mtime)
+
+    def stat(self, path):
+        """Like ``os.stat``, but answered from the index when possible."""
+        dir, name = os.path.split(path)
+        files = self._files.get(dir)
+        if files is None:
+            return os.stat(path)
+        try:
+            return files[name]
+        except KeyError:
+            raise OSError(errno.ENOENT, os.strerror(errno.ENOENT), path)
+
+
+def monitor_from_settings(settings):
+    """Create a ``DirectoryMonitor`` for the export directories from the
+    application ``settings``, an ``ExportIndex`` when ``exports-index``
+    is enabled.
+
+    Returns None when the ``exports-check-interval`` is zero.
+    """
+    interval = float(settings.get(config.EXPORTS_CHECK_INTERVAL,
+                                  DEFAULT_CHECK_INTERVAL))
+    if interval <= 0:
+        return None
+    timeout = float(settings.get(config.EXPORTS_CHECK_TIMEOUT,
+                                 DEFAULT_CHECK_TIMEOUT))
+    paths = settings.get('exports-directories', '').split()
+    if asbool(settings.get(config.EXPORTS_INDEX, False)):
+        factory = ExportIndex
+    else:
+        factory = DirectoryMonitor
+    return factory(paths, interval=interval, timeout=timeout)
+
+
+def main(config):
+    """Attach the export directory monitor to the application registry.
+
+    The monitor starts with the first request it's used in.
+    """
+    registry = config.registry
+    registry.exports_monitor = monitor_from_settings(registry.settings)
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Invalidation of the in-process content cache on database changes.
+
+The database notifies the ``cnxarchive_cache`` channel of changes to
+modules, trees, module files and collated file associations (see the
+``add_cache_invalidation_notifications`` migration).
+"""
+import collections
+import json
+import logging
+import os
+import select
+import threading
+
+import psycopg2
+import psycopg2.extensions
+from pyramid.settings import asbool
+
+from . import config
+
+
+__all__ = (
+    'CHANNEL',
+    'InvalidationListener',
+    'listener_from_settings',
+    )
+
+
+logger = logging.getLogger('cnxarchive')
+
+CHANNEL = 'cnxarchive_cache'
+RECONNECT_INTERVAL = 5  # seconds
+# Seconds without notifications after which the connection is checked
+KEEPALIVE_INTERVAL = 30
+TREE_KINDS = ('tree', 'tree-index',)
+
+
+class InvalidationListener(object):
+    """Listens, in a background thread, for database changes and evicts
+    the affected entries from the content ``cache``.
+
+    The cache is cleared whenever the listener (re)connects, because
+    changes may have been missed in the meantime. ``active`` tells
+    whether changes are being listened for and ``generation`` whether a
+    content changed while it was being read.
+    """
+
+    def __init__(self, connection_string, cache, connect=psycopg2.connect):
+        self.connection_string = connection_string
+        self.cache = cache
+        self._connect = connect
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread = None
+        # The process the thread was started in, see ``ensure_running``
+        self._pid = None
+        self.active = False
+        # The number of (re)connections and of changes by uuid since
+        # the last one, see ``generation``
+        self._connections = 0
+        self._changes = collections.Counter()
+
+    def ensure_running(self):
+        """Start listening unless this process already does.
+
+        Threads don't survive a fork, so a worker process forked from
+        the one that started listening starts its own.
+        """
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self.active = False
+            self._stopped.clear()
+            self._thread = threading.Thread(target=self._run,
+                                            name='cache-invalidation')
+            self._thread.daemon = True
+            self._thread.start()
+            self._pid = os.getpid()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._thread = self._pid = None
+
+    def generation(self, uuid):
+        """Return a value that changes with every change of the content
+        ``uuid`` and whenever changes may have been missed.
+
+        A value read from the database is only to be cached if the
+        generation of its content is the same before and after the read.
+        """
+        return (self._connections, self._changes[uuid],)
+
+    def handle(self, payload):
+        """Evict the cache entries affected by the change in ``payload``."""
+        try:
+            change = json.loads(payload)
+        except ValueError:
+            logger.warning("Invalid cache invalidation: {!r}".format(payload))
+            return
+        uuid = change.get('uuid')
+        if uuid:
+            self._changes[uuid] += 1
+            # Keys look like ``(kind, uuid, ...)``
+            self.cache.delete_matching(
+                lambda key: isinstance(key, tuple) and key[1:2] == (uuid,))
+        elif change.get('table') == 'trees':
+            self.cache.delete_matching(
+                lambda key: isinstance(key, tuple) and key[0] in TREE_KINDS)
+
+    def _listen(self):
+        conn = self._connect(self.connection_string)
+        try:
+            conn.set_isolation_level(
+                psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cursor:
+                cursor.execute('LISTEN {}'.format(CHANNEL))
+            self._connections += 1
+            self._changes.clear()
+            self.cache.clear()
+            self.active = True
+            while not self._stopped.is_set():
+                if select.select([conn], [], [], KEEPALIVE_INTERVAL)[0]:
+                    conn.poll()
+                else:
+                    with conn.cursor() as cursor:
+                        cursor.execute('SELECT 1')
+                while conn.notifies:
+                    self.handle(conn.notifies.pop(0).payload)
+        finally:
+            self.active = False
+            conn.close()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            try:
+                self._listen()
+            except (psycopg2.Error, select.error) as exc:
+                logger.warning("Cache invalidation listener failed: {}"
+                               .format(exc))
+            self._stopped.wait(RECONNECT_INTERVAL)
+
+
+def listener_from_settings(settings, cache):
+    """Create an ``InvalidationListener`` for the content ``cache`` from
+    the application ``settings``.
+
+    Returns None when there is no cache or ``cache-invalidation`` is off.
+    """
+    if cache is None or not asbool(settings.get(config.CACHE_INVALIDATION,
+                                                False)):
+        return None
+    # Notifications aren't delivered on replicas, so always the primary.
+    return InvalidationListener(settings[config.CONNECTION_STRING], cache)
+
+
+def main(config):
+    """Attach the cache invalidation listener to the application registry.
+
+    It starts with the first request the content cache is used in.
+    """
+    registry = config.registry
+    registry.cache_invalidation = listener_from_settings(
+        registry.settings, getattr(registry, 'content_cache', None))
@@ -0,0 +1,309 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Per-process database connection pooling."""
+import collections
+import contextlib
+import logging
+import os
+import threading
+import time
+
+import psycopg2
+import psycopg2.extensions
+from pyramid.settings import asbool
+
+from . import config
+
+
+__all__ = (
+    'ConnectionPool',
+    'PoolError',
+    'PoolTimeout',
+    'pool_from_settings',
+    )
+
+
+logger = logging.getLogger('cnxarchive')
+
+DEFAULT_MIN_SIZE = 0
+DEFAULT_MAX_SIZE = 10
+DEFAULT_MAX_AGE = 3600  # seconds
+DEFAULT_MAX_IDLE = 300  # seconds
+DEFAULT_TIMEOUT = 30  # seconds
+
+
+class PoolError(Exception):
+    """Used when a pooled connection cannot be supplied."""
+
+    pass
+
+
+class PoolTimeout(PoolError):
+    """Used when no connection became available in time."""
+
+    pass
+
+
+class ConnectionPool(object):
+    """A thread-safe pool of ``psycopg2`` connections.
+
+    Connections are handed out most recently used first, so that
+    surplus connections sit idle long enough to be reaped.
+    Connections older than ``max_age`` seconds are closed
+    rather than reused. Idle connections beyond ``min_size``
+    are closed after ``max_idle`` seconds. When ``pre_ping`` is
+    enabled a connection is checked with a trivial query before
+    it is handed out.
+
+    The pool remembers the process that created it. After a fork
+    the child drops (without closing) the connections it inherited,
+    because closing them would terminate the parent's sessions.
+    """
+
+    def __init__(self, connection_string, min_size=DEFAULT_MIN_SIZE,
+                 max_size=DEFAULT_MAX_SIZE, max_age=DEFAULT_MAX_AGE,
+                 max_idle=DEFAULT_MAX_IDLE, timeout=DEFAULT_TIMEOUT,
+                 pre_ping=True, connect=psycopg2.connect):
+        if max_size < 1:
+            raise ValueError("max_size must be at least 1")
+        if min_size > max_size:
+            raise ValueError("min_size cannot be greater than max_size")
+        self.connection_string = connection_string
+        self.min_size = min_size
+        self.max_size = max_size
+        self.max_age = max_age
+        self.max_idle = max_idle
+        self.timeout = timeout
+        self.pre_ping = pre_ping
+        self._connect = connect
+        self._cond = threading.Condition(threading.Lock())
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        # Idle connections as (connection, created, returned) tuples.
+        self._idle = collections.deque()
+        # Checked out connections as {id(connection): created}
+        self._in_use = {}
+        # Open connections, including ones currently being opened.
+        self._size = 0
+        self._counts = dict.fromkeys(
+            ('connects', 'checkouts', 'timeouts', 'discards', 'failed_pings',),
+            0)
+
+    def __repr__(self):
+        return "<{} size={} idle={} max_size={}>".format(
+            self.__class__.__name__, self._size, len(self._idle),
+            self.max_size)
+
+    def _check_pid(self):
+        """Forget inherited connections when running in a forked child."""
+        if self._pid == os.getpid():
+            return
+        logger.debug("Connection pool used in a forked process, "
+                     "discarding {} inherited connection(s)"
+                     .format(self._size))
+        # Keep references to the parent's connections, so that garbage
+        # collection does not close the sockets the parent is using.
+        _orphans.extend([c for c, created, returned in self._idle])
+        self._reset()
+
+    def _close(self, conn):
+        """Close a connection the pool no longer owns."""
+        self._counts['discards'] += 1
+        try:
+            conn.close()
+        except psycopg2.Error:  # pragma: no cover
+            pass
+
+    def _is_expired(self, created, now):
+        return self.max_age and now - created > self.max_age
+
+    def _reap(self, now):
+        """Close expired connections and connections idle for too long."""
+        kept = collections.deque()
+        while self._idle:
+            conn, created, returned = self._idle.popleft()
+            too_idle = (self.max_idle and now - returned > self.max_idle and
+                        self._size > self.min_size)
+            if conn.closed or too_idle or self._is_expired(created, now):
+                self._size -= 1
+                self._close(conn)
+            else:
+                kept.append((conn, created, returned))
+        self._idle = kept
+
+    def _ping(self, conn):
+        """Check the connection is still usable."""
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def _open(self):
+        """Open a new connection for a slot that has been reserved."""
+        try:
+            conn = self._connect(self.connection_string)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+        with self._cond:
+            self._counts['connects'] += 1
+        return conn, time.time()
+
+    def getconn(self):
+        """Check out a connection.
+
+        Raises ``PoolTimeout`` when all ``max_size`` connections are
+        checked out for longer than ``timeout`` seconds.
+        """
+        deadline = time.time() + self.timeout
+        with self._cond:
+            self._check_pid()
+            self._reap(time.time())
+            while True:
+                if self._idle:
+                    conn, created, returned = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    # Reserve the slot, the connection is opened
+                    # outside of the lock.
+                    self._size += 1
+                    conn = created = None
+                    break
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    self._counts['timeouts'] += 1
+                    raise PoolTimeout(
+                        "No connection available after {} seconds"
+                        .format(self.timeout))
+                self._cond.wait(remaining)
+
+        if conn is not None and self.pre_ping and not self._ping(conn):
+            with self._cond:
+                self._counts['failed_pings'] += 1
+                self._close(conn)
+            conn = None
+        if conn is None:
+            conn, created = self._open()
+
+        with self._cond:
+            self._counts['checkouts'] += 1
+            self._in_use[id(conn)] = created
+        return conn
+
+    def putconn(self, conn, close=False):
+        """Return a connection to the pool.
+
+        Any open transaction is rolled back. The connection is closed
+        instead of kept when ``close`` is true, when it is broken or
+        when it has outlived ``max_age``.
+        """
+        with self._cond:
+            if self._pid != os.getpid():
+                # Checked out before a fork, belongs to the parent.
+                return
+            try:
+                created = self._in_use.pop(id(conn))
+            except KeyError:
+                raise PoolError("Connection is not checked out of this pool")
+
+        if not (close or conn.closed):
+            status = conn.get_transaction_status()
+            if status == psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN:
+                close = True
+            elif status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    close = True
+
+        now = time.time()
+        with self._cond:
+            if close or conn.closed or self._is_expired(created, now):
+                self._size -= 1
+                self._close(conn)
+            else:
+                self._idle.append((conn, created, now))
+            self._cond.notify()
+
+    @contextlib.contextmanager
+    def connection(self):
+        """Supply a pooled connection for the duration of the block."""
+        conn = self.getconn()
+        try:
+            yield conn
+        except psycopg2.OperationalError:
+            # The connection may be broken, don't hand it out again.
+            self.putconn(conn, close=True)
+            raise
+        except BaseException:
+            self.putconn(conn)
+            raise
+        else:
+            self.putconn(conn)
+
+    def closeall(self):
+        """Close all idle connections and forget checked out ones."""
+        with self._cond:
+            self._check_pid()
+            while self._idle:
+                conn, created, returned = self._idle.popleft()
+                self._close(conn)
+            self._size = 0
+            self._in_use.clear()
+            self._cond.notify_all()
+
+    def stats(self):
+        """Return a dictionary of pool statistics."""
+        with self._cond:
+            stats = dict(self._counts)
+            stats.update({
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': len(self._in_use),
+                'min_size': self.min_size,
+                'max_size': self.max_size,
+                })
+        return stats
+
+
+# Connections inherited from a parent process, see ``_check_pid``.
+_orphans = []
+
+
+def pool_from_settings(settings, connection_string=None):
+    """Create a ``ConnectionPool`` from the application ``settings``.
+
+    Returns None when pooling is disabled (``db-pool-max-size = 0``).
+    """
+    max_size = int(settings.get(config.POOL_MAX_SIZE, DEFAULT_MAX_SIZE))
+    if max_size <= 0:
+        return None
+    if connection_string is None:
+        connection_string = settings[config.CONNECTION_STRING]
+    return ConnectionPool(
+        connection_string,
+        min_size=int(settings.get(config.POOL_MIN_SIZE, DEFAULT_MIN_SIZE)),
+        max_size=max_size,
+        max_age=int(settings.get(config.POOL_MAX_AGE, DEFAULT_MAX_AGE)),
+        max_idle=int(settings.get(config.POOL_MAX_IDLE, DEFAULT_MAX_IDLE)),
+        timeout=float(settings.get(config.POOL_TIMEOUT, DEFAULT_TIMEOUT)),
+        pre_ping=asbool(settings.get(config.POOL_PRE_PING, True)),
+        )
+
+
+def main(config):
+    """Attach a connection pool to the application registry."""
+    registry = config.registry
+    registry.db_pool = pool_from_settings(registry.settings)
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Routing of read-only database work to streaming replicas."""
+import logging
+import threading
+import time
+import weakref
+
+import psycopg2
+
+from . import config
+from .pool import PoolError, pool_from_settings
+
+
+__all__ = (
+    'Replica',
+    'ReplicaSet',
+    'is_replica_connection',
+    'replicas_from_settings',
+    'replication_lag',
+    )
+
+
+logger = logging.getLogger('cnxarchive')
+
+ROUND_ROBIN = 'round-robin'
+LEAST_LOADED = 'least-loaded'
+SELECTIONS = (ROUND_ROBIN, LEAST_LOADED,)
+DEFAULT_MAX_LAG = 30  # seconds
+DEFAULT_LAG_CHECK_INTERVAL = 5  # seconds
+
+# The replay delay of a standby, or zero when it has replayed
+# everything it received (an idle primary doesn't mean a lagging replica).
+LAG_STATEMENT = """\
+SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+            ELSE COALESCE(EXTRACT(EPOCH FROM
+                                  now() - pg_last_xact_replay_timestamp()), 0)
+       END"""
+
+# Connections handed out by a replica, see ``is_replica_connection``.
+_replica_connections = weakref.WeakSet()
+
+
+def is_replica_connection(conn):
+    """Tell whether ``conn`` is connected to a replica."""
+    return conn in _replica_connections
+
+
+def replication_lag(conn):
+    """Return the replication lag in seconds of the replica ``conn`` is
+    connected to, zero when it replayed everything it received.
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(LAG_STATEMENT)
+        return float(cursor.fetchone()[0])
+
+
+class Replica(object):
+    """A replica database, optionally pooled."""
+
+    def __init__(self, connection_string, pool=None,
+                 connect=psycopg2.connect):
+        self.connection_string = connection_string
+        self.pool = pool
+        self._connect = connect
+        # The number of connections checked out
+        self.in_use = 0
+        # The last measured replication lag in seconds
+        self.lag = None
+        # The time of the last lag measurement
+        self.checked = 0
+
+    def __repr__(self):
+        return "<{} in_use={} lag={}>".format(
+            self.__class__.__name__, self.in_use, self.lag)
+
+    def getconn(self):
+        if self.pool is not None:
+            conn = self.pool.getconn()
+        else:
+            conn = self._connect(self.connection_string)
+        _replica_connections.add(conn)
+        return conn
+
+    def putconn(self, conn, close=False):
+        _replica_connections.discard(conn)
+        if self.pool is not None:
+            self.pool.putconn(conn, close=close)
+        else:
+            conn.close()
+
+    def measure_lag(self, conn):
+        """Measure the replication lag using the connection ``conn``."""
+        lag = replication_lag(conn)
+        conn.rollback()
+        return lag
+
+
+class ReplicaSet(object):
+    """Hands out connections to the replicas that keep up with the primary.
+
+    Replicas are tried in round-robin order or, with the ``least-loaded``
+    selection, fewest checked out connections first. A replica's lag is
+    measured on a checked out connection at most every
+    ``lag_check_interval`` seconds. A replica lagging more than
+    ``max_lag`` seconds, or one that can't be reached, is skipped until
+    its next check. When no replica is usable ``getconn`` returns
+    ``(None, None)`` and the primary should be used.
+    """
+
+    def __init__(self, replicas, selection=ROUND_ROBIN,
+                 max_lag=DEFAULT_MAX_LAG,
+                 lag_check_interval=DEFAULT_LAG_CHECK_INTERVAL):
+        if selection not in SELECTIONS:
+            raise ValueError("unknown replica selection '{}'"
+                             .format(selection))
+        self.replicas = list(replicas)
+        self.selection = selection
+        self.max_lag = max_lag
+        self.lag_check_interval = lag_check_interval
+        self._lock = threading.Lock()
+        self._next = 0
+
+    def _candidates(self):
+        """Return the replicas in the order they should be tried."""
+        with self._lock:
+            start = self._next
+            self._next = (self._next + 1) % len(self.replicas)
+            replicas = self.replicas[start:] + self.replicas[:start]
+            if self.selection == LEAST_LOADED:
+                replicas.sort(key=lambda r: r.in_use)
+        return replicas
+
+    def getconn(self):
+        """Check out a connection as a ``(replica, connection)`` pair."""
+        now = time.time()
+        for replica in self._candidates():
+            check_lag = now - replica.checked >= self.lag_check_interval
+            if not check_lag and (replica.lag is None or
+                                  replica.lag > self.max_lag):
+                continue
+            try:
+                conn = replica.getconn()
+            except (psycopg2.Error, PoolError) as exc:
+                logger.warning("Replica unavailable: {}".format(exc))
+                replica.checked, replica.lag = now, None
+                continue
+            if check_lag:
+                replica.checked = now
+                try:
+                    replica.lag = replica.measure_lag(conn)
+                except psycopg2.Error as exc:
+                    logger.warning("Replica lag check failed: {}"
+                                   .format(exc))
+                    replica.lag = None
+                    replica.putconn(conn, close=True)
+                    continue
+                if replica.lag > self.max_lag:
+                    logger.warning("Replica is {} seconds behind"
+                                   .format(replica.lag))
+                    replica.putconn(conn)
+                    continue
+            with self._lock:
+                replica.in_use += 1
+            return replica, conn
+        return None, None
+
+    def putconn(self, replica, conn, close=False):
+        """Return a connection checked out by ``getconn``."""
+        with self._lock:
+            replica.in_use -= 1
+        replica.putconn(conn, close=close)
+
+
+def replicas_from_settings(settings):
+    """Create a ``ReplicaSet`` from the application ``settings``.
+
+    Returns None when no replicas are configured.
+    """
+    connection_strings = [
+        line.strip()
+        for line in settings.get(config.REPLICA_CONNECTION_STRINGS,
+                                 '').splitlines()
+        if line.strip()]
+    if not connection_strings:
+        return None
+    replicas = [Replica(cs, pool=pool_from_settings(settings, cs))
+                for cs in connection_strings]
+    return ReplicaSet(
+        replicas,
+        selection=settings.get(config.REPLICA_SELECTION, ROUND_ROBIN),
+        max_lag=float(settings.get(config.REPLICA_MAX_LAG, DEFAULT_MAX_LAG)),
+        lag_check_interval=float(settings.get(
+            config.REPLICA_LAG_CHECK_INTERVAL, DEFAULT_LAG_CHECK_INTERVAL)),
+        )
+
+
+def main(config):
+    """Attach the read replicas to the application registry."""
+    registry = config.registry
+    registry.db_replicas = replicas_from_settings(registry.settings)
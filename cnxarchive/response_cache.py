@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Caching of whole responses of routes that don't change once published,
+see ``cnxarchive.tweens.response_cache_tween_factory``.
+"""
+import binascii
+import hashlib
+import json
+import logging
+import time
+
+from pyramid.interfaces import IRoutesMapper
+
+from . import cache
+from . import config
+from .cache import MemcachedBackend
+from .compression import negotiate_encoding
+from .utils import DirectoryStore
+
+
+__all__ = (
+    'DirectoryBackend',
+    'MemcachedBackend',
+    'MemoryBackend',
+    'ResponseCache',
+    'response_cache_from_settings',
+    )
+
+
+logger = logging.getLogger('cnxarchive')
+
+MEMORY = 'memory'
+MEMCACHED = 'memcached'
+DIRECTORY = 'directory'
+DEFAULT_MAX_SIZE = 64 * 1024 * 1024  # bytes
+DEFAULT_ROUTES = (
+    'content',
+    'content-extras',
+    'in-book-search',
+    'in-book-search-page',
+    'resource',
+    )
+# Headers that are specific to a response rather than to the resource
+UNCACHED_HEADERS = ('set-cookie', 'expires', 'date',)
+
+
+class MemoryBackend(cache.MemoryBackend):
+    """Keeps responses in a least recently used cache in the process,
+    bounded by the total size of their bodies.
+    """
+
+    def __init__(self, max_size=DEFAULT_MAX_SIZE):
+        super(MemoryBackend, self).__init__(
+            max_size, sizeof=lambda value: len(value[2]))
+
+
+def _text(value):
+    # Header names and values are native strings, bytes on Python 2
+    return value.decode('latin-1') if isinstance(value, bytes) else value
+
+
+def _native(text):
+    return text.encode('latin-1') if str is bytes else text
+
+
+class DirectoryBackend(object):
+    """Keeps responses in files under the private ``directory``, shared
+    by all the processes on the host, taking up to about ``max_size``
+    bytes. On a tmpfs this is a shared memory store.
+
+    Each file holds a line of JSON with the expiration time, status and
+    headers of the response, followed by its body.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_MAX_SIZE):
+        self.store = DirectoryStore(directory, max_size)
+
+    def get(self, key):
+        f = self.store.open(key)
+        if f is None:
+            return None
+        with f:
+            try:
+                header = json.loads(f.readline().decode('utf-8'))
+                expires = header['expires']
+                status = _native(header['status'])
+                headerlist = tuple([(_native(name), _native(value),)
+                                    for name, value in header['headerlist']])
+                body = f.read()
+            except (EnvironmentError, KeyError, TypeError, ValueError):
+                return None
+        if expires < time.time():
+            self.store.delete(key)
+            return None
+        return (status, headerlist, body,)
+
+    def set(self, key, value, expire):
+        status, headerlist, body = value
+        header = json.dumps({
+            'expires': time.time() + expire,
+            'status': _text(status),
+            'headerlist': [(_text(name), _text(value),)
+                           for name, value in headerlist],
+            })
+        self.store.set(key, header.encode('utf-8') + b'\n' + body)
+
+
+class ResponseCache(object):
+    """Caches the responses of the ``routes`` in the ``backend``.
+
+    Only successful, fully buffered responses to GET requests that
+    may be cached publicly (according to their Cache-Control) are
+    kept, for at most their max-age.
+    """
+
+    def __init__(self, backend, routes=DEFAULT_ROUTES):
+        self.backend = backend
+        self.routes = frozenset(routes)
+
+    def key(self, request):
+        """Return the key of the response to the ``request``,
+        or None if it's not to be cached.
+        """
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        mapper = request.registry.queryUtility(IRoutesMapper)
+        info = mapper and mapper(request) or {}
+        route = info.get('route')
+        if route is None or route.name not in self.routes:
+            return None
+        accept = request.headers.get('Accept', '')
+        parts = [
+            route.name,
+            sorted(info['match'].items()),
+            sorted(request.GET.items()),
+            # The request headers responses vary on
+            'application/xhtml+xml' in accept,
+            negotiate_encoding(request),
+            ]
+        # Hashed to stay within memcached's key length limit
+        return binascii.hexlify(
+            hashlib.sha1(repr(parts).encode('utf-8')).digest())
+
+    def get(self, key):
+        """Return the cached ``(status, headerlist, body)``, or None."""
+        try:
+            return self.backend.get(key)
+        except Exception:
+            logger.exception('Response cache lookup failed')
+            return None
+
+    def set(self, key, response):
+        """Cache the ``response`` if it can be."""
+        cache_control = response.cache_control
+        if (response.status_int != 200 or
+                not isinstance(response.app_iter, (list, tuple)) or
+                cache_control.no_store or cache_control.no_cache or
+                cache_control.private or not cache_control.max_age):
+            return
+        headerlist = tuple([(name, value)
+                            for name, value in response.headerlist
+                            if name.lower() not in UNCACHED_HEADERS])
+        value = (response.status, headerlist, response.body)
+        try:
+            self.backend.set(key, value, int(cache_control.max_age))
+        except Exception:
+            logger.exception('Response cache store failed')
+
+
+def response_cache_from_settings(settings):
+    """Create a ``ResponseCache`` from the application ``settings``.
+
+    Returns None when the ``response-cache`` setting is empty.
+    """
+    backend_name = settings.get(config.RESPONSE_CACHE)
+    if not backend_name:
+        return None
+    if backend_name == MEMORY:
+        backend = MemoryBackend(int(settings.get(
+            config.RESPONSE_CACHE_MAX_SIZE, DEFAULT_MAX_SIZE)))
+    elif backend_name == MEMCACHED:
+        backend = MemcachedBackend(settings['memcache-servers'].split())
+    elif backend_name == DIRECTORY:
+        backend = DirectoryBackend(
+            settings[config.RESPONSE_CACHE_DIRECTORY],
+            int(settings.get(config.RESPONSE_CACHE_MAX_SIZE,
+                             DEFAULT_MAX_SIZE)))
+    else:
+        raise ValueError("unknown response cache '{}'".format(backend_name))
+    routes = settings.get(config.RESPONSE_CACHE_ROUTES)
+    routes = routes and routes.split() or DEFAULT_ROUTES
+    return ResponseCache(backend, routes)
+
+
+def main(config):
+    """Attach the response cache to the application registry."""
+    registry = config.registry
+    registry.response_cache = response_cache_from_settings(registry.settings)
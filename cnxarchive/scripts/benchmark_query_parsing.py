@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Commandline script measuring the cost of parsing search queries.
+
+Each query is parsed repeatedly, both from scratch and as looked up
+in the parsed queries kept by ``Query.from_raw_query``, and the time
+per parse is reported.
+"""
+import argparse
+import sys
+import timeit
+
+from cnxarchive.scripts._utils import _gen_prog_name
+from cnxarchive.search import Query
+
+
+DEFAULT_NUMBER = 1000
+# Typical queries, including one with unbalanced quotes
+DEFAULT_QUERIES = (
+    'physics',
+    'college physics',
+    '"college physics" sort:pubDate',
+    'subject:"Science and Technology" type:book',
+    'title:"Derived Copy of College Physics" authorID:cnxcap',
+    '"a phrase" "something else sort:pubDate author:"first last"',
+    )
+
+
+def benchmark(queries, number=DEFAULT_NUMBER):
+    """Return a list of ``(query, parse time, cached parse time)``,
+    in seconds per parse of each of the ``queries``.
+    """
+    timings = []
+    for query in queries:
+        parse = timeit.timeit(lambda: Query._parse(query), number=number)
+        Query.from_raw_query(query)
+        cached = timeit.timeit(lambda: Query.from_raw_query(query),
+                               number=number)
+        timings.append((query, parse / number, cached / number,))
+    return timings
+
+
+def main(argv=None):
+    """Report the time it takes to parse search queries."""
+    parser = argparse.ArgumentParser(
+        prog=_gen_prog_name('benchmark_query_parsing'), description=__doc__)
+    parser.add_argument('-n', '--number', type=int, default=DEFAULT_NUMBER,
+                        help="parses per query (default: {})"
+                             .format(DEFAULT_NUMBER))
+    parser.add_argument('queries_file', nargs='?',
+                        type=argparse.FileType('r'),
+                        help="file of queries, one per line "
+                             "(default: a few typical queries)")
+    args = parser.parse_args(argv)
+
+    if args.queries_file is None:
+        queries = DEFAULT_QUERIES
+    else:
+        queries = [line.strip() for line in args.queries_file
+                   if line.strip()]
+
+    for query, parse, cached in benchmark(queries, args.number):
+        sys.stdout.write('{:>10.1f} us {:>8.1f} us (cached)  {}\n'
+                         .format(parse * 1e6, cached * 1e6, query))
+    return 0
+
+
+if __name__ == '__main__':  # pragma: no cover
+    sys.exit(main())
@@ -10,15 +10,14 @@ import os
 import re
 from collections import Mapping, OrderedDict, Sequence
 from datetime import datetime
-from time import strptime
 
 from cnxquerygrammar.query_parser import grammar, DictFormater
 from parsimonious.exceptions import IncompleteParseError
-from psycopg2.tz import FixedOffsetTimezone, LocalTimezone
+from psycopg2.tz import LocalTimezone
 
-from .database import SQL_DIRECTORY, db_connect
+from .database import LOCAL_SQL_DIRECTORY, SQL_DIRECTORY, db_cursor
 from .utils import (
-    portaltype_to_mimetype, COLLECTION_MIMETYPE, MODULE_MIMETYPE,
+    portaltype_to_mimetype, COLLECTION_MIMETYPE, LRUCache, MODULE_MIMETYPE,
     PORTALTYPE_TO_MIMETYPE_MAPPING, utf8
     )
 import logging
@@ -26,15 +25,17 @@ import logging
 logger = logging.getLogger('cnxarchive')
 
 
-__all__ = ('search', 'Query',)
+__all__ = (
+    'fetch_facets', 'fetch_records', 'highlight_records', 'search', 'Query',
+    )
 
 
 here = os.path.abspath(os.path.dirname(__file__))
 LOCAL_TZINFO = LocalTimezone()
 with open(os.path.join(here, 'data', 'common-english-words.txt'), 'r') as f:
     # stopwords are all the common english words plus single characters
-    STOPWORDS = (f.read().split(',') +
-                 [chr(i) for i in range(ord('a'), ord('z') + 1)])
+    STOPWORDS = frozenset(f.read().split(',') +
+                          [chr(i) for i in range(ord('a'), ord('z') + 1)])
 # WILDCARD_KEYWORD = 'text'
 # VALID_FILTER_KEYWORDS = ('type', 'pubYear', 'authorID', 'keyword', 'subject',
 #                          'language', 'title', 'author', 'abstract')
@@ -47,9 +48,17 @@ SORT_VALUES_MAPPING = {
     'version': 'version DESC',
     'popularity': 'rank DESC NULLS LAST',
     }
+# The canonical value of each valid ``type`` filter value
+TYPE_SYNONYMS = {
+    'book': 'book',
+    'collection': 'book',
+    'page': 'page',
+    'module': 'page',
+    }
 DEFAULT_SEARCH_WEIGHTS = OrderedDict([
     ])
 SQL_SEARCH_DIRECTORY = os.path.join(SQL_DIRECTORY, 'search')
+LOCAL_SQL_SEARCH_DIRECTORY = os.path.join(LOCAL_SQL_DIRECTORY, 'search')
 
 
 def _read_sql_file(name, root=SQL_SEARCH_DIRECTORY, extension='.sql',
@@ -69,6 +78,17 @@ SQL_SEARCH_TEMPLATES = {name: _read_sql_file(name, extension='.part.sql',
 SQL_WEIGHTED_SELECT_WRAPPER = _read_sql_file('wrapper')
 SQL_QUICK_SELECT_WRAPPER = _read_sql_file('quick-wrapper')
 SEARCH_QUERY = _read_sql_file('query')
+SQL_HIGHLIGHTED_ABSTRACT = _read_sql_file('highlighted-abstract')
+SQL_GET_ABSTRACT = _read_sql_file('get-abstract')
+SQL_HIGHLIGHTED_FULLTEXT = _read_sql_file('highlighted-fulltext')
+SQL_HITS_SELECT_WRAPPER = _read_sql_file(
+    'hits-wrapper', root=LOCAL_SQL_SEARCH_DIRECTORY)
+SQL_RECORDS_SELECT = _read_sql_file(
+    'records', root=LOCAL_SQL_SEARCH_DIRECTORY)
+SQL_FACETS_SELECT = _read_sql_file(
+    'facets', root=LOCAL_SQL_SEARCH_DIRECTORY)
+SQL_HIGHLIGHTS_SELECT = _read_sql_file(
+    'highlights', root=LOCAL_SQL_SEARCH_DIRECTORY)
 QUERY_FIELD_ITEM_SEPARATOR = ';--;'
 QUERY_FIELD_PAIR_SEPARATOR = '-::-'
 
@@ -78,6 +98,11 @@ DEFAULT_QUERY_TYPE = QUERY_TYPES[-1]
 
 DEFAULT_PER_PAGE = 20
 
+# The number of raw query strings whose parse is kept,
+# see ``Query.from_raw_query``
+MAX_PARSED_QUERIES = 1024
+_parsed_queries = LRUCache(MAX_PARSED_QUERIES, sizeof=lambda value: 1)
+
 
 class Query(Sequence):
     """A structured respresentation of the query string."""
@@ -127,7 +152,19 @@ class Query(Sequence):
 
         Given a raw string (typically typed by the user),
         parse to a structured format and initialize the class.
+
+        The parses of the most recently used ``MAX_PARSED_QUERIES`` raw
+        strings are kept, so popular queries are only parsed once.
         """
+        structured_query = _parsed_queries.get(query_string)
+        if structured_query is None:
+            structured_query = cls._parse(query_string)
+            _parsed_queries.set(query_string, structured_query)
+        # A new query every time, since searching removes invalid filters
+        return cls(structured_query)
+
+    @classmethod
+    def _parse(cls, query_string):
         try:
             node_tree = grammar.parse(query_string)
         except IncompleteParseError:
@@ -136,101 +173,216 @@ class Query(Sequence):
 
         structured_query = DictFormater().visit(node_tree)
 
-        return cls([t for t in structured_query
-                    if t[1].lower() not in STOPWORDS])
+        return tuple([t for t in structured_query
+                      if t[1].lower() not in STOPWORDS])
 
+    def canonical(self):
+        """Return the equivalent query in canonical form.
+
+        Text terms are case-folded and without stopwords (unless there are
+        only stopwords), filter values are normalized and both are sorted,
+        without duplicates. Equivalent queries spelled differently have
+        the same canonical form, so they are searched and cached the same.
+        """
+        terms = sorted(set([(ttype, term.lower())
+                            for ttype, term in self.terms]))
+        terms_wo_stopwords = [term for term in terms
+                              if term[1] not in STOPWORDS]
+        if terms_wo_stopwords:
+            terms = terms_wo_stopwords
+        filters = sorted(set([_canonical_filter(keyword, value)
+                              for keyword, value in self.filters]))
+        # The order of the sorts matters
+        sorts = []
+        for sort in self.sorts:
+            if sort.lower() not in sorts:
+                sorts.append(sort.lower())
+        return self.__class__(terms + filters +
+                              [('sort', sort) for sort in sorts])
+
+
+# {tuple of record field names: (that tuple, {field name: position})},
+# shared by all the records with those fields (see ``QueryRecord``)
+_RECORD_FIELDS = {}
+
+
+def _record_fields(names):
+    try:
+        return _RECORD_FIELDS[names]
+    except KeyError:
+        positions = {name: position for position, name in enumerate(names)}
+        return _RECORD_FIELDS.setdefault(names, (names, positions,))
+
+
+class QueryRecord(object):
+    """A query record wrapper to parse hit values and add behavior.
+
+    The values are kept in a tuple, whose field positions are shared by
+    all the records with the same fields. The matching fields (``_keys``)
+    are parsed when first needed.
+
+    Records are read-only mappings. The mapping methods are implemented
+    here rather than inherited from ``Mapping``, which has no
+    ``__slots__`` on Python 2 and would give every record a ``__dict__``.
+    """
 
-class QueryRecord(Mapping):
-    """A query record wrapper to parse hit values and add behavior."""
+    __slots__ = ('_fields', '_values', '_keys', '_match_hits',)
 
     def __init__(self, **kwargs):
-        self._record = {k: v for k, v in kwargs.items()
-                        if k not in ('_keys', 'matched', 'fields',)}
-        if self._record.get('mediaType') in PORTALTYPE_TO_MIMETYPE_MAPPING:
-            self._record['mediaType'] = \
-                portaltype_to_mimetype(self._record['mediaType'])
-        self.matched = {}
-        self.fields = {}
-        # Parse the matching fields
-        for field_record in kwargs['_keys'].split(QUERY_FIELD_ITEM_SEPARATOR):
-
-            if len(field_record) > 0:
-                term, key = field_record.split(QUERY_FIELD_PAIR_SEPARATOR)
-                self.matched.setdefault(term, set()).add(key)
-                self.fields.setdefault(key, set()).add(term)
-        self.match_hits = (self.matched, self.fields)
+        keys = kwargs.pop('_keys')
+        kwargs.pop('matched', None)
+        kwargs.pop('fields', None)
+        if kwargs.get('mediaType') in PORTALTYPE_TO_MIMETYPE_MAPPING:
+            kwargs['mediaType'] = portaltype_to_mimetype(kwargs['mediaType'])
+        names = tuple(sorted(kwargs))
+        self._fields = _record_fields(names)
+        self._values = tuple([kwargs[name] for name in names])
+        self._keys = keys
+        self._match_hits = None
+
+    def __getstate__(self):
+        # The shared names are pickled once for a list of records.
+        return (self._fields[0], self._values, self._keys,)
+
+    def __setstate__(self, state):
+        names, self._values, self._keys = state
+        self._fields = _record_fields(names)
+        self._match_hits = None
 
     def __repr__(self):
         s = "<{} id='{}'>".format(self.__class__.__name__, self['id'])
         return s
 
     def __getitem__(self, key):
-        return self._record[key]
+        return self._values[self._fields[1][key]]
 
     def __iter__(self):
-        return iter(self._record)
+        return iter(self._fields[0])
 
     def __len__(self):
-        return len(self._record)
+        return len(self._values)
+
+    def __contains__(self, key):
+        return key in self._fields[1]
+
+    def get(self, key, default=None):
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def keys(self):
+        return list(self._fields[0])
+
+    def values(self):
+        return list(self._values)
+
+    def items(self):
+        return list(zip(self._fields[0], self._values))
+
+    def __eq__(self, other):
+        if not isinstance(other, Mapping):
+            return NotImplemented
+        return dict(self.items()) == dict(other.items())
+
+    def __ne__(self, other):
+        equal = self.__eq__(other)
+        return equal if equal is NotImplemented else not equal
+
+    __hash__ = None
+
+    @property
+    def match_hits(self):
+        """The search terms by matching field and the matching fields by
+        search term, as a two value tuple of dictionaries of sets.
+        """
+        if self._match_hits is None:
+            matched = {}
+            fields = {}
+            # Parse the matching fields
+            for field_record in self._keys.split(QUERY_FIELD_ITEM_SEPARATOR):
+
+                if len(field_record) > 0:
+                    term, key = field_record.split(QUERY_FIELD_PAIR_SEPARATOR)
+                    matched.setdefault(term, set()).add(key)
+                    fields.setdefault(key, set()).add(term)
+            self._match_hits = (matched, fields,)
+        return self._match_hits
+
+    @property
+    def matched(self):
+        return self.match_hits[0]
+
+    @property
+    def fields(self):
+        return self.match_hits[1]
 
     @property
     def highlighted_abstract(self):
-        """Highlight the found terms in the abstract text."""
+        """Highlight the found terms in the abstract text.
+
+        To highlight several records, see ``highlight_records``.
+        """
         abstract_terms = self.fields.get('abstract', [])
         if abstract_terms:
-            sql = _read_sql_file('highlighted-abstract')
+            sql = SQL_HIGHLIGHTED_ABSTRACT
         else:
-            sql = _read_sql_file('get-abstract')
+            sql = SQL_GET_ABSTRACT
         arguments = {'id': self['id'],
                      'query': ' & '.join(abstract_terms),
                      }
-        with db_connect() as db_connection:
-            with db_connection.cursor() as cursor:
-                cursor.execute(sql, arguments)
-                hl_abstract = cursor.fetchone()
+        with db_cursor() as cursor:
+            cursor.execute(sql, arguments)
+            hl_abstract = cursor.fetchone()
         if hl_abstract:
             return hl_abstract[0]
 
     @property
     def highlighted_fulltext(self):
-        """Highlight the found terms in the fulltext."""
+        """Highlight the found terms in the fulltext.
+
+        To highlight several records, see ``highlight_records``.
+        """
         terms = self.fields.get('fulltext', [])
         if not terms:
             return None
         arguments = {'id': self['id'],
                      'query': ' & '.join(terms),
                      }
-        with db_connect() as db_connection:
-            with db_connection.cursor() as cursor:
-                cursor.execute(_read_sql_file('highlighted-fulltext'),
-                               arguments)
-                hl_fulltext = cursor.fetchone()[0]
+        with db_cursor() as cursor:
+            cursor.execute(SQL_HIGHLIGHTED_FULLTEXT, arguments)
+            hl_fulltext = cursor.fetchone()[0]
         return hl_fulltext
 
 
+Mapping.register(QueryRecord)
+
+
 class QueryResults(Sequence):
     """List of search results.
 
     A listing of query results as well as hit counts and the parsed query
     string. The query is necessary to do in-python set operations on the
     rows.
+
+    Only the ids and weights of the matches (the ``hits``) are kept, from
+    the ``rows`` starting with them. Their records are fetched from the
+    database when indexed, so getting a page of results only selects the
+    records on that page (and iterating selects them all at once).
+    The ``arguments`` of the search are needed to fetch the records.
+    The hit counts are counted by the database when first needed.
     """
 
-    def __init__(self, rows, query, query_type=DEFAULT_QUERY_TYPE):
+    def __init__(self, rows, query, query_type=DEFAULT_QUERY_TYPE,
+                 arguments=None):
         if query_type not in QUERY_TYPES:
             raise ValueError("Invalid query type supplied: '{}'"
                              .format(query_type))
         self._query = query
-        self._records = [QueryRecord(**r[0]) for r in rows]
-        self.counts = {
-            'type': self._count_media(),
-            'subject': self._count_field('subjects'),
-            'keyword': self._count_field('keywords',
-                                         max_results=MAX_VALUES_FOR_KEYWORDS),
-            'authorID': self._count_authors(
-                max_results=MAX_VALUES_FOR_AUTHORS),
-            'pubYear': self._count_publication_year(),
-            }
+        self.arguments = arguments or {}
+        self.hits = [(r[0], r[1],) for r in rows]
+        self._facets = None
+        self._counts = None
 
     def __repr__(self):
         s = "<{} with '{}' results>".format(self.__class__.__name__,
@@ -238,10 +390,45 @@ class QueryResults(Sequence):
         return s
 
     def __getitem__(self, index):
-        return self._records[index]
+        if isinstance(index, slice):
+            return fetch_records(self.hits[index], self.arguments)
+        return fetch_records([self.hits[index]], self.arguments)[0]
+
+    def __iter__(self):
+        # One query for all the records, rather than one per record
+        return iter(self[:])
 
     def __len__(self):
-        return len(self._records)
+        return len(self.hits)
+
+    @property
+    def facets(self):
+        """The number of hits by facet value, as a list of
+        ``(facet, value, count, author)`` tuples, where ``author`` holds
+        the details of the author for the ``authorID`` facet.
+        """
+        if self._facets is None:
+            self._facets = fetch_facets(self.hits)
+        return self._facets
+
+    @facets.setter
+    def facets(self, facets):
+        self._facets = facets
+        self._counts = None
+
+    @property
+    def counts(self):
+        if self._counts is None:
+            self._counts = {
+                'type': self._count_media(),
+                'subject': self._count_field('subject'),
+                'keyword': self._count_field(
+                    'keyword', max_results=MAX_VALUES_FOR_KEYWORDS),
+                'authorID': self._count_authors(
+                    max_results=MAX_VALUES_FOR_AUTHORS),
+                'pubYear': self._count_publication_year(),
+                }
+        return self._counts
 
     @property
     def auxiliary(self):
@@ -251,26 +438,10 @@ class QueryResults(Sequence):
 
     @property
     def _auxiliary_authors(self):
-        attr_name = '_aux_authors'
-        if hasattr(self, attr_name):
-            return getattr(self, attr_name)
-
-        # Used to make the dict hashable for a set([]).
-        class hashabledict(dict):
-            def __hash__(self):
-                # Use the unique value 'id' as the hash value.
-                return hash(self['id'])
-
-        authors = set([])
-        for rec in self._records:
-            for author in rec['authors']:
-                # The author is in dict format, just use it.
-                authors.add(hashabledict(author))
-
-        authors = list(authors)
+        authors = [author for facet, value, count, author in self.facets
+                   if facet == 'authorID']
         authors.sort(lambda x, y: cmp(y['id'], x['id']))
-        setattr(self, attr_name, authors)
-        return getattr(self, attr_name)
+        return authors
 
     @property
     def _auxiliary_types(self):
@@ -279,12 +450,12 @@ class QueryResults(Sequence):
         return [{'id': COLLECTION_MIMETYPE, 'name': 'Book'},
                 {'id': MODULE_MIMETYPE, 'name': 'Page'}]
 
-    def _count_field(self, field_name, sorted=True, max_results=None):
-        counts = {}
-        for rec in self._records:
-            for value in rec[field_name]:
-                counts.setdefault(value, 0)
-                counts[value] += 1
+    def _facet_counts(self, facet_name):
+        return {value: count for facet, value, count, author in self.facets
+                if facet == facet_name}
+
+    def _count_field(self, facet_name, sorted=True, max_results=None):
+        counts = self._facet_counts(facet_name)
 
         if max_results:
             # limit the number of results we return
@@ -308,25 +479,16 @@ class QueryResults(Sequence):
             MODULE_MIMETYPE: 0,
             COLLECTION_MIMETYPE: 0,
             }
-        for rec in self._records:
-            counts[rec['mediaType']] += 1
+        for portal_type, count in self._facet_counts('type').items():
+            counts[portaltype_to_mimetype(portal_type)] += count
         return [(COLLECTION_MIMETYPE, counts[COLLECTION_MIMETYPE],),
                 (MODULE_MIMETYPE, counts[MODULE_MIMETYPE],),
                 ]
 
     def _count_authors(self, max_results=None):
-        counts = {}
-        uid_author = {}  # look up author record by uid
-        for rec in self._records:
-            for author in rec['authors']:
-                uid = author['id']
-                counts.setdefault(uid, 0)
-                counts[uid] += 1
-                uid_author.setdefault(uid, author)
-        authors = []
-        for uid, count in counts.iteritems():
-            author = uid_author[uid]
-            authors.append(((uid, author,), count))
+        authors = [((value, author,), count)
+                   for facet, value, count, author in self.facets
+                   if facet == 'authorID']
 
         if max_results:
             # limit the number of results we return
@@ -347,17 +509,7 @@ class QueryResults(Sequence):
         return authors
 
     def _count_publication_year(self):
-        counts = {}
-        for rec in self._records:
-            date = rec['pubDate']
-            if date is None:
-                continue
-            date = datetime(*strptime(date, "%Y-%m-%dT%H:%M:%SZ")[:6],
-                            tzinfo=FixedOffsetTimezone())
-            year = unicode(date.astimezone(LOCAL_TZINFO).year)
-            counts.setdefault(year, 0)
-            counts[year] += 1
-        counts = counts.items()
+        counts = self._facet_counts('pubYear').items()
         # Sort pubYear in reverse chronological order
         counts.sort(lambda a, b: cmp(a[0], b[0]), reverse=True)
         return counts
@@ -396,6 +548,20 @@ def _upper(val_list):
     return res
 
 
+def _canonical_filter(keyword, value):
+    """Normalize the ``value`` of the ``keyword`` filter the way
+    it's compared in the database.
+    """
+    value = value.strip()
+    if keyword == 'type':
+        value = TYPE_SYNONYMS.get(value.lower(), value.lower())
+    elif keyword == 'subject':
+        value = value.lower()
+    elif keyword == 'keyword':
+        value = value.upper()
+    return keyword, value
+
+
 def _filter_stop_words(raw_query):
     return [term for term in raw_query if term.lower() not in STOPWORDS]
 
@@ -407,6 +573,9 @@ def _build_search(structured_query):
     by the DBAPI v2 execute method.
     For example, ``cursor.execute(*_build_search(query, weights))``
 
+    The statement is built from the canonical form of the query,
+    see ``Query.canonical``.
+
     :param query: containing terms, filters, and sorts.
     :type query: Query
     :param weights: weight values to assign to each keyword search field
@@ -416,9 +585,10 @@ def _build_search(structured_query):
             arguments to pass into that template
     """
     arguments = {}
+    canonical_query = structured_query.canonical()
 
     # get text terms and filter out common words
-    text_terms = [term for ttype, term in structured_query.terms
+    text_terms = [term for ttype, term in canonical_query.terms
                   if ttype == 'text']
 
     text_terms_wo_stopwords = [term for term in text_terms
@@ -448,7 +618,7 @@ def _build_search(structured_query):
 
     idx = 0
     invalid_filters = []
-    filters = _convert(structured_query.filters, [])
+    filters = _convert(canonical_query.filters, [])
 
     while idx < len(filters):
         keyword = filters[idx][0]
@@ -462,14 +632,10 @@ def _build_search(structured_query):
                                       <@ cm.authors'
             arguments.update({'authorID': value[0]})
         elif keyword == 'type':
-            value[0] = value[0].lower()
-
             conditions['type'] = 'AND cm.portal_type = %(type)s'
-            if value[0] != 'book' and value[0] != 'collection' and \
-                    value[0] != 'page' and value[0] != 'module':
+            if value[0] not in ('book', 'page',):
                 invalid_filters.append(idx)
-            value[0] = 'Collection' if (value[0] == 'book' or
-                                        value[0] == 'collection') else 'Module'
+            value[0] = 'Collection' if value[0] == 'book' else 'Module'
             arguments.update({'type': value[0]})
         elif keyword == 'keyword':
             value = _upper(value)
@@ -490,7 +656,7 @@ def _build_search(structured_query):
             conditions['subject'] = 'AND cm.module_ident = \
                                      ANY(WITH sub AS ( \
                                      SELECT module_ident AS id, \
-                                     array_agg(tag) AS atag \
+                                     array_agg(lower(tag)) AS atag \
                                      FROM latest_modules \
                                      NATURAL JOIN \
                                      moduletags NATURAL JOIN \
@@ -530,22 +696,23 @@ def _build_search(structured_query):
             invalid_filters.append(idx)
         idx += 1
 
-    if len(invalid_filters) == len(structured_query.filters) and \
-            len(structured_query.terms) == 0:
+    if len(invalid_filters) == len(filters) and \
+            len(canonical_query.terms) == 0:
         # Either query terms are all invalid filters
         # or we received a null query.
         # Clear the filter list in this case.
         structured_query.filters = []
         return None, None
 
-    for invalid_filter_idx in invalid_filters:
-        # Remove invalid filters.
-        del structured_query.filters[invalid_filter_idx]
+    # Remove invalid filters.
+    invalid_keywords = [filters[idx][0] for idx in invalid_filters]
+    structured_query.filters = [f for f in structured_query.filters
+                                if f[0] not in invalid_keywords]
 
     # Add the arguments for sorting.
     sorts = ['portal_type']
-    if structured_query.sorts:
-        for sort in structured_query.sorts:
+    if canonical_query.sorts:
+        for sort in canonical_query.sorts:
             # These sort values are not the name of the column used
             #   in the database.
             stmt = _transmute_sort(sort)
@@ -553,17 +720,17 @@ def _build_search(structured_query):
     sorts.extend(('weight DESC', 'uuid DESC',))
     sorts = ', '.join(sorts)
 
-    statement = SQL_QUICK_SELECT_WRAPPER.format(conditions['pubYear'],
-                                                conditions['authorID'],
-                                                conditions['type'],
-                                                conditions['keyword'],
-                                                conditions['subject'],
-                                                conditions['text_terms'],
-                                                conditions['language'],
-                                                conditions['title'],
-                                                conditions['author'],
-                                                conditions['abstract'],
-                                                sorts=sorts)
+    statement = SQL_HITS_SELECT_WRAPPER.format(conditions['pubYear'],
+                                               conditions['authorID'],
+                                               conditions['type'],
+                                               conditions['keyword'],
+                                               conditions['subject'],
+                                               conditions['text_terms'],
+                                               conditions['language'],
+                                               conditions['title'],
+                                               conditions['author'],
+                                               conditions['abstract'],
+                                               sorts=sorts)
     return statement, arguments
 
 
@@ -577,7 +744,8 @@ def search(query, query_type=DEFAULT_QUERY_TYPE):
     :param query: containing terms, filters, and sorts.
     :type query: Query
     :returns: a sequence of records that match the query conditions
-    :rtype: QueryResults (which is a sequence of QueryRecord objects)
+    :rtype: QueryResults (which is a sequence of QueryRecord objects,
+            fetched when indexed)
     """
 
     # Build the SQL statement.
@@ -586,9 +754,82 @@ def search(query, query_type=DEFAULT_QUERY_TYPE):
     # Execute the SQL.
     if statement is None and arguments is None:
         return QueryResults([], [], 'AND')
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            cursor.execute(statement, arguments)
-            search_results = cursor.fetchall()
+    with db_cursor() as cursor:
+        cursor.execute(statement, arguments)
+        search_results = cursor.fetchall()
     # Wrap the SQL results.
-    return QueryResults(search_results, query, query_type)
+    record_arguments = {name: arguments[name]
+                        for name in ('text_terms', 'fulltext_key',)}
+    return QueryResults(search_results, query, query_type,
+                        arguments=record_arguments)
+
+
+def fetch_records(hits, arguments):
+    """Fetch the records of the search ``hits`` (``(id, weight)`` pairs),
+    in the same order.
+
+    :param hits: the matches to fetch the records of
+    :type hits: sequence of two value tuples
+    :param arguments: the ``text_terms`` and ``fulltext_key`` of the search
+    :type arguments: dictionary
+    :returns: the records of the matches
+    :rtype: list of QueryRecord objects
+    """
+    if not hits:
+        return []
+    ids, weights = zip(*hits)
+    arguments = dict(arguments, ids=list(ids), weights=list(weights))
+    arguments.setdefault('text_terms', '')
+    arguments.setdefault('fulltext_key', '')
+    with db_cursor() as cursor:
+        cursor.execute(SQL_RECORDS_SELECT, arguments)
+        rows = cursor.fetchall()
+    return [QueryRecord(**r[0]) for r in rows]
+
+
+def highlight_records(records):
+    """Highlight the found terms in the abstract and the fulltext of the
+    search ``records``, with one query.
+
+    :param records: the records to highlight
+    :type records: sequence of QueryRecord objects
+    :returns: the ``highlighted_abstract`` and ``highlighted_fulltext`` of
+              each record, in the same order
+    :rtype: list of two value tuples
+    """
+    if not records:
+        return []
+    arguments = {
+        'ids': [record['id'] for record in records],
+        'abstract_queries': [' & '.join(record.fields.get('abstract', []))
+                             for record in records],
+        'fulltext_queries': [' & '.join(record.fields.get('fulltext', []))
+                             for record in records],
+        }
+    with db_cursor() as cursor:
+        cursor.execute(SQL_HIGHLIGHTS_SELECT, arguments)
+        return [tuple(row) for row in cursor.fetchall()]
+
+
+def fetch_facets(hits):
+    """Count the search ``hits`` (``(id, weight)`` pairs) by type,
+    subject, keyword, author and year of publication.
+
+    :param hits: the matches to count
+    :type hits: sequence of two value tuples
+    :returns: the number of matches by facet value
+    :rtype: list of ``(facet, value, count, author)`` tuples
+    """
+    if not hits:
+        return []
+    # The year of publication is that in the local time zone. A year
+    # starts at the same UTC offset every year (e.g. that of winter time).
+    new_year = datetime(datetime.now().year, 1, 1)
+    arguments = {'ids': [id for id, weight in hits],
+                 'utc_offset': LOCAL_TZINFO.utcoffset(new_year),
+                 }
+    with db_cursor() as cursor:
+        cursor.execute(SQL_FACETS_SELECT, arguments)
+        rows = cursor.fetchall()
+    return [(r[0]['facet'], r[0]['value'], r[0]['count'], r[0]['author'],)
+            for r in rows]
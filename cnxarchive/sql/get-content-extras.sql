@@ -0,0 +1,143 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- Everything the content-extras view needs from the database, as one row.
+-- arguments: id:string; version:string;
+--            context_id:string; context_version:string
+WITH RECURSIVE doc AS (
+  SELECT m.module_ident, m.moduleid, m.version, m.name, m.portal_type,
+         m.stateid, ms.statename
+  FROM modules m
+  LEFT JOIN modulestates ms ON m.stateid = ms.stateid
+  WHERE m.uuid = %(id)s::uuid
+  AND module_version(m.major_version, m.minor_version) = %(version)s
+),
+
+-- The book given as context and its (uncollated) tree.
+context AS (
+  SELECT m.module_ident
+  FROM modules m
+  WHERE m.uuid = %(context_id)s::uuid
+  AND module_version(m.major_version, m.minor_version) = %(context_version)s
+),
+
+context_tree(node, path, value) AS (
+  SELECT tr.nodeid, ARRAY[tr.nodeid], tr.documentid
+  FROM trees tr, context c
+  WHERE tr.documentid = c.module_ident
+  AND tr.parent_id IS NULL
+  AND tr.is_collated = FALSE
+UNION ALL
+  SELECT c1.nodeid, t.path || ARRAY[c1.nodeid], c1.documentid
+  FROM trees c1
+  JOIN context_tree t ON (c1.parent_id = t.node)
+  WHERE NOT c1.nodeid = ANY (t.path)
+  AND c1.is_collated = FALSE
+),
+
+context_book(title, ident_hash, shortId, authors, revised) AS (
+  SELECT m.name,
+         ident_hash(m.uuid, m.major_version, m.minor_version),
+         short_ident_hash(m.uuid, m.major_version, m.minor_version),
+         ARRAY(
+           SELECT row_to_json(user_row) FROM
+             (SELECT u.username,
+                     u.first_name AS firstname, u.last_name AS surname,
+                     u.full_name AS fullname, u.title, u.suffix
+             ) AS user_row),
+         m.revised
+  FROM context c
+  JOIN modules m ON m.module_ident = c.module_ident
+  JOIN users AS u ON u.username = ANY(m.authors)
+  WHERE EXISTS (
+    SELECT 1 FROM context_tree t, doc d WHERE t.value = d.module_ident)
+  LIMIT 1
+),
+
+-- The books containing the page (see get-books-containing-page.sql).
+t(node, title, parent, path, value) AS (
+  SELECT nodeid, title, parent_id, ARRAY[nodeid], documentid
+  FROM trees tr, doc d
+  WHERE tr.documentid = d.module_ident
+  AND d.portal_type = 'Module'
+  AND tr.parent_id IS NOT NULL
+UNION ALL
+  SELECT c1.nodeid, c1.title, c1.parent_id,
+         t.path || ARRAY[c1.nodeid], c1.documentid
+  FROM trees c1
+  JOIN t ON (c1.nodeid = t.parent)
+  WHERE not nodeid = any (t.path)
+),
+
+books(uuid, major_version, minor_version, title, revised, authors, authorUsernames) AS (
+  SELECT m.uuid, m.major_version, m.minor_version, COALESCE(t.title, m.name), m.revised,
+         (SELECT ARRAY(
+           SELECT row_to_json(user_row) FROM
+             (SELECT u.username,
+             u.first_name as firstname, u.last_name as surname,
+             u.full_name as fullname, u.title, u.suffix)
+           as user_row)),
+          m.authors
+  FROM t
+  JOIN modules m ON t.value = m.module_ident
+  JOIN users as u on u.username = ANY(m.authors)
+  WHERE t.parent IS NULL
+  ORDER BY uuid, major_version desc, minor_version desc
+),
+
+page(authors) AS (
+  SELECT m.authors FROM modules m, doc d
+  WHERE m.module_ident = d.module_ident
+),
+
+top_books(title, ident_hash, short_ident_hash, authors, revised, authorUsernames) AS (
+SELECT first(title),
+       ident_hash(uuid, first(major_version), first(minor_version)),
+       short_ident_hash(uuid, first(major_version), first(minor_version)),
+       first(authors),
+       first(revised),
+       first(authorUsernames)
+  FROM books GROUP BY uuid
+)
+
+SELECT row_to_json(combined_rows) AS extras
+FROM (SELECT
+  (SELECT row_to_json(doc_row) FROM (
+     SELECT d.moduleid AS legacy_id, d.version AS legacy_version,
+            d.name AS title, d.portal_type AS "mediaType", d.stateid
+     FROM doc d
+   ) AS doc_row) AS metadata,
+  (SELECT module_version(m.major_version, m.minor_version)
+   FROM latest_modules m
+   WHERE m.uuid = %(id)s::uuid) AS "latestVersion",
+  (SELECT module_version(m.major_version, m.minor_version)
+   FROM modules m
+   WHERE m.uuid = %(id)s::uuid
+   AND m.major_version = (
+     SELECT max(major_version) FROM modules m2
+     WHERE m.uuid = m2.uuid)
+   AND (m.minor_version IS NULL OR
+        m.minor_version = (
+          SELECT max(minor_version) FROM modules m3
+          WHERE m.uuid = m3.uuid AND m.major_version = m3.major_version))
+   LIMIT 1) AS "headVersion",
+  ARRAY(SELECT DISTINCT user_id
+        FROM document_acl
+        WHERE uuid = %(id)s::uuid AND permission = 'publish'
+        ORDER BY user_id) AS "canPublish",
+  (SELECT d.statename FROM doc d) AS state,
+  CASE WHEN %(context_id)s::uuid IS NULL THEN
+    ARRAY(SELECT row_to_json(book_row) FROM (
+            SELECT tb.title, tb.ident_hash, tb.short_ident_hash AS shortId,
+                   tb.authors, tb.revised
+            FROM top_books tb, page p
+            ORDER BY tb.authorUsernames = p.authors DESC, tb.revised DESC
+          ) AS book_row)
+  ELSE
+    ARRAY(SELECT row_to_json(cb) FROM context_book cb)
+  END AS books
+) combined_rows;
@@ -0,0 +1,11 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- arguments: fileid:integer; offset:integer (zero based); size:integer
+SELECT substring(f.file FROM %(offset)s + 1 FOR %(size)s)
+FROM files AS f
+WHERE f.fileid = %(fileid)s;
@@ -0,0 +1,14 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- The file itself is only included when it is no larger than max_size,
+-- larger files are read with get-resource-chunk.
+-- arguments: hash:string; max_size:integer
+SELECT f.fileid, f.media_type, octet_length(f.file) AS size,
+       CASE WHEN octet_length(f.file) <= %(max_size)s THEN f.file END AS file
+FROM files AS f
+WHERE f.sha1 = %(hash)s OR f.md5 = %(hash)s;
@@ -0,0 +1,74 @@
+# -*- coding: utf-8 -*-
+
+
+def up(cursor):
+    # Notify archive processes, listening on the 'cnxarchive_cache'
+    # channel, of changes to the content they cache.
+    cursor.execute("""\
+CREATE OR REPLACE FUNCTION notify_archive_cache() RETURNS trigger AS $$
+DECLARE
+  _rec RECORD;
+  _module_ident INTEGER;
+BEGIN
+  IF TG_LEVEL = 'STATEMENT' THEN
+    PERFORM pg_notify('cnxarchive_cache',
+                      json_build_object('table', TG_TABLE_NAME)::text);
+    RETURN NULL;
+  END IF;
+  IF TG_OP = 'DELETE' THEN
+    _rec := OLD;
+  ELSE
+    _rec := NEW;
+  END IF;
+  IF TG_TABLE_NAME = 'modules' THEN
+    PERFORM pg_notify('cnxarchive_cache', json_build_object(
+      'table', TG_TABLE_NAME,
+      'uuid', _rec.uuid,
+      'version', module_version(_rec.major_version, _rec.minor_version)
+      )::text);
+    RETURN NULL;
+  ELSIF TG_TABLE_NAME = 'collated_file_associations' THEN
+    _module_ident := _rec.context;
+  ELSE
+    _module_ident := _rec.module_ident;
+  END IF;
+  PERFORM pg_notify('cnxarchive_cache', json_build_object(
+    'table', TG_TABLE_NAME,
+    'uuid', m.uuid,
+    'version', module_version(m.major_version, m.minor_version)
+    )::text)
+  FROM modules AS m
+  WHERE m.module_ident = _module_ident;
+  RETURN NULL;
+END;
+$$ LANGUAGE 'plpgsql';
+
+CREATE TRIGGER notify_archive_cache
+  AFTER INSERT OR UPDATE OR DELETE ON modules FOR EACH ROW
+  EXECUTE PROCEDURE notify_archive_cache();
+
+CREATE TRIGGER notify_archive_cache
+  AFTER INSERT OR UPDATE OR DELETE ON module_files FOR EACH ROW
+  EXECUTE PROCEDURE notify_archive_cache();
+
+CREATE TRIGGER notify_archive_cache
+  AFTER INSERT OR UPDATE OR DELETE ON collated_file_associations
+  FOR EACH ROW
+  EXECUTE PROCEDURE notify_archive_cache();
+
+-- Trees are changed many nodes at a time, of which only the root knows
+-- the book, so a single notification is sent for the statement.
+CREATE TRIGGER notify_archive_cache
+  AFTER INSERT OR UPDATE OR DELETE ON trees FOR EACH STATEMENT
+  EXECUTE PROCEDURE notify_archive_cache();
+""")
+
+
+def down(cursor):
+    cursor.execute("""\
+DROP TRIGGER IF EXISTS notify_archive_cache ON modules;
+DROP TRIGGER IF EXISTS notify_archive_cache ON module_files;
+DROP TRIGGER IF EXISTS notify_archive_cache ON collated_file_associations;
+DROP TRIGGER IF EXISTS notify_archive_cache ON trees;
+DROP FUNCTION IF EXISTS notify_archive_cache();
+""")
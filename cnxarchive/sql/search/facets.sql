@@ -0,0 +1,67 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- The number of search matches by type, subject, keyword, author and
+-- year of publication (in the time zone at the given UTC offset).
+-- arguments: ids:uuid[]; utc_offset:interval
+SELECT row_to_json(facet_rows) as results
+FROM (
+
+WITH hits AS (
+  SELECT lm.module_ident, lm.portal_type, lm.revised, lm.authors
+  FROM unnest(%(ids)s::uuid[]) AS h (uuid)
+       JOIN latest_modules AS lm ON (lm.uuid = h.uuid)
+  )
+
+SELECT 'type' AS facet, hits.portal_type AS value, count(*) AS count,
+       NULL::json AS author
+FROM hits
+GROUP BY hits.portal_type
+
+UNION ALL
+
+SELECT 'subject', tags.tag, count(*), NULL
+FROM hits
+     JOIN moduletags AS mt ON (mt.module_ident = hits.module_ident)
+     JOIN tags ON (mt.tagid = tags.tagid)
+GROUP BY tags.tag
+
+UNION ALL
+
+SELECT 'keyword', k.word, count(*), NULL
+FROM hits
+     JOIN modulekeywords AS mk ON (mk.module_ident = hits.module_ident)
+     JOIN keywords AS k ON (mk.keywordid = k.keywordid)
+GROUP BY k.word
+
+UNION ALL
+
+SELECT 'authorID', u.username, count(*),
+       json_build_object('id', u.username,
+                         'firstname', u.first_name,
+                         'surname', u.last_name,
+                         'fullname', u.full_name,
+                         'title', u.title,
+                         'suffix', u.suffix)
+FROM hits
+     JOIN users AS u ON (u.username::text = ANY (hits.authors))
+GROUP BY u.username, u.first_name, u.last_name, u.full_name,
+         u.title, u.suffix
+
+UNION ALL
+
+SELECT 'pubYear', year::text, count(*), NULL
+FROM (
+  SELECT extract(year FROM (hits.revised AT TIME ZONE 'UTC')
+                           + %(utc_offset)s::interval)::integer AS year
+  FROM hits
+  WHERE hits.revised IS NOT NULL
+  ) AS years
+GROUP BY year
+
+) AS facet_rows
+;
@@ -0,0 +1,34 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- The abstract and fulltext headlines of the given records, in the given
+-- order, with the terms of each record's queries highlighted.
+-- Without an abstract query the abstract isn't highlighted and
+-- without a fulltext query there's no fulltext headline.
+-- arguments: ids:uuid[]; abstract_queries:string[]; fulltext_queries:string[]
+SELECT
+  CASE
+    WHEN hl.abstract_query = ''
+      THEN ts_headline(ab.abstract, '',
+                       'ShortWord=5, MinWords=50, MaxWords=60')
+    ELSE ts_headline(ab.abstract, plainto_tsquery(hl.abstract_query),
+                     'StartSel=<b>, StopSel=</b>, ShortWord=5, MinWords=50, MaxWords=60')
+  END AS abstract,
+  CASE
+    WHEN hl.fulltext_query = '' THEN NULL
+    ELSE ts_headline(mfti.fulltext, plainto_tsquery(hl.fulltext_query),
+                     'StartSel=<b>, StopSel=</b>, ShortWord=5, MinWords=50, MaxWords=60')
+  END AS fulltext
+FROM
+  unnest(%(ids)s::uuid[], %(abstract_queries)s::text[],
+         %(fulltext_queries)s::text[])
+    WITH ORDINALITY AS hl (uuid, abstract_query, fulltext_query, position)
+  LEFT JOIN latest_modules AS lm ON (lm.uuid = hl.uuid)
+  LEFT JOIN abstracts AS ab ON (lm.abstractid = ab.abstractid)
+  LEFT JOIN modulefti AS mfti ON (lm.module_ident = mfti.module_ident)
+ORDER BY hl.position
+;
@@ -0,0 +1,92 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- The ids and weights of all the matches of a search, in order.
+-- Their records are selected, a page at a time, by records.sql
+-- and their facets are counted by facets.sql.
+-- arguments text_terms:string "%(text_terms)s"
+WITH weighted_query_results AS (
+  SELECT
+
+  cm.module_ident,
+
+  ts_rank_cd(module_idx, plainto_tsquery(%(text_terms)s)) as weight
+
+FROM
+
+  latest_modules cm,
+
+  modulefti mf
+
+WHERE
+
+  cm.module_ident = mf.module_ident
+
+-- text_terms
+  {5}
+
+-- pubYear
+  {0}
+
+-- authorID
+  {1}
+
+-- type
+  {2}
+
+-- keyword
+  {3}
+
+-- subject
+  {4}
+
+-- language
+  {6}
+
+-- title
+  {7}
+
+-- author
+  {8}
+
+-- abstract
+  {9}
+
+  ),
+
+derived_weighted_query_results AS (
+  SELECT
+    wqr.module_ident,
+    (CASE WHEN lm.parent IS NOT NULL
+          THEN (weight - length(to_tsvector(%(text_terms)s))) * 2 ^ length(to_tsvector(%(text_terms)s)) - 1
+          ELSE weight * 2 ^ length(to_tsvector(%(text_terms)s))
+    END) AS weight
+  FROM weighted_query_results AS wqr
+       LEFT JOIN latest_modules AS lm ON (wqr.module_ident = lm.module_ident)
+  )
+
+SELECT
+  lm.uuid::text as id,
+  wqr.weight as "weight",
+  -- Only used to sort by
+  CASE
+    WHEN lm.portal_type = 'Collection'
+      THEN lm.major_version || '.' || lm.minor_version
+    ELSE lm.major_version || ''
+  END AS version
+-- Only retrieve the most recent published modules.
+FROM
+  latest_modules AS lm
+  LEFT OUTER JOIN recent_hit_ranks ON (lm.uuid = document),
+  derived_weighted_query_results AS wqr
+WHERE
+  wqr.module_ident = lm.module_ident
+  AND lm.portal_type not in  ('CompositeModule','SubCollection')
+
+-- sort
+ORDER BY {sorts}
+;
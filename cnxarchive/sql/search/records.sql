@@ -0,0 +1,52 @@
+-- ###
+-- Copyright (c) 2026, Rice University
+-- This software is subject to the provisions of the GNU Affero General
+-- Public License version 3 (AGPLv3).
+-- See LICENCE.txt for details.
+-- ###
+
+-- The search records of the given matches, in the given order.
+-- arguments: ids:uuid[]; weights:float[];
+--            text_terms:string; fulltext_key:string
+SELECT row_to_json(combined_rows) as results
+FROM (
+
+SELECT
+  lm.name as title, title_order(lm.name) as "sortTitle",
+  lm.uuid as id,
+  CASE
+    WHEN lm.portal_type = 'Collection'
+      THEN lm.major_version || '.' || lm.minor_version
+    ELSE lm.major_version || ''
+  END AS version,
+  lm.language,
+  lm.portal_type as "mediaType",
+  iso8601(lm.revised) as "pubDate",
+  ARRAY(SELECT k.word FROM keywords as k, modulekeywords as mk
+        WHERE mk.module_ident = lm.module_ident
+              AND mk.keywordid = k.keywordid) as keywords,
+  ARRAY(SELECT tags.tag FROM tags, moduletags as mt
+        WHERE mt.module_ident = lm.module_ident
+              AND mt.tagid = tags.tagid) as subjects,
+  ARRAY(SELECT row_to_json(user_rows) FROM
+        (SELECT username as id,
+                first_name as firstname, last_name as surname,
+                full_name as fullname, title, suffix
+         FROM users
+         WHERE users.username::text = ANY (lm.authors)
+         ) as user_rows) as authors,
+  -- The following are used internally for further sorting and debugging.
+  hits.weight as "weight", rank,
+  %(fulltext_key)s as _keys, '' as matched, '' as fields,
+  ts_headline(ab.html,plainto_tsquery(%(text_terms)s), 'ShortWord=5, MinWords=50, MaxWords=60') as abstract,
+  NULL as headline
+FROM
+  unnest(%(ids)s::uuid[], %(weights)s::float[])
+    WITH ORDINALITY AS hits (uuid, weight, position)
+  JOIN latest_modules AS lm ON (lm.uuid = hits.uuid)
+  LEFT JOIN abstracts AS ab ON (lm.abstractid = ab.abstractid)
+  LEFT OUTER JOIN recent_hit_ranks ON (lm.uuid = document)
+ORDER BY hits.position
+
+) as combined_rows
+;
@@ -0,0 +1,35 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class BenchmarkQueryParsingTestCase(unittest.TestCase):
+
+    def call_target(self, *args, **kwargs):
+        from ...scripts.benchmark_query_parsing import benchmark
+        return benchmark(*args, **kwargs)
+
+    def test_benchmark(self):
+        timings = self.call_target(['college physics', 'type:book'],
+                                   number=2)
+        self.assertEqual([t[0] for t in timings],
+                         ['college physics', 'type:book'])
+        for query, parse, cached in timings:
+            self.assertTrue(parse > 0)
+            self.assertTrue(cached > 0)
+
+    @mock.patch('sys.stdout')
+    def test_main(self, stdout):
+        from ...scripts.benchmark_query_parsing import main
+        self.assertEqual(main(['-n', '1']), 0)
+        lines = ''.join([c[0][0] for c in stdout.write.call_args_list])
+        self.assertIn('college physics', lines)
@@ -0,0 +1,297 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import pickle
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from pyramid import testing as pyramid_testing
+
+
+class MemoryBackendTestCase(unittest.TestCase):
+
+    def make_one(self, *args, **kwargs):
+        from ..cache import PickledMemoryBackend
+        return PickledMemoryBackend(*args, **kwargs)
+
+    def test_get_set(self):
+        backend = self.make_one()
+        value = {'hits': [('e79ffde3-7fb4-4af3-9ec8-df648b391597', 1.0)]}
+        self.assertEqual(backend.get('key'), None)
+        backend.set('key', value, 60)
+        self.assertEqual(backend.get('key'), value)
+        # Callers don't share the cached value
+        self.assertIsNot(backend.get('key'), backend.get('key'))
+
+    @mock.patch('cnxarchive.cache.time')
+    def test_expire(self, time):
+        backend = self.make_one()
+        time.time.return_value = 1000
+        backend.set('key', 'value', 60)
+        backend.set('forever', 'value', 0)
+        time.time.return_value = 1061
+        self.assertEqual(backend.get('key'), None)
+        self.assertEqual(backend.get('forever'), 'value')
+
+    def test_max_size(self):
+        backend = self.make_one(max_size=1024)
+        backend.set('small', 'value', 60)
+        backend.set('large', 'x' * 2048, 60)
+        self.assertEqual(backend.get('small'), 'value')
+        self.assertEqual(backend.get('large'), None)
+
+
+class TieredBackendTestCase(unittest.TestCase):
+
+    def make_one(self):
+        from ..cache import MemoryBackend, TieredBackend
+        self.l1 = MemoryBackend()
+        self.l2 = MemoryBackend()
+        return TieredBackend([self.l1, self.l2])
+
+    def test_set(self):
+        backend = self.make_one()
+        backend.set('key', 'value', 60)
+        self.assertEqual(self.l1.get('key'), 'value')
+        self.assertEqual(self.l2.get('key'), 'value')
+        self.assertEqual(backend.get('key'), 'value')
+
+    def test_refill(self):
+        backend = self.make_one()
+        self.l2.set('key', 'value', 3600)
+        with mock.patch.object(self.l1, 'set') as set:
+            self.assertEqual(backend.get('key'), 'value')
+        from ..cache import REFILL_EXPIRATION
+        set.assert_called_once_with('key', 'value', REFILL_EXPIRATION)
+        self.assertEqual(backend.get('missing'), None)
+
+
+class SearchCacheFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings):
+        from ..cache import search_cache_from_settings
+        return search_cache_from_settings(settings)
+
+    def test_disabled(self):
+        self.assertEqual(self.call_target({'memcache-servers': ''}), None)
+        self.assertEqual(self.call_target({'memcache-servers': 'localhost',
+                                           'search-cache': ''}), None)
+
+    def test_memcache_servers(self):
+        from ..cache import MemcachedBackend
+        backend = self.call_target({'memcache-servers': 'localhost'})
+        self.assertTrue(isinstance(backend, MemcachedBackend))
+
+    def test_memory(self):
+        from ..cache import PickledMemoryBackend
+        backend = self.call_target({'memcache-servers': '',
+                                    'search-cache': 'memory',
+                                    'search-cache-max-size': '1024'})
+        self.assertTrue(isinstance(backend, PickledMemoryBackend))
+        self.assertEqual(backend._cache.max_size, 1024)
+
+    @mock.patch('cnxarchive.cache.redis')
+    def test_tiered(self, redis):
+        from ..cache import (
+            MemcachedBackend, PickledMemoryBackend, RedisBackend,
+            TieredBackend,
+            )
+        backend = self.call_target({
+            'memcache-servers': 'localhost',
+            'search-cache': 'memory memcached redis',
+            'search-cache-redis-url': 'redis://localhost:6379/0',
+            })
+        self.assertTrue(isinstance(backend, TieredBackend))
+        self.assertEqual([type(b) for b in backend.backends],
+                         [PickledMemoryBackend, MemcachedBackend,
+                          RedisBackend])
+        redis.StrictRedis.from_url.assert_called_once_with(
+            'redis://localhost:6379/0')
+
+    @mock.patch('cnxarchive.cache.redis', None)
+    def test_redis_not_installed(self):
+        with self.assertRaises(ValueError):
+            self.call_target({'search-cache': 'redis',
+                              'search-cache-redis-url': 'redis://localhost'})
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            self.call_target({'search-cache': 'floppy'})
+
+
+class RedisBackendTestCase(unittest.TestCase):
+
+    @mock.patch('cnxarchive.cache.redis')
+    def test_get_set(self, redis):
+        from ..cache import RedisBackend
+        client = redis.StrictRedis.from_url.return_value
+        backend = RedisBackend('redis://localhost')
+
+        backend.set('key', ['value'], 0)
+        (key, value), kwargs = client.set.call_args
+        self.assertEqual((key, pickle.loads(value), kwargs),
+                         ('key', ['value'], {'ex': None}))
+        client.get.return_value = value
+        self.assertEqual(backend.get('key'), ['value'])
+        client.get.return_value = None
+        self.assertEqual(backend.get('key'), None)
+
+
+class GetSearchCacheTestCase(unittest.TestCase):
+
+    def test_from_settings(self):
+        # Without ``main`` the cache is made once from the settings.
+        from ..cache import get_search_cache, PickledMemoryBackend
+        pyramid_testing.setUp(settings={'memcache-servers': '',
+                                        'search-cache': 'memory'})
+        self.addCleanup(pyramid_testing.tearDown)
+        backend = get_search_cache()
+        self.assertTrue(isinstance(backend, PickledMemoryBackend))
+        self.assertIs(get_search_cache(), backend)
+
+
+class SingleFlightTestCase(unittest.TestCase):
+
+    def test_shared_result(self):
+        import threading
+        from ..cache import SingleFlight
+        flights = SingleFlight()
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def compute():
+            calls.append(1)
+            started.set()
+            release.wait(5)
+            return 'value'
+
+        results = []
+        leader = threading.Thread(
+            target=lambda: results.append(flights.run('key', compute)))
+        leader.start()
+        started.wait(5)
+        # Another run of the key doesn't wait unless told to
+        self.assertEqual(flights.run('key', compute, wait=False), None)
+        follower = threading.Thread(
+            target=lambda: results.append(flights.run('key', compute)))
+        follower.start()
+        release.set()
+        leader.join()
+        follower.join()
+        self.assertEqual(results, ['value', 'value'])
+        self.assertEqual(len(calls), 1)
+
+    def test_failure(self):
+        from ..cache import SingleFlight
+        flights = SingleFlight()
+
+        def compute():
+            raise RuntimeError()
+
+        with self.assertRaises(RuntimeError):
+            flights.run('key', compute)
+        self.assertEqual(flights.run('key', lambda: 'value'), 'value')
+
+
+class CachedTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from ..cache import PickledMemoryBackend
+        pyramid_testing.setUp(settings={'search-cache-max-stale': '600'})
+        self.addCleanup(pyramid_testing.tearDown)
+        self.cache = PickledMemoryBackend()
+        self.compute = mock.Mock(return_value='new')
+
+    def call_target(self, **kwargs):
+        from ..cache import _cached
+        return _cached(self.cache, 'key', self.compute, 60, **kwargs)
+
+    @mock.patch('cnxarchive.cache.time')
+    def test_miss(self, time):
+        time.time.return_value = 1000
+        self.assertEqual(self.call_target(), 'new')
+        self.assertEqual(self.cache.get('key'), (1060, 'new'))
+        # Unlocked for the next time the value expires
+        self.assertEqual(self.cache.get('key:lock'), None)
+
+    def test_fresh(self):
+        self.call_target()
+        self.compute.return_value = 'newer'
+        self.assertEqual(self.call_target(), 'new')
+        self.assertEqual(self.compute.call_count, 1)
+        self.assertEqual(self.call_target(nocache=True), 'newer')
+        self.assertEqual(self.compute.call_count, 2)
+
+    @mock.patch('cnxarchive.cache.time')
+    def test_stale(self, time):
+        time.time.return_value = 1000
+        self.cache.set('key', (900, 'old'), 0)
+        # Another worker is revalidating the value
+        self.cache.add('key:lock', 1, 30)
+        self.assertEqual(self.call_target(), 'old')
+        self.assertFalse(self.compute.called)
+
+        self.cache.delete('key:lock')
+        self.assertEqual(self.call_target(), 'new')
+        self.assertEqual(self.cache.get('key'), (1060, 'new'))
+
+    @mock.patch('cnxarchive.cache.time')
+    def test_wait_for_lock(self, time):
+        time.time.return_value = 1000
+        self.cache.add('key:lock', 1, 30)
+
+        def sleep(seconds):
+            # Another worker caches the value meanwhile
+            self.cache.set('key', (1060, 'other'), 0)
+        time.sleep.side_effect = sleep
+
+        self.assertEqual(self.call_target(), 'other')
+        self.assertFalse(self.compute.called)
+
+    @mock.patch('cnxarchive.cache.time')
+    def test_lock_timeout(self, time):
+        time.time.return_value = 1000
+        self.cache.add('key:lock', 1, 0)
+        self.assertEqual(self.call_target(), 'new')
+        from ..cache import LOCK_EXPIRATION, LOCK_POLL_INTERVAL
+        self.assertEqual(time.sleep.call_count,
+                         int(LOCK_EXPIRATION / LOCK_POLL_INTERVAL))
+
+
+class SearchTestCase(unittest.TestCase):
+
+    def setUp(self):
+        pyramid_testing.setUp(settings={
+            'memcache-servers': '',
+            'search-cache': 'memory',
+            'search-cache-expiration': '60',
+            'search-long-cache-expiration': '3600',
+            })
+        self.addCleanup(pyramid_testing.tearDown)
+
+    @mock.patch('cnxarchive.cache.database_search')
+    def test_equivalent_queries(self, database_search):
+        from ..cache import search
+        from ..search import Query
+        database_search.return_value = ['results']
+        for raw_query in ('Physics College', 'college physics',
+                          'COLLEGE  physics the'):
+            results = search(Query.from_raw_query(raw_query), 'weakAND')
+            self.assertEqual(results, ['results'])
+        self.assertEqual(database_search.call_count, 1)
+
+        # The order of sorts matters
+        search(Query.from_raw_query('physics sort:pubDate sort:version'),
+               'weakAND')
+        search(Query.from_raw_query('physics sort:version sort:pubDate'),
+               'weakAND')
+        self.assertEqual(database_search.call_count, 3)
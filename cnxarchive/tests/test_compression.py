@@ -0,0 +1,150 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import gzip
+import io
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from pyramid import testing as pyramid_testing
+from pyramid.response import Response
+
+
+def gunzip(data):
+    return gzip.GzipFile(fileobj=io.BytesIO(data)).read()
+
+
+class NegotiateEncodingTestCase(unittest.TestCase):
+
+    def call_target(self, accept_encoding):
+        from ..compression import negotiate_encoding
+        request = pyramid_testing.DummyRequest()
+        if accept_encoding is not None:
+            request.headers['Accept-Encoding'] = accept_encoding
+        return negotiate_encoding(request)
+
+    def test_no_header(self):
+        self.assertEqual(self.call_target(None), None)
+
+    def test_gzip(self):
+        self.assertEqual(self.call_target('deflate, gzip'), 'gzip')
+
+    def test_not_acceptable(self):
+        self.assertEqual(self.call_target('gzip;q=0, deflate'), None)
+
+    @mock.patch('cnxarchive.compression.ENCODINGS', ('br', 'gzip',))
+    def test_preference(self):
+        self.assertEqual(self.call_target('gzip, br'), 'br')
+        self.assertEqual(self.call_target('gzip, br;q=0.5'), 'gzip')
+
+
+class CompressResponseTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.config = pyramid_testing.setUp()
+        self.addCleanup(pyramid_testing.tearDown)
+        self.body = b'{"content": "' + b'mittens ' * 200 + b'"}'
+
+    def make_response(self, content_type='application/json', body=None):
+        response = Response(content_type=content_type)
+        response.body = self.body if body is None else body
+        return response
+
+    def call_target(self, response, encoding, key=None):
+        from ..compression import compress_response
+        compress_response(response, encoding, key=key)
+        return response
+
+    def test_compressed(self):
+        response = self.call_target(self.make_response(), 'gzip')
+        self.assertEqual(response.content_encoding, 'gzip')
+        self.assertEqual(response.vary, ('Accept-Encoding',))
+        self.assertTrue(len(response.body) < len(self.body))
+        self.assertEqual(gunzip(response.body), self.body)
+
+    def test_not_accepted(self):
+        response = self.call_target(self.make_response(), None)
+        self.assertEqual(response.content_encoding, None)
+        self.assertEqual(response.vary, ('Accept-Encoding',))
+        self.assertEqual(response.body, self.body)
+
+    def test_not_compressible(self):
+        response = self.call_target(self.make_response('image/png'), 'gzip')
+        self.assertEqual(response.content_encoding, None)
+        self.assertEqual(response.vary, None)
+
+    def test_small(self):
+        response = self.call_target(self.make_response(body=b'{}'), 'gzip')
+        self.assertEqual(response.content_encoding, None)
+        self.assertEqual(response.body, b'{}')
+
+    def test_content_cache(self):
+        from ..utils import LRUCache
+        self.config.registry.content_cache = LRUCache(1024 * 1024)
+        self.call_target(self.make_response(), 'gzip', key='abc')
+
+        with mock.patch('cnxarchive.compression.compress') as compress:
+            response = self.call_target(self.make_response(), 'gzip',
+                                        key='abc')
+        self.assertFalse(compress.called)
+        self.assertEqual(gunzip(response.body), self.body)
+
+    def test_compressed_cache(self):
+        from ..compression import CompressedCache
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = CompressedCache(directory)
+        self.config.registry.compressed_cache = cache
+        self.call_target(self.make_response(), 'gzip', key='abc')
+        self.assertEqual(gunzip(cache.get('abc', 'gzip')), self.body)
+        self.assertEqual(cache.get('abc', 'br'), None)
+
+        with mock.patch('cnxarchive.compression.compress') as compress:
+            response = self.call_target(self.make_response(), 'gzip',
+                                        key='abc')
+        self.assertFalse(compress.called)
+        self.assertEqual(gunzip(response.body), self.body)
+
+
+class CompressedCacheFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings):
+        from ..compression import compressed_cache_from_settings
+        return compressed_cache_from_settings(settings)
+
+    def test_default(self):
+        self.assertEqual(self.call_target({}), None)
+
+    def test_directory(self):
+        from ..compression import DEFAULT_MAX_SIZE
+        directory = os.path.join(tempfile.mkdtemp(), 'compressed')
+        self.addCleanup(shutil.rmtree, os.path.dirname(directory))
+        cache = self.call_target({'compressed-cache-directory': directory})
+        self.assertEqual(cache.directory, directory)
+        self.assertEqual(cache.store.max_size, DEFAULT_MAX_SIZE)
+        self.assertEqual(os.stat(directory).st_mode & 0o777, 0o700)
+
+    def test_max_size(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = self.call_target({'compressed-cache-directory': directory,
+                                  'compressed-cache-max-size': '1024'})
+        self.assertEqual(cache.store.max_size, 1024)
+
+    def test_shared_directory_refused(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.chmod(directory, 0o777)
+        self.assertRaises(ValueError, self.call_target,
+                          {'compressed-cache-directory': directory})
@@ -16,6 +16,7 @@ import unittest
 
 from cnxepub import flatten_tree_to_ident_hashes
 import psycopg2
+from pyramid import testing as pyramid_testing
 
 from . import testing
 
@@ -375,6 +376,252 @@ line')""")
         self.assertEqual('1.1 multi-\nline', result)
 
 
+class RequestDbConnectionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from pyramid.request import Request, apply_request_extensions
+        settings = testing.integration_test_settings()
+        config = pyramid_testing.setUp(settings=settings)
+        config.include('cnxarchive.database.main')
+        self.request = Request.blank('/')
+        self.request.registry = config.registry
+        apply_request_extensions(self.request)
+        config.begin(request=self.request)
+
+    def tearDown(self):
+        pyramid_testing.tearDown()
+
+    @property
+    def target(self):
+        from ..database import db_cursor
+        return db_cursor
+
+    def test_shared_connection(self):
+        from psycopg2.extras import RealDictCursor
+        with self.target() as cursor:
+            cursor.execute('SELECT 1')
+        with self.target() as other_cursor:
+            other_cursor.execute('SELECT 2')
+            self.assertEqual(other_cursor.fetchone()[0], 2)
+        with self.target(cursor_factory=RealDictCursor) as dict_cursor:
+            self.assertTrue(isinstance(dict_cursor, RealDictCursor))
+            connection = dict_cursor.connection
+
+        self.assertIs(cursor, other_cursor)
+        self.assertIs(cursor.connection, connection)
+        self.assertIs(self.request.db_connection, connection)
+        self.assertFalse(connection.closed)
+
+        self.request._process_finished_callbacks()
+        self.assertTrue(cursor.closed)
+        self.assertTrue(connection.closed)
+
+    def test_lazy(self):
+        self.request._process_finished_callbacks()
+        self.assertNotIn('db_connection', self.request.__dict__)
+
+    def test_outside_of_request(self):
+        pyramid_testing.tearDown()
+        pyramid_testing.setUp(settings=testing.integration_test_settings())
+        with self.target() as cursor:
+            cursor.execute('SELECT 1')
+            connection = cursor.connection
+        self.assertTrue(connection.closed)
+        self.assertNotIn('db_connection', self.request.__dict__)
+
+
+class AsPreparedStatementTestCase(unittest.TestCase):
+
+    @property
+    def target(self):
+        from ..database import _as_prepared_statement
+        return _as_prepared_statement
+
+    def test_named(self):
+        statement = ("SELECT * FROM files "
+                     "WHERE sha1 = %(hash)s OR md5 = %(hash)s "
+                     "AND media_type LIKE 'text/%%' AND name = %(name)s")
+        self.assertEqual(self.target(statement), (
+            "SELECT * FROM files "
+            "WHERE sha1 = $1 OR md5 = $1 "
+            "AND media_type LIKE 'text/%' AND name = $2",
+            ['hash', 'name']))
+
+    def test_positional(self):
+        statement = "SELECT tree_to_json(%s, %s, %s)::json;"
+        self.assertEqual(self.target(statement), (
+            "SELECT tree_to_json($1, $2, $3)::json;", [0, 1, 2]))
+
+
+class PreparedStatementsTestCase(unittest.TestCase):
+    fixture = testing.schema_fixture
+
+    @testing.db_connect
+    def setUp(self, cursor):
+        self.fixture.setUp()
+        settings = testing.integration_test_settings()
+        settings['db-prepared-statements'] = 'true'
+        pyramid_testing.setUp(settings=settings)
+
+    def tearDown(self):
+        pyramid_testing.tearDown()
+        self.fixture.tearDown()
+
+    def prepared_statements(self, cursor):
+        cursor.execute("SELECT name FROM pg_prepared_statements")
+        return [row[0] for row in cursor.fetchall()]
+
+    @testing.db_connect
+    def test_prepared_once(self, cursor):
+        from ..database import execute_sql
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        self.assertEqual(cursor.fetchall(), [])
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        self.assertEqual(self.prepared_statements(cursor), ['get-resource'])
+
+    @testing.db_connect
+    def test_not_prepared(self, cursor):
+        from ..database import execute_sql
+        execute_sql(cursor, 'get-subject-list')
+        self.assertEqual(self.prepared_statements(cursor), [])
+
+    @testing.db_connect
+    def test_disabled(self, cursor):
+        from ..database import execute_sql
+        pyramid_testing.setUp(settings=testing.integration_test_settings())
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        self.assertEqual(self.prepared_statements(cursor), [])
+
+    @testing.db_connect
+    def test_reprepare(self, cursor):
+        from ..database import execute_sql
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        cursor.connection.commit()
+        # Drops the prepared statements, outside of a transaction
+        cursor.connection.autocommit = True
+        cursor.execute('DISCARD ALL')
+        cursor.connection.autocommit = False
+
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(self.prepared_statements(cursor), ['get-resource'])
+        # The transaction wasn't aborted
+        cursor.execute('SELECT 1')
+        self.assertEqual(cursor.fetchone(), (1,))
+
+    @testing.db_connect
+    def test_reprepare_within_transaction(self, cursor):
+        from ..database import execute_sql
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        cursor.connection.commit()
+        cursor.connection.autocommit = True
+        cursor.execute('DISCARD ALL')
+        cursor.connection.autocommit = False
+
+        # Rolling back would lose the work done in the transaction.
+        cursor.execute('SELECT 1')
+        with self.assertRaises(psycopg2.ProgrammingError):
+            execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        cursor.connection.rollback()
+
+        execute_sql(cursor, 'get-resource', {'hash': 'abc'})
+        self.assertEqual(cursor.fetchall(), [])
+        self.assertEqual(self.prepared_statements(cursor), ['get-resource'])
+
+
+class ContentCacheTestCase(unittest.TestCase):
+    fixture = testing.data_fixture
+    ident_hash = 'e79ffde3-7fb4-4af3-9ec8-df648b391597@7.1'
+
+    @testing.db_connect
+    def setUp(self, cursor):
+        from ..utils import LRUCache
+        self.fixture.setUp()
+        config = pyramid_testing.setUp(
+            settings=testing.integration_test_settings())
+        self.cache = config.registry.content_cache = LRUCache(1024 * 1024)
+
+    def tearDown(self):
+        pyramid_testing.tearDown()
+        self.fixture.tearDown()
+
+    def set_state(self, cursor, stateid):
+        cursor.execute("""\
+UPDATE modules SET stateid = %s
+WHERE ident_hash(uuid, major_version, minor_version) = %s""",
+                       (stateid, self.ident_hash,))
+
+    @testing.db_connect
+    def test_current(self, cursor):
+        from ..database import get_tree
+        self.set_state(cursor, 1)
+        tree = get_tree(self.ident_hash, cursor)
+        self.assertEqual(len(self.cache), 1)
+
+        cached_tree = get_tree(self.ident_hash, cursor)
+        self.assertEqual(cached_tree, tree)
+        self.assertIsNot(cached_tree, tree)
+        self.assertEqual(self.cache.stats()['hits'], 1)
+
+    @testing.db_connect
+    def test_tree_index(self, cursor):
+        from ..database import get_tree, get_tree_index
+        self.set_state(cursor, 1)
+        tree = get_tree(self.ident_hash, cursor)
+        index = get_tree_index(self.ident_hash, tree)
+        self.assertIs(get_tree_index(self.ident_hash, tree), index)
+
+    @testing.db_connect
+    def test_not_current(self, cursor):
+        from ..database import get_tree
+        cursor.execute("SELECT stateid FROM modulestates "
+                       "WHERE stateid != 1 LIMIT 1")
+        self.set_state(cursor, cursor.fetchone()[0])
+        get_tree(self.ident_hash, cursor)
+        self.assertEqual(len(self.cache), 0)
+
+
+class TreeIndexTestCase(unittest.TestCase):
+    tree = {
+        'id': 'e79ffde3-7fb4-4af3-9ec8-df648b391597@7.1',
+        'contents': [
+            {'id': '209deb1f-1a46-4369-9e0d-18674cf58a3e@7'},
+            {'id': 'subcol',
+             'contents': [
+                 {'id': 'f3c9ab70-a916-4d8c-9256-42953287b4e9@3'},
+                 {'id': '209deb1f-1a46-4369-9e0d-18674cf58a3e@8'},
+                 ]},
+            ],
+        }
+
+    @property
+    def target(self):
+        from ..database import TreeIndex
+        return TreeIndex
+
+    def test_find(self):
+        index = self.target(self.tree)
+        self.assertEqual(len(index), 4)
+        self.assertEqual(
+            index.find('209deb1f-1a46-4369-9e0d-18674cf58a3e', '8'),
+            '209deb1f-1a46-4369-9e0d-18674cf58a3e@8')
+        self.assertEqual(index.position(
+            '209deb1f-1a46-4369-9e0d-18674cf58a3e', '8'), 3)
+        # Without a version, the first appearance is found.
+        self.assertEqual(
+            index.find('209deb1f-1a46-4369-9e0d-18674cf58a3e'),
+            '209deb1f-1a46-4369-9e0d-18674cf58a3e@7')
+        self.assertEqual(
+            index.find('209deb1f-1a46-4369-9e0d-18674cf58a3e', '9'), None)
+        self.assertEqual(index.find('subcol'), None)
+
+    def test_contains(self):
+        index = self.target(self.tree)
+        self.assertIn('f3c9ab70-a916-4d8c-9256-42953287b4e9@3', index)
+        self.assertIn('e79ffde3-7fb4-4af3-9ec8-df648b391597@7.1', index)
+        self.assertNotIn('f3c9ab70-a916-4d8c-9256-42953287b4e9@4', index)
+
+
 class TreeToJsonTestCase(unittest.TestCase):
     fixture = testing.data_fixture
 
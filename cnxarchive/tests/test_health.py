@@ -0,0 +1,224 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+
+class DirectoryMonitorTestCase(unittest.TestCase):
+
+    def make_one(self, paths, **kwargs):
+        from ..health import DirectoryMonitor
+        self.unreachable = set()
+        self.stats = []
+
+        def stat(path, timeout):
+            self.stats.append(path)
+            return path not in self.unreachable
+
+        monitor = DirectoryMonitor(paths, stat=stat, **kwargs)
+        self.addCleanup(monitor.stop)
+        return monitor
+
+    def test_check(self):
+        monitor = self.make_one(['/a', '/b'], interval=3600)
+        self.unreachable.add('/b')
+        self.assertEqual(monitor.reachable, frozenset(['/a']))
+        self.unreachable.clear()
+        self.assertEqual(monitor.check(), frozenset(['/a', '/b']))
+        self.assertEqual(monitor.reachable, frozenset(['/a', '/b']))
+
+    def test_reachable_reads_dont_stat(self):
+        monitor = self.make_one(['/a'], interval=3600)
+        for i in range(3):
+            self.assertIn('/a', monitor.reachable)
+        self.assertEqual(self.stats, ['/a'])
+
+    def test_background_checks(self):
+        import threading
+        monitor = self.make_one(['/a'], interval=0.01)
+        checked = threading.Event()
+        original_check = monitor.check
+
+        def check():
+            checked.set()
+            return original_check()
+        monitor.check = check
+        monitor.start()
+        self.assertTrue(checked.wait(5))
+        monitor.stop()
+        self.assertFalse(monitor._thread)
+
+    @mock.patch('cnxarchive.health.os')
+    def test_restarts_after_fork(self, os):
+        monitor = self.make_one(['/a'], interval=3600)
+        os.getpid.return_value = 1
+        monitor.reachable
+        os.getpid.return_value = 2
+        monitor.reachable
+        self.assertEqual(self.stats, ['/a', '/a'])
+
+
+class ExportIndexTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.dir)
+        # Make the directory look like it was last changed long ago.
+        os.utime(self.dir, (0, 0))
+
+    def make_one(self):
+        from ..health import ExportIndex
+        index = ExportIndex([self.dir], interval=3600,
+                            stat=lambda path, timeout: True)
+        self.addCleanup(index.stop)
+        return index
+
+    def write(self, name, content):
+        with open(os.path.join(self.dir, name), 'w') as f:
+            f.write(content)
+        os.utime(self.dir, (0, 0))
+
+    def test_stat(self):
+        self.write('a.zip', 'aaa')
+        index = self.make_one()
+        # Not yet scanned
+        self.assertEqual(index.stat(os.path.join(self.dir, 'a.zip')).st_size,
+                         3)
+        self.assertRaises(OSError, index.stat,
+                          os.path.join(self.dir, 'b.zip'))
+
+        index.refresh()
+        with mock.patch('cnxarchive.health.os.stat') as stat:
+            stats = index.stat(os.path.join(self.dir, 'a.zip'))
+            with self.assertRaises(OSError):
+                index.stat(os.path.join(self.dir, 'b.zip'))
+        self.assertEqual(stats.st_size, 3)
+        self.assertFalse(stat.called)
+
+    def test_rescan_on_change(self):
+        self.write('a.zip', 'aaa')
+        index = self.make_one()
+        index.refresh()
+
+        with mock.patch('cnxarchive.health._list_directory') as listdir:
+            index.refresh()
+        self.assertFalse(listdir.called)
+
+        os.remove(os.path.join(self.dir, 'a.zip'))
+        self.write('b.zip', 'bb')
+        os.utime(self.dir, (100, 100))
+        index.refresh()
+        self.assertRaises(OSError, index.stat,
+                          os.path.join(self.dir, 'a.zip'))
+        self.assertEqual(index.stat(os.path.join(self.dir, 'b.zip')).st_size,
+                         2)
+
+    def test_stat_new_files_only(self):
+        self.write('a.zip', 'aaa')
+        os.utime(os.path.join(self.dir, 'a.zip'), (0, 0))
+        index = self.make_one()
+        index.refresh()
+
+        self.write('b.zip', 'bb')
+        os.utime(os.path.join(self.dir, 'b.zip'), (0, 0))
+        os.utime(self.dir, (100, 100))
+        with mock.patch('cnxarchive.health.os.stat',
+                        side_effect=os.stat) as stat:
+            index.refresh()
+        self.assertEqual([c[0][0] for c in stat.call_args_list],
+                         [self.dir, os.path.join(self.dir, 'b.zip')])
+        self.assertEqual(index.stat(os.path.join(self.dir, 'a.zip')).st_size,
+                         3)
+        self.assertEqual(index.stat(os.path.join(self.dir, 'b.zip')).st_size,
+                         2)
+
+    def test_recheck_recently_modified(self):
+        # The file looks like it could still be written.
+        self.write('a.zip', 'aaa')
+        index = self.make_one()
+        index.refresh()
+
+        with open(os.path.join(self.dir, 'a.zip'), 'a') as f:
+            f.write('aa')
+        with mock.patch('cnxarchive.health._list_directory') as listdir:
+            index.refresh()
+        self.assertFalse(listdir.called)
+        self.assertEqual(index.stat(os.path.join(self.dir, 'a.zip')).st_size,
+                         5)
+
+        os.utime(os.path.join(self.dir, 'a.zip'), (0, 0))
+        index.refresh()
+        with mock.patch('cnxarchive.health.os.stat',
+                        side_effect=os.stat) as stat:
+            index.refresh()
+        self.assertEqual([c[0][0] for c in stat.call_args_list], [self.dir])
+
+    def replace_through_rename(self):
+        self.write('a.zip', 'aaa')
+        os.utime(os.path.join(self.dir, 'a.zip'), (0, 0))
+        index = self.make_one()
+        index.refresh()
+
+        tmp_path = os.path.join(self.dir, 'a.zip.tmp')
+        with open(tmp_path, 'w') as f:
+            f.write('aaaaa')
+        os.utime(tmp_path, (50, 50))
+        os.rename(tmp_path, os.path.join(self.dir, 'a.zip'))
+        os.utime(self.dir, (100, 100))
+        index.refresh()
+        stats = index.stat(os.path.join(self.dir, 'a.zip'))
+        self.assertEqual((stats.st_size, stats.st_mtime), (5, 50))
+
+    def test_replaced_through_rename(self):
+        self.replace_through_rename()
+
+    @mock.patch('cnxarchive.health.scandir', None)
+    def test_replaced_through_rename_without_scandir(self):
+        self.replace_through_rename()
+
+    def test_add(self):
+        index = self.make_one()
+        index.refresh()
+        path = os.path.join(self.dir, 'a.zip')
+        self.assertRaises(OSError, index.stat, path)
+        index.add(path, os.stat(self.dir))
+        self.assertEqual(index.stat(path).st_size, os.stat(self.dir).st_size)
+
+
+class MonitorFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings):
+        from ..health import monitor_from_settings
+        return monitor_from_settings(settings)
+
+    def test_disabled(self):
+        settings = {'exports-directories': '/a /b',
+                    'exports-check-interval': '0'}
+        self.assertEqual(self.call_target(settings), None)
+
+    def test_settings(self):
+        settings = {'exports-directories': '\n/a\n/b',
+                    'exports-check-interval': '30',
+                    'exports-check-timeout': '2'}
+        monitor = self.call_target(settings)
+        self.assertEqual(monitor.paths, ('/a', '/b'))
+        self.assertEqual(monitor.interval, 30)
+        self.assertEqual(monitor.timeout, 2)
+
+    def test_index(self):
+        from ..health import ExportIndex
+        settings = {'exports-directories': '/a /b',
+                    'exports-index': 'true'}
+        self.assertTrue(isinstance(self.call_target(settings), ExportIndex))
@@ -0,0 +1,164 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import json
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from pyramid import testing as pyramid_testing
+
+
+UUID = 'e79ffde3-7fb4-4af3-9ec8-df648b391597'
+OTHER_UUID = '209deb1f-1a46-4369-9e0d-18674cf58a3e'
+
+
+class InvalidationListenerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from ..invalidation import InvalidationListener
+        from ..utils import LRUCache
+        self.cache = LRUCache(1024)
+        for uuid in (UUID, OTHER_UUID):
+            self.cache.set(('metadata', uuid, '7.1'), '{}')
+            self.cache.set(('tree', uuid, '7.1', True), '{}')
+            self.cache.set(('latest', uuid), '7.1')
+        self.cache.set(('compressed', 'etag', 'gzip'), 'x')
+        self.listener = InvalidationListener('dbname=testing', self.cache)
+
+    def keys(self):
+        return sorted(self.cache._items.keys())
+
+    def test_module_changed(self):
+        self.listener.handle(json.dumps({'table': 'modules', 'uuid': UUID,
+                                         'version': '7.1'}))
+        self.assertEqual(self.keys(), [
+            ('compressed', 'etag', 'gzip'),
+            ('latest', OTHER_UUID),
+            ('metadata', OTHER_UUID, '7.1'),
+            ('tree', OTHER_UUID, '7.1', True),
+            ])
+
+    def test_trees_changed(self):
+        self.listener.handle(json.dumps({'table': 'trees'}))
+        self.assertEqual(self.keys(), [
+            ('compressed', 'etag', 'gzip'),
+            ('latest', OTHER_UUID),
+            ('latest', UUID),
+            ('metadata', OTHER_UUID, '7.1'),
+            ('metadata', UUID, '7.1'),
+            ])
+
+    def test_invalid_payload(self):
+        self.listener.handle('not json')
+        self.assertEqual(len(self.keys()), 7)
+
+    def test_generation(self):
+        generation = self.listener.generation(UUID)
+        other_generation = self.listener.generation(OTHER_UUID)
+        self.listener.handle(json.dumps({'table': 'modules', 'uuid': UUID,
+                                         'version': '7.1'}))
+        self.assertNotEqual(self.listener.generation(UUID), generation)
+        self.assertEqual(self.listener.generation(OTHER_UUID),
+                         other_generation)
+
+
+class GetContentCacheTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from ..utils import LRUCache
+        self.config = pyramid_testing.setUp()
+        self.addCleanup(pyramid_testing.tearDown)
+        self.registry = self.config.registry
+        self.registry.content_cache = LRUCache(1024)
+
+    def call_target(self, **kwargs):
+        from ..database import get_content_cache
+        return get_content_cache(**kwargs)
+
+    def test_without_invalidation(self):
+        self.registry.cache_invalidation = None
+        self.assertIs(self.call_target(), self.registry.content_cache)
+        self.assertEqual(self.call_target(invalidated=True), None)
+
+    def test_with_invalidation(self):
+        listener = mock.Mock(active=False)
+        self.registry.cache_invalidation = listener
+        self.assertIs(self.call_target(), self.registry.content_cache)
+        self.assertEqual(self.call_target(invalidated=True), None)
+        listener.active = True
+        self.assertIs(self.call_target(invalidated=True),
+                      self.registry.content_cache)
+        self.assertTrue(listener.ensure_running.called)
+
+
+class GetLatestVersionTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from ..utils import LRUCache
+        self.config = pyramid_testing.setUp()
+        self.addCleanup(pyramid_testing.tearDown)
+        self.registry = self.config.registry
+        self.registry.content_cache = LRUCache(1024)
+        self.listener = self.registry.cache_invalidation = mock.Mock(
+            active=True)
+        self.listener.generation.return_value = (1, 0)
+        patcher = mock.patch('cnxarchive.views.helpers.db_connect')
+        db_connect = patcher.start()
+        self.addCleanup(patcher.stop)
+        db_connection = db_connect.return_value.__enter__.return_value
+        self.cursor = db_connection.cursor.return_value.__enter__.return_value
+        self.cursor.fetchone.return_value = ('7.1',)
+
+    def call_target(self):
+        from ..views.helpers import get_latest_version
+        return get_latest_version(UUID)
+
+    @mock.patch('cnxarchive.views.helpers.time')
+    def test_cached(self, time):
+        from ..views.helpers import LATEST_VERSION_EXPIRATION
+        time.time.return_value = 1000
+        self.assertEqual(self.call_target(), '7.1')
+        self.cursor.fetchone.return_value = ('8.1',)
+        self.assertEqual(self.call_target(), '7.1')
+        # For a limited time, in case a change notification was missed
+        time.time.return_value = 1001 + LATEST_VERSION_EXPIRATION
+        self.assertEqual(self.call_target(), '8.1')
+
+    def test_changed_while_read(self):
+        self.listener.generation.side_effect = [(1, 0), (1, 1), (1, 1),
+                                                (1, 1)]
+        self.assertEqual(self.call_target(), '7.1')
+        self.assertEqual(self.registry.content_cache.get(('latest', UUID)),
+                         None)
+        self.cursor.fetchone.return_value = ('8.1',)
+        self.assertEqual(self.call_target(), '8.1')
+        self.assertEqual(self.registry.content_cache.get(('latest', UUID))[1],
+                         '8.1')
+
+
+class ListenerFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings, cache=mock.sentinel.cache):
+        from ..invalidation import listener_from_settings
+        return listener_from_settings(settings, cache)
+
+    def test_disabled(self):
+        settings = {'db-connection-string': 'dbname=testing'}
+        self.assertEqual(self.call_target(settings), None)
+        settings['cache-invalidation'] = 'true'
+        self.assertEqual(self.call_target(settings, cache=None), None)
+
+    def test_enabled(self):
+        settings = {'db-connection-string': 'dbname=testing',
+                    'cache-invalidation': 'true'}
+        listener = self.call_target(settings)
+        self.assertEqual(listener.connection_string, 'dbname=testing')
+        self.assertIs(listener.cache, mock.sentinel.cache)
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import psycopg2
+import psycopg2.extensions
+
+from .testing import FakeConnection
+
+
+class ConnectionPoolTestCase(unittest.TestCase):
+
+    def make_one(self, **kwargs):
+        from ..pool import ConnectionPool
+        self.connections = []
+
+        def connect(dsn):
+            conn = FakeConnection(dsn)
+            self.connections.append(conn)
+            return conn
+
+        kwargs.setdefault('connect', connect)
+        return ConnectionPool('dbname=testing', **kwargs)
+
+    def test_reuse(self):
+        pool = self.make_one()
+        with pool.connection() as conn1:
+            pass
+        with pool.connection() as conn2:
+            pass
+        self.assertIs(conn1, conn2)
+        self.assertEqual(len(self.connections), 1)
+        self.assertEqual(conn1.dsn, 'dbname=testing')
+        stats = pool.stats()
+        self.assertEqual(stats['connects'], 1)
+        self.assertEqual(stats['checkouts'], 2)
+        self.assertEqual(stats['idle'], 1)
+        self.assertEqual(stats['in_use'], 0)
+
+    def test_max_size_timeout(self):
+        from ..pool import PoolTimeout
+        pool = self.make_one(max_size=1, timeout=0.01)
+        conn = pool.getconn()
+        self.assertRaises(PoolTimeout, pool.getconn)
+        self.assertEqual(pool.stats()['timeouts'], 1)
+        pool.putconn(conn)
+        self.assertIs(pool.getconn(), conn)
+
+    def test_open_transaction_rolled_back(self):
+        pool = self.make_one()
+        conn = pool.getconn()
+        conn.status = psycopg2.extensions.TRANSACTION_STATUS_INTRANS
+        pool.putconn(conn)
+        self.assertEqual(conn.rollbacks, 1)
+        self.assertFalse(conn.closed)
+
+    def test_broken_connection_discarded(self):
+        pool = self.make_one()
+        conn = pool.getconn()
+        conn.status = psycopg2.extensions.TRANSACTION_STATUS_UNKNOWN
+        pool.putconn(conn)
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_operational_error_discards(self):
+        pool = self.make_one()
+        with self.assertRaises(psycopg2.OperationalError):
+            with pool.connection() as conn:
+                raise psycopg2.OperationalError()
+        self.assertTrue(conn.closed)
+        self.assertEqual(pool.stats()['size'], 0)
+
+    def test_pre_ping(self):
+        pool = self.make_one(pre_ping=True)
+        with pool.connection() as conn1:
+            pass
+        conn1.broken = True
+        with pool.connection() as conn2:
+            pass
+        self.assertIsNot(conn1, conn2)
+        self.assertTrue(conn1.closed)
+        self.assertEqual(pool.stats()['failed_pings'], 1)
+        self.assertEqual(pool.stats()['size'], 1)
+
+    @mock.patch('cnxarchive.pool.time')
+    def test_max_age(self, time):
+        time.time.return_value = 1000
+        pool = self.make_one(max_age=60)
+        with pool.connection() as conn1:
+            pass
+        time.time.return_value = 1061
+        with pool.connection() as conn2:
+            pass
+        self.assertIsNot(conn1, conn2)
+        self.assertTrue(conn1.closed)
+
+    @mock.patch('cnxarchive.pool.time')
+    def test_idle_reaping(self, time):
+        time.time.return_value = 1000
+        pool = self.make_one(min_size=1, max_idle=10)
+        conn1 = pool.getconn()
+        conn2 = pool.getconn()
+        pool.putconn(conn1)
+        pool.putconn(conn2)
+        time.time.return_value = 1011
+        conn = pool.getconn()
+        # One connection is reaped, min_size connection is kept.
+        self.assertEqual(len([c for c in self.connections if c.closed]), 1)
+        self.assertEqual(pool.stats()['size'], 1)
+        pool.putconn(conn)
+
+    @mock.patch('cnxarchive.pool.os')
+    def test_fork_safety(self, os):
+        os.getpid.return_value = 1
+        pool = self.make_one()
+        with pool.connection() as conn1:
+            pass
+        os.getpid.return_value = 2
+        with pool.connection() as conn2:
+            pass
+        self.assertIsNot(conn1, conn2)
+        # The parent's connection is left untouched.
+        self.assertFalse(conn1.closed)
+        self.assertEqual(pool.stats()['size'], 1)
+
+
+class PoolFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings):
+        from ..pool import pool_from_settings
+        return pool_from_settings(settings)
+
+    def test_disabled(self):
+        settings = {'db-connection-string': 'dbname=testing',
+                    'db-pool-max-size': '0'}
+        self.assertEqual(self.call_target(settings), None)
+
+    def test_settings(self):
+        settings = {'db-connection-string': 'dbname=testing',
+                    'db-pool-min-size': '2',
+                    'db-pool-max-size': '5',
+                    'db-pool-max-age': '120',
+                    'db-pool-max-idle': '30',
+                    'db-pool-timeout': '2.5',
+                    'db-pool-pre-ping': 'false'}
+        pool = self.call_target(settings)
+        self.assertEqual(pool.connection_string, 'dbname=testing')
+        self.assertEqual(pool.min_size, 2)
+        self.assertEqual(pool.max_size, 5)
+        self.assertEqual(pool.max_age, 120)
+        self.assertEqual(pool.max_idle, 30)
+        self.assertEqual(pool.timeout, 2.5)
+        self.assertFalse(pool.pre_ping)
@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+import psycopg2
+
+from .testing import FakeConnection
+
+
+class ReplicaSetTestCase(unittest.TestCase):
+
+    def make_one(self, dsns, **kwargs):
+        from ..replicas import Replica, ReplicaSet
+        self.lags = dict([(dsn, 0) for dsn in dsns])
+
+        def connect(dsn):
+            if dsn == 'down':
+                raise psycopg2.OperationalError('could not connect')
+            lag = self.lags[dsn]
+            return FakeConnection(dsn, row=(lag,), broken=lag is None)
+
+        replicas = [Replica(dsn, connect=connect) for dsn in dsns]
+        return ReplicaSet(replicas, **kwargs)
+
+    def test_round_robin(self):
+        replica_set = self.make_one(['one', 'two'])
+        dsns = []
+        for i in range(4):
+            replica, conn = replica_set.getconn()
+            dsns.append(conn.dsn)
+            replica_set.putconn(replica, conn)
+        self.assertEqual(dsns, ['one', 'two', 'one', 'two'])
+
+    def test_least_loaded(self):
+        replica_set = self.make_one(['one', 'two'], selection='least-loaded')
+        replica, conn = replica_set.getconn()
+        self.assertEqual(conn.dsn, 'one')
+        # 'one' is next in line, but is already busy.
+        replica_set._next = 0
+        other_replica, other_conn = replica_set.getconn()
+        self.assertEqual(other_conn.dsn, 'two')
+        self.assertEqual([r.in_use for r in replica_set.replicas], [1, 1])
+        replica_set.putconn(replica, conn)
+        self.assertEqual([r.in_use for r in replica_set.replicas], [0, 1])
+        self.assertTrue(conn.closed)
+
+    def test_unknown_selection(self):
+        with self.assertRaises(ValueError):
+            self.make_one(['one'], selection='random')
+
+    @mock.patch('cnxarchive.replicas.time')
+    def test_lagging_replica_skipped(self, time):
+        time.time.return_value = 1000
+        replica_set = self.make_one(['one', 'two'], max_lag=10,
+                                    lag_check_interval=5)
+        self.lags['one'] = 11
+        replica, conn = replica_set.getconn()
+        self.assertEqual(conn.dsn, 'two')
+        replica_set.putconn(replica, conn)
+        self.assertEqual(replica_set.replicas[0].lag, 11)
+
+        # The lagging replica isn't checked again until the interval passed.
+        self.lags['one'] = 0
+        replica, conn = replica_set.getconn()
+        self.assertEqual(conn.dsn, 'two')
+        replica_set.putconn(replica, conn)
+
+        time.time.return_value = 1005
+        dsns = []
+        for i in range(2):
+            replica, conn = replica_set.getconn()
+            dsns.append(conn.dsn)
+            replica_set.putconn(replica, conn)
+        self.assertEqual(sorted(dsns), ['one', 'two'])
+
+    def test_fallback_to_primary(self):
+        replica_set = self.make_one(['down', 'one'], max_lag=10)
+        self.lags['one'] = None  # the lag check fails
+        self.assertEqual(replica_set.getconn(), (None, None))
+
+    def test_is_replica_connection(self):
+        from ..replicas import is_replica_connection
+        replica_set = self.make_one(['one'])
+        replica, conn = replica_set.getconn()
+        self.assertTrue(is_replica_connection(conn))
+        replica_set.putconn(replica, conn)
+        self.assertFalse(is_replica_connection(conn))
+        self.assertFalse(is_replica_connection(FakeConnection('primary')))
+
+
+class ReplicasFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings):
+        from ..replicas import replicas_from_settings
+        return replicas_from_settings(settings)
+
+    def test_no_replicas(self):
+        settings = {'db-connection-string': 'dbname=testing'}
+        self.assertEqual(self.call_target(settings), None)
+
+    def test_settings(self):
+        settings = {'db-connection-string': 'dbname=testing',
+                    'db-replica-connection-strings': (
+                        '\ndbname=testing host=replica1\n'
+                        'dbname=testing host=replica2\n'),
+                    'db-replica-selection': 'least-loaded',
+                    'db-replica-max-lag': '2.5',
+                    'db-replica-lag-check-interval': '1',
+                    'db-pool-max-size': '3'}
+        replica_set = self.call_target(settings)
+        self.assertEqual(
+            [r.connection_string for r in replica_set.replicas],
+            ['dbname=testing host=replica1', 'dbname=testing host=replica2'])
+        self.assertEqual(
+            [r.pool.connection_string for r in replica_set.replicas],
+            ['dbname=testing host=replica1', 'dbname=testing host=replica2'])
+        self.assertEqual(replica_set.replicas[0].pool.max_size, 3)
+        self.assertEqual(replica_set.selection, 'least-loaded')
+        self.assertEqual(replica_set.max_lag, 2.5)
+        self.assertEqual(replica_set.lag_check_interval, 1)
+
+
+class DbConnectTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from pyramid import testing as pyramid_testing
+        config = pyramid_testing.setUp(settings={})
+        self.addCleanup(pyramid_testing.tearDown)
+        self.registry = config.registry
+        self.replicas = self.registry.db_replicas = mock.Mock()
+        self.pool = self.registry.db_pool = mock.MagicMock()
+
+    def test_replica(self):
+        from ..database import db_connect
+        conn = mock.MagicMock()
+        self.replicas.getconn.return_value = (mock.sentinel.replica, conn)
+        with db_connect(replica=True) as db_conn:
+            self.assertIs(db_conn, conn)
+        self.replicas.putconn.assert_called_once_with(mock.sentinel.replica,
+                                                      conn)
+        self.assertFalse(self.pool.connection.called)
+
+    def test_no_usable_replica(self):
+        from ..database import db_connect
+        self.replicas.getconn.return_value = (None, None)
+        with db_connect(replica=True) as db_conn:
+            self.assertIs(
+                db_conn, self.pool.connection.return_value.__enter__())
+        self.assertFalse(self.replicas.putconn.called)
+
+    def test_primary(self):
+        from ..database import db_connect
+        with db_connect():
+            pass
+        self.assertFalse(self.replicas.getconn.called)
+        self.assertTrue(self.pool.connection.called)
+
+
+class ReplicaFallbackTweenTestCase(unittest.TestCase):
+
+    def test_retry_on_primary(self):
+        from pyramid import testing as pyramid_testing
+        from pyramid.request import Request
+        from ..database import StaleReplicaRead
+        from ..tweens import replica_fallback_tween_factory
+        config = pyramid_testing.setUp()
+        self.addCleanup(pyramid_testing.tearDown)
+        config.registry.db_replicas = mock.Mock()
+        request = Request.blank('/')
+        request.registry = config.registry
+        responses = []
+
+        def handler(request):
+            response = request.response
+            responses.append(response)
+            if len(responses) == 1:
+                response.status = '404 Not Found'
+                response.etag = 'stale'
+                raise StaleReplicaRead()
+            return response
+
+        tween = replica_fallback_tween_factory(handler, config.registry)
+        response = tween(request)
+
+        self.assertTrue(request.db_primary)
+        # The retry starts with a new response
+        self.assertIsNot(response, responses[0])
+        self.assertEqual(response.status_int, 200)
+        self.assertEqual(response.etag, None)
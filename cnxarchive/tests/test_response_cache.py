@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from pyramid import testing as pyramid_testing
+from pyramid.request import Request
+from pyramid.response import Response
+
+
+class ResponseCacheTweenTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.config = pyramid_testing.setUp()
+        self.addCleanup(pyramid_testing.tearDown)
+        from .. import declare_api_routes
+        declare_api_routes(self.config)
+        self.calls = 0
+
+    def make_tween(self, backend):
+        from ..response_cache import ResponseCache
+        from ..tweens import response_cache_tween_factory
+        self.config.registry.response_cache = ResponseCache(backend)
+
+        def handler(request):
+            self.calls += 1
+            response = Response(body=self.body, content_type='text/plain')
+            response.cache_control = self.cache_control
+            response.set_cookie('session', 'secret')
+            return response
+        self.body = b'mittens'
+        self.cache_control = 'max-age=60, public'
+        return response_cache_tween_factory(handler, self.config.registry)
+
+    def make_request(self, path, **kwargs):
+        request = Request.blank(path, **kwargs)
+        request.registry = self.config.registry
+        return request
+
+    def make_memory_backend(self):
+        from ..response_cache import MemoryBackend
+        return MemoryBackend()
+
+    def test_no_cache(self):
+        from ..tweens import response_cache_tween_factory
+        self.config.registry.response_cache = None
+        handler = mock.Mock()
+        self.assertIs(
+            response_cache_tween_factory(handler, self.config.registry),
+            handler)
+
+    def test_cached(self):
+        tween = self.make_tween(self.make_memory_backend())
+        tween(self.make_request('/resources/abc'))
+        self.body = b'kittens'
+        response = tween(self.make_request('/resources/abc'))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response.body, b'mittens')
+        self.assertEqual(response.content_type, 'text/plain')
+        self.assertEqual(response.cache_control.max_age, 60)
+        self.assertTrue(response.expires)
+        self.assertNotIn('Set-Cookie', response.headers)
+
+        # Other params, request headers and routes are cached apart
+        tween(self.make_request('/resources/abc?a=1'))
+        tween(self.make_request('/resources/abc',
+                                headers={'Accept-Encoding': 'gzip'}))
+        tween(self.make_request('/resources/def'))
+        self.assertEqual(self.calls, 4)
+
+    def test_uncached_routes(self):
+        tween = self.make_tween(self.make_memory_backend())
+        for i in range(2):
+            tween(self.make_request('/extras'))
+            tween(self.make_request('/resources/abc', method='POST'))
+        self.assertEqual(self.calls, 4)
+
+    def test_uncacheable_responses(self):
+        tween = self.make_tween(self.make_memory_backend())
+        for cache_control in ('no-cache, no-store', 'max-age=0', 'private'):
+            self.cache_control = cache_control
+            tween(self.make_request('/resources/abc'))
+            tween(self.make_request('/resources/abc'))
+        self.assertEqual(self.calls, 6)
+
+    @mock.patch('cnxarchive.cache.time')
+    def test_expires(self, time):
+        time.time.return_value = 1000
+        tween = self.make_tween(self.make_memory_backend())
+        tween(self.make_request('/resources/abc'))
+        time.time.return_value = 1061
+        tween(self.make_request('/resources/abc'))
+        self.assertEqual(self.calls, 2)
+
+    def test_directory_backend(self):
+        from ..response_cache import DirectoryBackend
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        tween = self.make_tween(DirectoryBackend(directory))
+        tween(self.make_request('/resources/abc'))
+        self.body = b'kittens'
+        response = tween(self.make_request('/resources/abc'))
+        self.assertEqual(self.calls, 1)
+        self.assertEqual(response.body, b'mittens')
+
+
+class DirectoryBackendTestCase(unittest.TestCase):
+
+    def setUp(self):
+        from ..response_cache import DirectoryBackend
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.backend = DirectoryBackend(self.directory)
+        self.value = ('200 OK',
+                      (('Content-Type', 'text/plain'),
+                       ('Link', '<http://cnx.org/\xe9>; rel="canonical"'),),
+                      b'mittens\n\x00kittens',)
+
+    def test_get_set(self):
+        self.backend.set('abcd', self.value, 60)
+        self.assertEqual(self.backend.get('abcd'), self.value)
+        self.assertEqual(self.backend.get('bcde'), None)
+
+    def test_not_pickled(self):
+        self.backend.set('abcd', self.value, 60)
+        with open(self.backend.store._path('abcd'), 'rb') as f:
+            header = json.loads(f.readline().decode('utf-8'))
+            body = f.read()
+        self.assertEqual(header['status'], '200 OK')
+        self.assertEqual(body, self.value[2])
+
+    def test_invalid_file(self):
+        self.backend.store.set('abcd', b'\x80\x02}q\x00.')
+        self.assertEqual(self.backend.get('abcd'), None)
+
+    @mock.patch('cnxarchive.response_cache.time')
+    def test_expired_deleted(self, time):
+        time.time.return_value = 1000
+        self.backend.set('abcd', self.value, 60)
+        time.time.return_value = 1061
+        self.assertEqual(self.backend.get('abcd'), None)
+        self.assertFalse(os.path.exists(self.backend.store._path('abcd')))
+
+
+class ResponseCacheFromSettingsTestCase(unittest.TestCase):
+
+    def call_target(self, settings):
+        from ..response_cache import response_cache_from_settings
+        return response_cache_from_settings(settings)
+
+    def test_disabled(self):
+        self.assertEqual(self.call_target({}), None)
+
+    def test_memory(self):
+        from ..response_cache import MemoryBackend
+        cache = self.call_target({
+            'response-cache': 'memory',
+            'response-cache-routes': 'content\nresource',
+            })
+        self.assertTrue(isinstance(cache.backend, MemoryBackend))
+        self.assertEqual(cache.routes, frozenset(['content', 'resource']))
+
+    def test_memcached(self):
+        from ..response_cache import MemcachedBackend
+        cache = self.call_target({'response-cache': 'memcached',
+                                  'memcache-servers': 'localhost:11211'})
+        self.assertTrue(isinstance(cache.backend, MemcachedBackend))
+
+    def test_directory(self):
+        from ..response_cache import DirectoryBackend
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        cache = self.call_target({'response-cache': 'directory',
+                                  'response-cache-directory': directory,
+                                  'response-cache-max-size': '1024'})
+        self.assertTrue(isinstance(cache.backend, DirectoryBackend))
+        self.assertEqual(cache.backend.store.max_size, 1024)
+
+    def test_shared_directory_refused(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        os.chmod(directory, 0o1777)
+        with self.assertRaises(ValueError):
+            self.call_target({'response-cache': 'directory',
+                              'response-cache-directory': directory})
+
+    def test_unknown(self):
+        with self.assertRaises(ValueError):
+            self.call_target({'response-cache': 'shelve'})
@@ -11,6 +11,11 @@ import datetime
 import unittest
 import uuid
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import psycopg2
 from pyramid import testing as pyramid_testing
 
@@ -50,6 +55,161 @@ class QueryTestCase(unittest.TestCase):
         expected = [('text', 'dog')]
         self.assertEqual(expected, query.terms)
 
+    def test_parse_memoized(self):
+        from ..search import _parsed_queries
+        _parsed_queries.clear()
+        self.addCleanup(_parsed_queries.clear)
+        query = self.call_target('college physics type:foo')
+        self.assertEqual(_parsed_queries.get('college physics type:foo'),
+                         (('text', 'college'), ('text', 'physics'),
+                          ('type', 'foo'),))
+
+        # Each query is a new one
+        query.filters.remove(('type', 'foo'))
+        other = self.call_target('college physics type:foo')
+        self.assertEqual(other.filters, [('type', 'foo')])
+
+        _parsed_queries.set('physics', (('text', 'cached'),))
+        self.assertEqual(self.call_target('physics').terms,
+                         [('text', 'cached')])
+
+    def test_canonical(self):
+        query = self.call_target(
+            'Physics COLLEGE  physics type:Collection '
+            'subject:"Science and Technology" sort:pubDate')
+        canonical = query.canonical()
+
+        self.assertEqual(canonical.terms,
+                         [('text', 'college'), ('text', 'physics')])
+        self.assertEqual(canonical.filters,
+                         [('subject', 'science and technology'),
+                          ('type', 'book')])
+        self.assertEqual(canonical.sorts, ['pubdate'])
+        # The query itself is left as given
+        self.assertEqual(query.terms, [('text', 'Physics'),
+                                       ('text', 'COLLEGE'),
+                                       ('text', 'physics')])
+
+        other = self.call_target(
+            'sort:PubDate type:book college physics '
+            'subject:"science and technology"')
+        self.assertEqual(other.canonical().terms, canonical.terms)
+        self.assertEqual(other.canonical().filters, canonical.filters)
+        self.assertEqual(other.canonical().sorts, canonical.sorts)
+
+    def test_canonical_w_only_stopwords(self):
+        from ..search import Query
+        query = Query([('text', 'The'), ('text', 'and')])
+        self.assertEqual(query.canonical().terms,
+                         [('text', 'and'), ('text', 'the')])
+
+
+class QueryRecordTestCase(unittest.TestCase):
+
+    def make_one(self, row):
+        from ..search import QueryRecord
+        return QueryRecord(**row)
+
+    def test_values(self):
+        from ..utils import COLLECTION_MIMETYPE
+        row = RAW_QUERY_RECORDS[0][0]
+        record = self.make_one(row)
+
+        expected = {k: v for k, v in row.items()
+                    if k not in ('_keys', 'matched', 'fields',)}
+        expected['mediaType'] = COLLECTION_MIMETYPE
+        self.assertEqual(dict(record), expected)
+        self.assertEqual(record.fields['title'], set([u'physics']))
+        self.assertEqual(record.matched[u'physics'],
+                         set([u'abstract', u'maintainer', u'keyword',
+                              u'title']))
+
+    def test_mapping(self):
+        from collections import Mapping
+        row = RAW_QUERY_RECORDS[0][0]
+        record = self.make_one(row)
+        # The values are kept in slots only.
+        self.assertFalse(hasattr(record, '__dict__'))
+        self.assertTrue(isinstance(record, Mapping))
+        self.assertIn('id', record)
+        self.assertNotIn('_keys', record)
+        self.assertEqual(record.get('id'), row['id'])
+        self.assertEqual(record.get('missing', 'default'), 'default')
+        self.assertEqual(sorted(record.keys()), sorted(dict(record)))
+        self.assertEqual(dict(record.items()), dict(record))
+        self.assertEqual(record, dict(record))
+        self.assertNotEqual(record, {})
+
+    def test_pickle(self):
+        import pickle
+        records = [self.make_one(row[0]) for row in RAW_QUERY_RECORDS[:2]]
+
+        for protocol in (0, pickle.HIGHEST_PROTOCOL):
+            unpickled = pickle.loads(pickle.dumps(records, protocol))
+            self.assertEqual(unpickled, records)
+            self.assertEqual(unpickled[0].fields, records[0].fields)
+            # The field names are shared, so pickled once
+            self.assertIs(unpickled[0]._fields[0], unpickled[1]._fields[0])
+
+
+class QueryResultsTestCase(unittest.TestCase):
+
+    @mock.patch('cnxarchive.search.fetch_records')
+    def test_iter(self, fetch_records):
+        from ..search import QueryResults
+        rows = [('e79ffde3-7fb4-4af3-9ec8-df648b391597', 2.0,),
+                ('209deb1f-1a46-4369-9e0d-18674cf58a3e', 1.0,)]
+        results = QueryResults(rows, [('text', 'physics')],
+                               arguments={'text_terms': 'physics'})
+        fetch_records.return_value = ['record', 'other record']
+
+        self.assertEqual(list(results), ['record', 'other record'])
+        # All the records are fetched at once
+        fetch_records.assert_called_once_with(rows,
+                                              {'text_terms': 'physics'})
+
+
+class QueryResultsCountsTestCase(unittest.TestCase):
+    """Test the counting of the (given) facets of the results."""
+
+    def make_one(self, facets):
+        from ..search import QueryResults
+        rows = [('e79ffde3-7fb4-4af3-9ec8-df648b391597', 1.0,)]
+        results = QueryResults(rows, [('text', 'physics')])
+        results.facets = facets
+        return results
+
+    def test_counts(self):
+        from ..utils import MODULE_MIMETYPE, COLLECTION_MIMETYPE
+        ann = {u'id': u'ann', u'firstname': u'Ann', u'surname': u'Zed'}
+        bob = {u'id': u'bob', u'firstname': u'Bob', u'surname': u'Abe'}
+        results = self.make_one([
+            (u'type', u'Module', 3, None),
+            (u'subject', u'Science and Technology', 2, None),
+            (u'subject', u'Arts', 1, None),
+            (u'keyword', u'force', 1, None),
+            (u'authorID', u'ann', 3, ann),
+            (u'authorID', u'bob', 1, bob),
+            (u'pubYear', u'2012', 1, None),
+            (u'pubYear', u'2013', 2, None),
+            ])
+
+        self.assertEqual(results.counts, {
+            'type': [(COLLECTION_MIMETYPE, 0), (MODULE_MIMETYPE, 3)],
+            'subject': [(u'Arts', 1), (u'Science and Technology', 2)],
+            'keyword': [(u'force', 1)],
+            'authorID': [(u'bob', 1), (u'ann', 3)],
+            'pubYear': [(u'2013', 2), (u'2012', 1)],
+            })
+        self.assertEqual(results.auxiliary['authors'], [bob, ann])
+
+    def test_no_facets(self):
+        results = self.make_one([])
+
+        self.assertEqual(results.counts['subject'], [])
+        self.assertEqual(results.counts['authorID'], [])
+        self.assertEqual(results.auxiliary['authors'], [])
+
 
 class BaseSearchTestCase(unittest.TestCase):
     fixture = testing.data_fixture
@@ -74,9 +234,10 @@ class SearchModelTestCase(BaseSearchTestCase):
         from ..search import QueryRecord
         return QueryRecord(*args, **kwargs)
 
-    def make_queryresults(self, *args, **kwargs):
+    def make_queryresults(self, records, *args, **kwargs):
         from ..search import QueryResults
-        return QueryResults(*args, **kwargs)
+        rows = [(r[0]['id'], r[0]['weight'],) for r in records]
+        return QueryResults(rows, *args, **kwargs)
 
     def test_summary_highlighting(self):
         # Confirm the record highlights on found terms in the abstract/summary.
@@ -96,6 +257,20 @@ to solve traditional <b>physics</b> application problems."""
         #     expected.
         self.assertEqual(record.highlighted_fulltext, expected)
 
+    def test_highlight_records(self):
+        # Highlight several records with one query.
+        from ..search import highlight_records
+        records = [self.make_queryrecord(**row[0])
+                   for row in RAW_QUERY_RECORDS[:3]]
+
+        highlights = highlight_records(records)
+
+        self.assertEqual(highlights,
+                         [(record.highlighted_abstract,
+                           record.highlighted_fulltext,)
+                          for record in records])
+        self.assertEqual(highlight_records([]), [])
+
     def test_result_counts(self):
         # Set the test to return top 5 keywords
         from .. import search
@@ -179,6 +354,15 @@ to solve traditional <b>physics</b> application problems."""
         authors = results.counts['authorID']
         self.assertEqual(authors, [(open_stax_college['id'], 15,)])
 
+    def test_hits(self):
+        # Only the ids and weights of the matches are kept.
+        query = [('text', 'physics')]
+        results = self.make_queryresults(RAW_QUERY_RECORDS, query)
+
+        self.assertEqual(results.hits,
+                         [(r[0]['id'], r[0]['weight'],)
+                          for r in RAW_QUERY_RECORDS])
+
     def test_auxiliary_authors(self):
         # Check that the query results object contains a list of all the
         #   authors that appear in the results.
@@ -231,6 +415,17 @@ class SearchTestCase(BaseSearchTestCase):
 
         self.assertEqual(len(results), 1)
 
+    def test_records_fetched_by_page(self):
+        query_params = [('text', 'introduction')]
+        results = self.call_target(query_params)
+
+        self.assertEqual(len(results), 6)
+        records = results[1:4]
+        self.assertEqual([(r['id'], r['weight']) for r in records],
+                         results.hits[1:4])
+        self.assertEqual(results[2]['title'], records[1]['title'])
+        self.assertEqual(results[6:], [])
+
     def test_search_w_stopwords(self):
         # wildcard search terms have stopwords removed
         query_params = [('text', 'seek'), ('text', 'to'), ('text', 'reduce')]
@@ -5,9 +5,17 @@
 # Public License version 3 (AGPLv3).
 # See LICENCE.txt for details.
 # ###
+import os
+import shutil
+import tempfile
 import uuid
 import unittest
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 
 class SlugifyTestCase(unittest.TestCase):
 
@@ -74,3 +82,157 @@ class SafeStatTestCase(unittest.TestCase):
 
     def test_timeout(self):
         self.assertFalse(self.call_target('/tmp', 1, cmd=['/bin/sleep', '10']))
+
+    def test_cmd_unchanged(self):
+        cmd = ['/usr/bin/stat']
+        self.call_target('/tmp', 1, cmd=cmd)
+        self.call_target('/tmp', 1, cmd=cmd)
+        self.assertEqual(cmd, ['/usr/bin/stat'])
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def make_one(self, max_size):
+        from ..utils import LRUCache
+        return LRUCache(max_size)
+
+    def test_get_set(self):
+        cache = self.make_one(10)
+        cache.set('a', 'aaa')
+        self.assertEqual(cache.get('a'), 'aaa')
+        self.assertEqual(cache.get('b'), None)
+        self.assertEqual(cache.get('b', 'default'), 'default')
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses']), (1, 2))
+        self.assertEqual(stats['size'], 3)
+
+    def test_evicts_least_recently_used(self):
+        cache = self.make_one(10)
+        cache.set('a', 'aaaa')
+        cache.set('b', 'bbbb')
+        cache.get('a')
+        cache.set('c', 'cccc')
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(cache.stats()['evictions'], 1)
+        self.assertEqual(cache.stats()['size'], 8)
+
+    def test_replace(self):
+        cache = self.make_one(10)
+        cache.set('a', 'aaaa')
+        cache.set('a', 'aa')
+        self.assertEqual(cache.get('a'), 'aa')
+        self.assertEqual(cache.stats()['size'], 2)
+
+    def test_too_large(self):
+        cache = self.make_one(10)
+        cache.set('a', 'a' * 11)
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_delete_and_clear(self):
+        cache = self.make_one(10)
+        cache.set('a', 'aa')
+        cache.set('b', 'bb')
+        cache.delete('a')
+        cache.delete('missing')
+        self.assertNotIn('a', cache)
+        self.assertEqual(cache.stats()['size'], 2)
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()['size'], 0)
+
+    def test_delete_matching(self):
+        cache = self.make_one(10)
+        cache.set(('a', 1), 'aa')
+        cache.set(('b', 1), 'bb')
+        cache.set(('a', 2), 'cc')
+        cache.delete_matching(lambda key: key[0] == 'a')
+        self.assertEqual(list(cache._items.keys()), [('b', 1)])
+        self.assertEqual(cache.stats()['size'], 2)
+
+
+class PrivateDirectoryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parent = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.parent)
+
+    def call_target(self, path):
+        from ..utils import private_directory
+        return private_directory(path)
+
+    def test_created(self):
+        path = os.path.join(self.parent, 'a', 'b')
+        self.assertEqual(self.call_target(path), path)
+        self.assertEqual(os.stat(path).st_mode & 0o777, 0o700)
+        # Existing directories are reused
+        self.assertEqual(self.call_target(path), path)
+
+    def test_writable_by_others(self):
+        os.chmod(self.parent, 0o775)
+        self.assertRaises(ValueError, self.call_target, self.parent)
+
+    def test_owned_by_another_user(self):
+        with mock.patch('os.getuid', return_value=os.getuid() + 1):
+            self.assertRaises(ValueError, self.call_target, self.parent)
+
+    def test_symlink(self):
+        path = os.path.join(self.parent, 'link')
+        os.symlink(self.parent, path)
+        self.assertRaises(ValueError, self.call_target, path)
+
+
+class DirectoryStoreTestCase(unittest.TestCase):
+
+    def make_one(self, max_size=1024):
+        from ..utils import DirectoryStore
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        return DirectoryStore(directory, max_size)
+
+    def test_get_set(self):
+        store = self.make_one()
+        self.assertEqual(store.get('abcd'), None)
+        store.set('abcd', b'data')
+        self.assertEqual(store.get('abcd'), b'data')
+        store.delete('abcd')
+        self.assertEqual(store.get('abcd'), None)
+
+    def test_prune(self):
+        store = self.make_one(max_size=100)
+        for i, key in enumerate(['aa01', 'bb02', 'cc03']):
+            store.set(key, b'x' * 40)
+            # The first files are the least recently written
+            os.utime(store._path(key), (i, i))
+        store.prune()
+        self.assertEqual(store.get('aa01'), None)
+        self.assertEqual(store.get('bb02'), b'x' * 40)
+        self.assertEqual(store.get('cc03'), b'x' * 40)
+
+    def test_prune_on_set(self):
+        store = self.make_one(max_size=100)
+        with mock.patch.object(store, 'prune') as prune:
+            store.set('aa01', b'x' * 5)
+            self.assertFalse(prune.called)
+            store.set('bb02', b'x' * 6)
+            self.assertTrue(prune.called)
+
+
+class JsonSpliceTestCase(unittest.TestCase):
+
+    def call_target(self, *args, **kwargs):
+        from ..utils import json_splice
+        return json_splice(*args, **kwargs)
+
+    def test_splice(self):
+        import json
+        text = self.call_target({'title': u'Book'},
+                                tree='{"id": "abc", "contents": []}')
+        self.assertEqual(json.loads(text), {
+            u'title': u'Book', u'tree': {u'id': u'abc', u'contents': []}})
+
+    def test_empty(self):
+        self.assertEqual(self.call_target({}, tree='null'), '{"tree": null}')
+        self.assertEqual(self.call_target({'a': 1}), '{"a": 1}')
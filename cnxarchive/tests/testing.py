@@ -16,6 +16,7 @@ from uuid import uuid4
 import memcache
 import pytz
 import psycopg2
+import psycopg2.extensions
 import psycopg2.extras
 from psycopg2.extras import DictCursor
 from pyramid.paster import get_appsettings
@@ -351,6 +352,52 @@ class FakePlpyPlan(object):
                         raise
 
 
+class FakeCursor(object):
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        pass
+
+    def execute(self, *args):
+        if self.connection.broken:
+            raise psycopg2.OperationalError('server closed the connection')
+
+    def fetchone(self):
+        return self.connection.row
+
+
+class FakeConnection(object):
+    """Stands in for a psycopg2 connection to ``dsn``, where statements
+    fetch the given ``row``, or fail like a lost connection when the
+    connection is ``broken``.
+    """
+
+    def __init__(self, dsn, row=None, broken=False):
+        self.dsn = dsn
+        self.row = row
+        self.broken = broken
+        self.closed = 0
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+        self.rollbacks = 0
+
+    def cursor(self):
+        return FakeCursor(self)
+
+    def get_transaction_status(self):
+        return self.status
+
+    def rollback(self):
+        self.rollbacks += 1
+        self.status = psycopg2.extensions.TRANSACTION_STATUS_IDLE
+
+    def close(self):
+        self.closed = 1
+
+
 class FunctionalTestCase(unittest.TestCase):
     @classmethod
     def setUpClass(cls):
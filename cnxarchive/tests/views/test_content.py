@@ -18,6 +18,7 @@ except ImportError:
 from pyramid import httpexceptions
 from pyramid import testing as pyramid_testing
 from pyramid.encode import url_quote
+from pyramid.response import Response
 from pyramid.traversal import PATH_SAFE
 
 from ...utils import IdentHashShortId, IdentHashMissingVersion
@@ -1444,3 +1445,62 @@ INSERT INTO trees (nodeid, parent_id, title, childorder, is_collated, slug)
         self.assertEqual(resp.cache_control.no_cache, "*")
         self.assertEqual(resp.cache_control.no_store, True)
         self.assertEqual(resp.cache_control.must_revalidate, True)
+
+    def test_content_not_modified(self):
+        uuid = 'e79ffde3-7fb4-4af3-9ec8-df648b391597'
+        version = '7.1'
+
+        # Build the environment
+        self.request.matchdict = {
+            'ident_hash': '{}@{}'.format(uuid, version),
+        }
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'content'
+
+        # Call the view
+        from ...views.content import get_content
+        etag = get_content(self.request).etag
+        self.assertTrue(etag)
+
+        # The HTML representation has another ETag
+        self.request.matchdict['ext'] = '.html'
+        self.request.response = Response()
+        self.assertNotEqual(get_content(self.request).etag, etag)
+
+        # A client that has the content gets a 304
+        # without the tree being looked up.
+        del self.request.matchdict['ext']
+        self.request.headers['If-None-Match'] = '"{}"'.format(etag)
+        with mock.patch('cnxarchive.views.content.get_tree_json') as get_tree:
+            with self.assertRaises(httpexceptions.HTTPNotModified) as cm:
+                get_content(self.request)
+        self.assertFalse(get_tree.called)
+        self.assertEqual(cm.exception.headers['ETag'], '"{}"'.format(etag))
+
+    def test_content_compressed(self):
+        uuid = 'e79ffde3-7fb4-4af3-9ec8-df648b391597'
+        version = '7.1'
+
+        # Build the environment
+        self.request.matchdict = {
+            'ident_hash': '{}@{}'.format(uuid, version),
+        }
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'content'
+
+        # Call the view
+        from ...views.content import get_content
+        resp = get_content(self.request)
+        body, etag = resp.body, resp.etag
+        self.assertEqual(resp.content_encoding, None)
+        self.assertEqual(resp.vary, ('Accept-Encoding',))
+
+        self.request.headers['Accept-Encoding'] = 'gzip'
+        self.request.response = Response()
+        resp = get_content(self.request)
+        self.assertEqual(resp.content_encoding, 'gzip')
+        self.assertNotEqual(resp.etag, etag)
+        import gzip
+        import io
+        self.assertEqual(
+            gzip.GzipFile(fileobj=io.BytesIO(resp.body)).read(), body)
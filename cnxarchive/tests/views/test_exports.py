@@ -17,6 +17,7 @@ except ImportError:
 
 from pyramid import httpexceptions
 from pyramid import testing as pyramid_testing
+from pyramid.response import Response
 
 from ...utils import IdentHashMissingVersion
 from .. import testing
@@ -211,6 +212,99 @@ class GetExportFileTestCase(unittest.TestCase):
             " - m55321-1.4.complete.zip\n"
             " - m55321-1.4.zip")
 
+    def test_export_index(self):
+        from pyramid.threadlocal import get_current_registry
+        from cnxarchive.health import ExportIndex
+        index = ExportIndex(self.export_dirs, interval=3600)
+        self.addCleanup(index.stop)
+        get_current_registry().exports_monitor = index
+
+        id, version = '<id>', '<version>'
+        filename = '{}@{}.zip'.format(id, version)
+        filepath = os.path.join(self.export_dirs[-1], filename)
+        with open(filepath, 'w') as fb:
+            fb.write('mittens')
+        for dir in self.export_dirs:
+            os.utime(dir, (0, 0))
+        index.refresh()
+
+        export_file_info = self.target(self.cursor, id, version, 'zip',
+                                       self.export_dirs, read_file=False)
+        self.assertEqual(export_file_info[2:5], (7, '<datetime>', 'good'))
+
+        # Files are looked up in the index, not on disk.
+        os.remove(filepath)
+        export_file_info = self.target(self.cursor, id, version, 'zip',
+                                       self.export_dirs, read_file=False)
+        self.assertEqual(export_file_info[4], 'good')
+
+        index.refresh()
+        export_file_info = self.target(self.cursor, id, version, 'zip',
+                                       self.export_dirs, read_file=False)
+        self.assertEqual(export_file_info[4], 'missing')
+
+    def call_open_file(self, id, version, type):
+        """Call the target with ``open_file`` and return the result
+        with the files opened along the way.
+        """
+        from cnxarchive.views.exports import get_export_files
+        opened = []
+
+        def tracking_open(*args):
+            file = open(*args)
+            opened.append(file)
+            return file
+        with mock.patch('cnxarchive.views.exports.open', tracking_open,
+                        create=True):
+            export_file_info = get_export_files(
+                self.cursor, id, version, [type], self.export_dirs,
+                open_file=True)[0]
+        return export_file_info, opened
+
+    def test_open_file(self):
+        id, version = '<id>', '<version>'
+        filepath = os.path.join(self.export_dirs[-1],
+                                '{}@{}.zip'.format(id, version))
+        with open(filepath, 'w') as fb:
+            fb.write('mittens')
+
+        export_file_info, opened = self.call_open_file(id, version, 'zip')
+        file = export_file_info[5]
+        self.addCleanup(file.close)
+        self.assertEqual(export_file_info[2:5], (7, '<datetime>', 'good'))
+        self.assertEqual(file.read(), 'mittens')
+
+    @mock.patch('cnxarchive.views.exports.logger', mock.Mock())
+    def test_open_file_closed_when_fstat_fails(self):
+        id, version = '<id>', '<version>'
+        filepath = os.path.join(self.export_dirs[-1],
+                                '{}@{}.zip'.format(id, version))
+        with open(filepath, 'w') as fb:
+            fb.write('mittens')
+
+        with mock.patch('cnxarchive.views.exports.os.fstat',
+                        side_effect=OSError):
+            export_file_info, opened = self.call_open_file(id, version,
+                                                           'zip')
+        self.assertEqual(export_file_info[4], 'missing')
+        self.assertTrue(opened)
+        self.assertTrue(all([file.closed for file in opened]))
+
+    @mock.patch('cnxarchive.views.exports.logger', mock.Mock())
+    def test_open_legacy_file_closed_when_link_fails(self):
+        id, version = '<id>', '<version>'
+        filename = '{}-{}.complete.zip'.format(self.legacy_id,
+                                               self.legacy_version)
+        with open(os.path.join(self.export_dirs[-1], filename), 'w') as fb:
+            fb.write('mittens')
+
+        with mock.patch('cnxarchive.views.exports.os.link',
+                        side_effect=OSError):
+            export_file_info, opened = self.call_open_file(id, version,
+                                                           'zip')
+        self.assertEqual(export_file_info[4], 'missing')
+        self.assertTrue(all([file.closed for file in opened]))
+
     # https://github.com/Connexions/cnx-archive/issues/420
     def test_finding_file_with_multiple_suffix(self):
         # Create the export file
@@ -361,6 +455,74 @@ class ExportsViewsTestCase(unittest.TestCase):
         with open(expected_file, 'r') as file:
             self.assertEqual(export, file.read())
 
+    def test_exports_range(self):
+        # Test a resumed download of part of an export file.
+        id = 'e79ffde3-7fb4-4af3-9ec8-df648b391597'
+        version = '7.1'
+        ident_hash = '{}@{}'.format(id, version)
+        filename = "{}@{}.zip".format(id, version)
+
+        # Build the request.
+        self.request.matchdict = {'ident_hash': ident_hash,
+                                  'type': 'zip',
+                                  }
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'export'
+
+        from ...views.exports import get_export
+        response = get_export(self.request)
+
+        from webob import Request
+        range_request = Request.blank('/', range='bytes=10-19',
+                                      if_range=response.last_modified)
+        partial = range_request.get_response(response)
+
+        expected_file = os.path.join(testing.DATA_DIRECTORY, 'exports',
+                                     filename)
+        with open(expected_file, 'rb') as file:
+            expected = file.read()
+        self.assertEqual(partial.status_int, 206)
+        self.assertEqual(partial.content_range.start, 10)
+        self.assertEqual(partial.content_range.stop, 20)
+        self.assertEqual(partial.content_range.length, len(expected))
+        self.assertEqual(partial.body, expected[10:20])
+
+    def test_exports_offload(self):
+        # Test handing the export file off to the front web server.
+        id = 'e79ffde3-7fb4-4af3-9ec8-df648b391597'
+        version = '7.1'
+        ident_hash = '{}@{}'.format(id, version)
+        filepath = os.path.join(testing.DATA_DIRECTORY, 'exports',
+                                '{}@{}.zip'.format(id, version))
+
+        # Build the request.
+        self.request.matchdict = {'ident_hash': ident_hash,
+                                  'type': 'zip',
+                                  }
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'export'
+        settings = self.request.registry.settings
+        settings['exports-offload'] = 'x-accel-redirect'
+        settings['exports-offload-prefix'] = '/_exports'
+
+        from ...views.exports import get_export
+        response = get_export(self.request)
+        self.assertEqual(response.headers['X-Accel-Redirect'],
+                         '/_exports{}'.format(os.path.abspath(filepath)))
+        self.assertEqual(response.body, b'')
+        self.assertEqual(response.content_type, 'application/zip')
+        self.assertEqual(response.content_disposition,
+                         "attachment; filename=college-physics-{ver}.zip;"
+                         " filename*=UTF-8''college-physics-{ver}.zip"
+                         .format(ver=version))
+
+        settings['exports-offload'] = 'x-sendfile'
+        self.request.response = Response()
+        response = get_export(self.request)
+        self.assertEqual(response.headers['X-Sendfile'],
+                         os.path.abspath(filepath))
+        self.assertNotIn('X-Accel-Redirect', response.headers)
+
     def test_exports_type_not_supported(self):
         # Build the request
         self.request.matchdict = {
@@ -86,6 +86,76 @@ class ResourcesViewsTestCase(unittest.TestCase):
 
         self.assertEqual(self.request.response.content_type, 'image/png')
 
+    def test_resources_streamed(self):
+        # Test the retrieval of a resource larger than a chunk.
+        hash = '075500ad9f71890a85fe3f7a4137ac08e2b7907c'
+        self.request.registry.settings['resource-chunk-size'] = '100'
+
+        # Build the request.
+        self.request.matchdict = {'hash': hash}
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'resource'
+
+        # Call the view.
+        from ...views.resource import get_resource
+        response = get_resource(self.request)
+        chunks = list(response.app_iter)
+
+        self.assertTrue(len(chunks) > 1)
+        self.assertTrue(all([len(chunk) <= 100 for chunk in chunks]))
+        self.assertEqual(len(b''.join(chunks)), response.content_length)
+        self.assertEqual(b''.join(chunks)[:8], b'\x89PNG\r\n\x1a\n')
+        self.assertEqual(response.content_type, 'image/png')
+
+    def test_resources_range(self):
+        # Test a resumed download of part of a streamed resource.
+        hash = '075500ad9f71890a85fe3f7a4137ac08e2b7907c'
+        self.request.registry.settings['resource-chunk-size'] = '100'
+
+        # Build the request.
+        self.request.matchdict = {'hash': hash}
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'resource'
+
+        # Call the view.
+        from ...views.resource import get_resource
+        response = get_resource(self.request)
+        size = response.content_length
+
+        from webob import Request
+        range_request = Request.blank('/', range='bytes=150-',
+                                      if_range='"{}"'.format(hash))
+        partial = range_request.get_response(response)
+
+        self.assertEqual(partial.status_int, 206)
+        self.assertEqual(partial.content_range.start, 150)
+        self.assertEqual(partial.content_range.stop, size)
+        self.assertEqual(len(partial.body), size - 150)
+
+        # A changed validator gets the whole file.
+        range_request = Request.blank('/', range='bytes=150-',
+                                      if_range='"other"')
+        response = get_resource(self.request)
+        self.assertEqual(range_request.get_response(response).status_int,
+                         200)
+
+    def test_resources_not_modified(self):
+        hash = '075500ad9f71890a85fe3f7a4137ac08e2b7907c'
+
+        # Build the request.
+        self.request.matchdict = {'hash': hash}
+        self.request.matched_route = mock.Mock()
+        self.request.matched_route.name = 'resource'
+        self.request.headers['If-None-Match'] = '"{}"'.format(hash)
+
+        # Call the view.
+        from ...views.resource import get_resource
+        with mock.patch('cnxarchive.views.resource.db_cursor') as cursor:
+            response = get_resource(self.request)
+        self.assertFalse(cursor.called)
+        self.assertEqual(response.status_int, 304)
+        self.assertEqual(response.etag, hash)
+
     def test_resources_404(self):
         hash = 'invalid-hash'
 
@@ -98,3 +168,67 @@ class ResourcesViewsTestCase(unittest.TestCase):
         from ...views.resource import get_resource
         self.assertRaises(httpexceptions.HTTPNotFound, get_resource,
                           self.request)
+
+
+@mock.patch('cnxarchive.views.resource.is_replica_connection',
+            mock.Mock(return_value=True))
+class ReplicaResourceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.config = pyramid_testing.setUp(settings={})
+        self.addCleanup(pyramid_testing.tearDown)
+        self.request = pyramid_testing.DummyRequest()
+        self.request.matchdict = {'hash': 'missing-hash'}
+
+    def call_target(self, lag):
+        from ...views.resource import get_resource
+        with mock.patch('cnxarchive.views.resource.db_cursor') as db_cursor, \
+                mock.patch('cnxarchive.views.resource.execute_sql'), \
+                mock.patch('cnxarchive.views.resource.replication_lag',
+                           return_value=lag):
+            cursor = db_cursor.return_value.__enter__.return_value
+            cursor.fetchone.return_value = None
+            return get_resource(self.request)
+
+    def test_missing(self):
+        # A replica that's caught up answers for the primary.
+        self.assertRaises(httpexceptions.HTTPNotFound, self.call_target, 0)
+
+    def test_missing_on_lagging_replica(self):
+        from ...database import StaleReplicaRead
+        self.assertRaises(StaleReplicaRead, self.call_target, 2.5)
+
+
+class ResourceIterTestCase(unittest.TestCase):
+
+    @mock.patch('cnxarchive.views.resource.execute_sql')
+    @mock.patch('cnxarchive.views.resource.db_connect')
+    def test_connection_returned_between_chunks(self, db_connect,
+                                                execute_sql):
+        # A slow client doesn't hold on to a connection while it's
+        # being sent a chunk.
+        checked_out = []
+        db_connection = mock.MagicMock()
+        cursor = db_connection.cursor.return_value.__enter__.return_value
+        cursor.fetchone.return_value = (b'x' * 100,)
+
+        class Connect(object):
+
+            def __init__(self, **kwargs):
+                pass
+
+            def __enter__(self):
+                checked_out.append(db_connection)
+                return db_connection
+
+            def __exit__(self, *exc_info):
+                checked_out.remove(db_connection)
+
+        db_connect.side_effect = Connect
+
+        from ...views.resource import ResourceIter
+        chunks = 0
+        for chunk in ResourceIter(None, 1, 250, 100):
+            self.assertEqual(checked_out, [])
+            chunks += 1
+        self.assertEqual(chunks, 3)
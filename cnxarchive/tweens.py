@@ -1,5 +1,10 @@
+import datetime
 from collections import Sequence
 
+from pyramid.response import Response
+
+from .database import StaleReplicaRead
+
 
 # https://docs.pylonsproject.org/projects/pyramid-cookbook/en/latest/views/conditional_http.html
 def conditional_http_tween_factory(handler, registry):
@@ -23,3 +28,53 @@ def conditional_http_tween_factory(handler, registry):
 
         return response
     return conditional_http_tween
+
+
+def replica_fallback_tween_factory(handler, registry):
+    """Retry a request on the primary database when it read content that
+    is still being processed from a (possibly lagging) read replica.
+    """
+    if getattr(registry, 'db_replicas', None) is None:
+        return handler
+
+    def replica_fallback_tween(request):
+        try:
+            return handler(request)
+        except StaleReplicaRead:
+            # The replica connection is released by its finished callback.
+            request.db_primary = True
+            request.exception = request.exc_info = None
+            # Start over with the request's reified attributes
+            for name in ('db_connection', 'db_cursor', 'response',):
+                request.__dict__.pop(name, None)
+            return handler(request)
+    return replica_fallback_tween
+
+
+def response_cache_tween_factory(handler, registry):
+    """Answer requests from the response cache, if there is one, and
+    cache the responses it allows (see ``cnxarchive.response_cache``).
+    """
+    cache = getattr(registry, 'response_cache', None)
+    if cache is None:
+        return handler
+
+    def response_cache_tween(request):
+        key = cache.key(request)
+        if key is None:
+            return handler(request)
+        cached = cache.get(key)
+        if cached is None:
+            response = handler(request)
+            cache.set(key, response)
+            return response
+        status, headerlist, body = cached
+        response = Response(status=status, headerlist=list(headerlist),
+                            body=body)
+        max_age = response.cache_control.max_age
+        if max_age is not None:
+            response.expires = datetime.timedelta(seconds=int(max_age))
+        # This tween is above the conditional HTTP tween.
+        response.conditional_response = True
+        return response
+    return response_cache_tween
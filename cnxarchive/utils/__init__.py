@@ -15,3 +15,5 @@ from .mimetype import *  # noqa
 from .text import *  # noqa
 from .json import *  # noqa
 from .safe import safe_stat  # noqa
+from .lru import LRUCache  # noqa
+from .directory import DirectoryStore, private_directory  # noqa
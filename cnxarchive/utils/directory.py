@@ -0,0 +1,127 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""Data kept in files of a private directory, shared by processes."""
+import errno
+import logging
+import os
+import stat
+import tempfile
+
+
+__all__ = ('DirectoryStore', 'private_directory',)
+
+
+logger = logging.getLogger('cnxarchive')
+
+
+def private_directory(path):
+    """Create the directory ``path`` accessible only to the current user,
+    unless it exists, and return it.
+
+    Raises ValueError when the directory is owned by, or writable by,
+    another user, since anyone who can write to it controls its data.
+    """
+    try:
+        os.makedirs(path, 0o700)
+    except OSError as exc:
+        if exc.errno != errno.EEXIST:
+            raise
+    stats = os.lstat(path)
+    if not stat.S_ISDIR(stats.st_mode):
+        raise ValueError("'{}' is not a directory".format(path))
+    if stats.st_uid != os.getuid():
+        raise ValueError("directory '{}' is owned by another user"
+                         .format(path))
+    if stats.st_mode & (stat.S_IWGRP | stat.S_IWOTH):
+        raise ValueError("directory '{}' is writable by other users"
+                         .format(path))
+    return path
+
+
+class DirectoryStore(object):
+    """Keeps data in files under the private ``directory``, one per key,
+    where keys are hexadecimal digests.
+
+    The files take up to about ``max_size`` bytes. Once a tenth of that
+    was written by the process, the least recently written files are
+    removed to make room.
+    """
+
+    def __init__(self, directory, max_size):
+        self.directory = private_directory(directory)
+        self.max_size = max_size
+        self._written = 0
+
+    def _path(self, key):
+        return os.path.join(self.directory, key[:2], key)
+
+    def open(self, key):
+        """Return the file of ``key`` open for reading, or None."""
+        try:
+            return open(self._path(key), 'rb')
+        except EnvironmentError:
+            return None
+
+    def get(self, key):
+        """Return the data of ``key``, or None."""
+        f = self.open(key)
+        if f is None:
+            return None
+        with f:
+            return f.read()
+
+    def set(self, key, data):
+        """Store ``data`` under ``key``, which readers see all at once."""
+        path = self._path(key)
+        dir = os.path.dirname(path)
+        try:
+            if not os.path.isdir(dir):
+                os.mkdir(dir, 0o700)
+            # Write to a temporary file first so that readers never
+            # see a partial file.
+            fd, tmp_path = tempfile.mkstemp(dir=dir)
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.rename(tmp_path, path)
+        except EnvironmentError as exc:
+            logger.warning("Could not store data in '{}': {}"
+                           .format(self.directory, exc))
+            return
+        self._written += len(data)
+        if self._written * 10 > self.max_size:
+            self.prune()
+
+    def delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except EnvironmentError:
+            pass
+
+    def prune(self):
+        """Remove the least recently written files until the rest take
+        at most ``max_size`` bytes.
+        """
+        self._written = 0
+        files = []
+        for dirpath, dirnames, filenames in os.walk(self.directory):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    stats = os.stat(path)
+                except EnvironmentError:
+                    continue
+                files.append((stats.st_mtime, stats.st_size, path,))
+        size = sum([file_size for mtime, file_size, path in files])
+        for mtime, file_size, path in sorted(files):
+            if size <= self.max_size:
+                break
+            try:
+                os.remove(path)
+            except EnvironmentError:
+                continue
+            size -= file_size
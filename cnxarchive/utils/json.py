@@ -1,9 +1,30 @@
+from __future__ import absolute_import
+
+import json
 from datetime import date, datetime
 
 
+__all__ = ('json_serial', 'json_splice',)
+
+
 def json_serial(obj):
     """JSON serializer for objects not serializable by default json code"""
 
     if isinstance(obj, (datetime, date)):
         return obj.isoformat()
     raise TypeError("Type %s not serializable" % type(obj))
+
+
+def json_splice(obj, **encoded):
+    """Serialize the dictionary ``obj`` to JSON, adding the keyword
+    arguments, which are values that have already been encoded to JSON,
+    without decoding them.
+    """
+    text = json.dumps(obj, default=json_serial)
+    if not encoded:
+        return text
+    members = ', '.join(['{}: {}'.format(json.dumps(key), value)
+                         for key, value in sorted(encoded.items())])
+    if text == '{}':
+        return '{' + members + '}'
+    return text[:-1] + ', ' + members + '}'
@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+# ###
+# Copyright (c) 2026, Rice University
+# This software is subject to the provisions of the GNU Affero General
+# Public License version 3 (AGPLv3).
+# See LICENCE.txt for details.
+# ###
+"""In-process least recently used cache."""
+import collections
+import threading
+
+
+__all__ = ('LRUCache',)
+
+
+class LRUCache(object):
+    """A thread-safe least recently used cache bounded by the total size
+    of its values (as measured by ``sizeof`` or given to ``set``)
+    rather than their number.
+
+    Values larger than ``max_size`` are not cached.
+    """
+
+    def __init__(self, max_size, sizeof=len):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self._lock = threading.Lock()
+        # {key: (value, size)} in least to most recently used order
+        self._items = collections.OrderedDict()
+        self._size = 0
+        self._counts = dict.fromkeys(('hits', 'misses', 'evictions',), 0)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, size = self._items.pop(key)
+            except KeyError:
+                self._counts['misses'] += 1
+                return default
+            # Re-insert as the most recently used
+            self._items[key] = (value, size)
+            self._counts['hits'] += 1
+            return value
+
+    def set(self, key, value, size=None):
+        if size is None:
+            size = self.sizeof(value)
+        with self._lock:
+            self._discard(key)
+            if size > self.max_size:
+                return
+            self._items[key] = (value, size)
+            self._size += size
+            while self._size > self.max_size:
+                oldest = next(iter(self._items))
+                self._discard(oldest)
+                self._counts['evictions'] += 1
+
+    def delete(self, key):
+        with self._lock:
+            self._discard(key)
+
+    def delete_matching(self, predicate):
+        """Delete the entries whose key satisfies ``predicate``."""
+        with self._lock:
+            for key in [key for key in self._items if predicate(key)]:
+                self._discard(key)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self._size = 0
+
+    def _discard(self, key):
+        try:
+            value, size = self._items.pop(key)
+        except KeyError:
+            return
+        self._size -= size
+
+    def stats(self):
+        """Return a dictionary of cache statistics."""
+        with self._lock:
+            stats = dict(self._counts)
+            stats.update({
+                'entries': len(self._items),
+                'size': self._size,
+                'max_size': self.max_size,
+                })
+        return stats
@@ -6,23 +6,20 @@ from logging import getLogger
 
 logger = getLogger('safestat')
 
-safe_stat_process = None
-
 
 def safe_stat(path, timeout=1, cmd=None):
     "Use threads and a subproc to bodge a timeout on top of filesystem access"
-    global safe_stat_process
-
     if cmd is None:
         cmd = ['/usr/bin/stat']
-
-    cmd.append(path)
+    # Don't modify the caller's list
+    cmd = list(cmd) + [path]
+    processes = []
 
     def target():
-        global safe_stat_process
         logger.debug('Stat thread started')
-        safe_stat_process = subprocess.Popen(cmd, stdout=PIPE, stderr=PIPE)
-        _results = safe_stat_process.communicate()  # noqa
+        process = subprocess.Popen(cmd, stdout=PIPE, stderr=PIPE)
+        processes.append(process)
+        _results = process.communicate()  # noqa
         logger.debug('Stat thread finished')
 
     thread = threading.Thread(target=target)
@@ -31,6 +28,7 @@ def safe_stat(path, timeout=1, cmd=None):
     thread.join(timeout)
 
     if thread.is_alive():  # stat took longer than timeout
-        safe_stat_process.terminate()
+        if processes:
+            processes[0].terminate()
         thread.join()
-    return safe_stat_process.returncode == 0
+    return bool(processes) and processes[0].returncode == 0
@@ -6,29 +6,30 @@
 # See LICENCE.txt for details.
 # ###
 """Content Views."""
+import hashlib
 import json
 import logging
 import re
 
-import psycopg2.extras
-
-from cnxepub.models import flatten_tree_to_ident_hashes
 from lxml import etree
 from pyramid import httpexceptions
 from pyramid.settings import asbool
 from pyramid.threadlocal import get_current_registry, get_current_request
 from pyramid.view import view_config
+from webob.etag import ETagMatcher
 
+from ..compression import compress_response, negotiate_encoding
 from ..database import (
-    SQL, get_tree, get_collated_content, get_module_can_publish, db_connect)
+    SQL, get_tree, get_tree_json, get_tree_index, get_collated_content,
+    check_replica_state, db_cursor)
 from ..utils import (
     COLLECTION_MIMETYPE,
     IdentHashShortId, IdentHashMissingVersion,
     join_ident_hash, split_ident_hash,
-    json_serial,
+    json_serial, json_splice, portaltype_to_mimetype,
     )
 from .helpers import (
-    get_uuid, get_latest_version, get_head_version, get_content_metadata
+    get_uuid, get_latest_version, get_content_metadata
     )
 from .exports import get_export_files
 
@@ -40,6 +41,11 @@ HTML_WRAPPER = """\
 
 logger = logging.getLogger('cnxarchive')
 
+# state 1 = current, state 8 = fallback
+CACHEABLE_STATEIDS = (1, 8,)
+# The Cache-Control of content in a cacheable state, see ``get_content``
+CACHE_CONTROL = 'max-age=31536000, public'
+
 # #################### #
 #   Helper functions   #
 # #################### #
@@ -52,8 +58,41 @@ def tree_to_html(tree):
     return HTML_WRAPPER.format(etree.tostring(ul))
 
 
-def _get_content_json(ident_hash=None):
-    """Return a content as a dict from its ident-hash (uuid@version)."""
+def content_etag(metadata, *variant):
+    """Return an ETag for a representation of the content described by
+    ``metadata``, derived from the content's identity, its state and when
+    it was baked rather than from the response body.
+    The ``variant`` tells apart the representations of the content.
+    """
+    key = [metadata['id'], metadata['version'], metadata['stateid'],
+           metadata.get('baked')]
+    key.extend(variant)
+    return hashlib.sha1(json.dumps(key)).hexdigest()
+
+
+def check_not_modified(request, etag):
+    """Raise HTTPNotModified if the client already has the ``etag``
+    representation of a cacheable content.
+    """
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match and etag in ETagMatcher.parse(if_none_match):
+        raise httpexceptions.HTTPNotModified(headers=[
+            ('ETag', '"{}"'.format(etag)),
+            ('Cache-Control', CACHE_CONTROL),
+            ('Vary', 'Accept-Encoding'),
+            ])
+
+
+def _get_content_json(ident_hash=None, raw_tree=False, etag_variant=None):
+    """Return a content as a dict from its ident-hash (uuid@version).
+
+    With ``raw_tree``, a collection's tree is given as JSON text rather
+    than decoded, unless it is needed to find a page in the collection.
+
+    With ``etag_variant``, the response's ETag is set from the content's
+    identity and a conditional request for content the client already
+    has is answered with a 304 before the content itself is looked up.
+    """
     request = get_current_request()
     routing_args = request and request.matchdict or {}
     if not ident_hash:
@@ -75,82 +114,95 @@ def _get_content_json(ident_hash=None):
 
     id, version = split_ident_hash(ident_hash, containing=p_id)
 
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
+    with db_cursor() as cursor:
+        result = get_content_metadata(id, version, cursor)
+        if etag_variant is not None:
+            etag = content_etag(result, page_ident_hash, as_collated,
+                                etag_variant, negotiate_encoding(request))
+            if result['stateid'] in CACHEABLE_STATEIDS:
+                check_not_modified(request, etag)
+            request.response.etag = etag
+        # Build url for canonical link header
+        result['canon_url'] = get_canonical_url(result, request)
+
+        if result['mediaType'] == COLLECTION_MIMETYPE:
+            # Grab the collection tree.
+            if raw_tree and not page_ident_hash:
+                _get_tree = get_tree_json
+            else:
+                _get_tree = get_tree
+            result['tree'] = _get_tree(ident_hash, cursor,
+                                       as_collated=as_collated)
+            result['collated'] = as_collated
+            if not result['tree']:
+                # If collated tree is not available, get the uncollated
+                # tree.
+                result['tree'] = _get_tree(ident_hash, cursor)
+                result['collated'] = False
+
+            if page_ident_hash:
+                tree_index = get_tree_index(ident_hash, result['tree'],
+                                            as_collated=result['collated'])
+                id_ = tree_index.find(p_id, p_version)
+                if id_ is None:
+                    raise httpexceptions.HTTPNotFound()
+                id, version = split_ident_hash(id_)
+                content = None
+                if as_collated:
+                    content = get_collated_content(id_, ident_hash, cursor)
+                if content:
+                    result = get_content_metadata(id, version, cursor)
+                    # Build url for canonical link header
+                    result['canon_url'] = get_canonical_url(result, request)
+                    result['content'] = content[:]
+                    return result
+                # 302 'cause lack of baked content may be temporary
+                raise httpexceptions.HTTPFound(request.route_path(
+                    request.matched_route.name,
+                    _query=request.params,
+                    ident_hash=join_ident_hash(id, version),
+                    ext=routing_args['ext']),
+                    headers=[("Cache-Control", "max-age=60, public")])
+        else:
             result = get_content_metadata(id, version, cursor)
             # Build url for canonical link header
             result['canon_url'] = get_canonical_url(result, request)
-
-            if result['mediaType'] == COLLECTION_MIMETYPE:
-                # Grab the collection tree.
-                result['tree'] = get_tree(ident_hash, cursor,
-                                          as_collated=as_collated)
-                result['collated'] = as_collated
-                if not result['tree']:
-                    # If collated tree is not available, get the uncollated
-                    # tree.
-                    result['tree'] = get_tree(ident_hash, cursor)
-                    result['collated'] = False
-
-                if page_ident_hash:
-                    for id_ in flatten_tree_to_ident_hashes(result['tree']):
-                        id, version = split_ident_hash(id_)
-                        if id == p_id and (
-                           version == p_version or not p_version):
-                            content = None
-                            if as_collated:
-                                content = get_collated_content(
-                                    id_, ident_hash, cursor)
-                            if content:
-                                result = get_content_metadata(
-                                    id, version, cursor)
-                                # Build url for canonical link header
-                                result['canon_url'] = (
-                                        get_canonical_url(result, request))
-                                result['content'] = content[:]
-                                return result
-                            # 302 'cause lack of baked content may be temporary
-                            raise httpexceptions.HTTPFound(request.route_path(
-                                request.matched_route.name,
-                                _query=request.params,
-                                ident_hash=join_ident_hash(id, version),
-                                ext=routing_args['ext']),
-                                headers=[("Cache-Control",
-                                          "max-age=60, public")])
-                    raise httpexceptions.HTTPNotFound()
-            else:
-                result = get_content_metadata(id, version, cursor)
-                # Build url for canonical link header
-                result['canon_url'] = get_canonical_url(result, request)
-                # Grab the html content.
-                args = dict(id=id, version=result['version'],
-                            filename='index.cnxml.html')
-                cursor.execute(SQL['get-resource-by-filename'], args)
-                try:
-                    content = cursor.fetchone()[0]
-                except (TypeError, IndexError,):  # None returned
-                    logger.debug("module found, but "
-                                 "'index.cnxml.html' is missing.")
-                    raise httpexceptions.HTTPNotFound()
-                result['content'] = content[:]
+            # Grab the html content.
+            args = dict(id=id, version=result['version'],
+                        filename='index.cnxml.html')
+            cursor.execute(SQL['get-resource-by-filename'], args)
+            try:
+                content = cursor.fetchone()[0]
+            except (TypeError, IndexError,):  # None returned
+                logger.debug("module found, but "
+                             "'index.cnxml.html' is missing.")
+                raise httpexceptions.HTTPNotFound()
+            result['content'] = content[:]
 
     return result
 
 
 def get_content_json(request):
     """Retrieve content as JSON using the ident-hash (uuid@version)."""
-    result = _get_content_json()
+    result = _get_content_json(raw_tree=True, etag_variant='json')
+    # The tree is spliced into the response as it came from the database.
+    encoded = {}
+    if isinstance(result.get('tree'), basestring):
+        encoded['tree'] = result.pop('tree')
+    body = json_splice(result, **encoded)
+    if isinstance(body, unicode):
+        body = body.encode('utf-8')
 
     resp = request.response
     resp.status = "200 OK"
     resp.content_type = 'application/json'
-    resp.body = json.dumps(result)
+    resp.body = body
     return result, resp
 
 
 def get_content_html(request):
     """Retrieve content as HTML using the ident-hash (uuid@version)."""
-    result = _get_content_json()
+    result = _get_content_json(etag_variant='html')
 
     media_type = result['mediaType']
     if media_type == COLLECTION_MIMETYPE:
@@ -204,31 +256,8 @@ def html_listify(tree, root_ul_element, parent_id=None):
             html_listify(node['contents'], elm, parent_id)
 
 
-def is_latest(id, version):
-    """Determine if this is the latest version of this content."""
-    return get_latest_version(id) == version
-
-
-def get_state(cursor, id, version):
-    """Determine the state of the content."""
-    args = join_ident_hash(id, version)
-    sql_statement = """
-    SELECT ms.statename
-    FROM modules as m
-    JOIN modulestates as ms
-    ON m.stateid=ms.stateid
-    WHERE ident_hash(uuid, major_version, minor_version) = %s
-    """
-
-    cursor.execute(sql_statement, vars=(args,))
-    res = cursor.fetchone()
-    if res is None:
-        return None
-    else:
-        return res[0]
-
-
-def get_export_allowable_types(cursor, exports_dirs, id, version):
+def get_export_allowable_types(cursor, exports_dirs, id, version,
+                               metadata=None):
     """Return export types."""
     request = get_current_request()
     type_settings = request.registry.settings['_type_info']
@@ -237,7 +266,8 @@ def get_export_allowable_types(cursor, exports_dirs, id, version):
     # We took the type_names directly from the setting this function uses to
     # check for valid types, so it should never raise an ExportError here
     file_tuples = get_export_files(cursor, id, version, type_names,
-                                   exports_dirs, read_file=False)
+                                   exports_dirs, read_file=False,
+                                   metadata=metadata)
     type_settings = dict(type_settings)
     for filename, mimetype, file_size, file_created, state, file_content \
             in file_tuples:
@@ -256,87 +286,28 @@ def get_export_allowable_types(cursor, exports_dirs, id, version):
             }
 
 
-# NOTE: Expects both a normal cursor and a RealDictCursor
-def get_book_info(cursor, real_dict_cursor, book_id,
-                  book_version, page_id, page_version):
-    """Return information about a given book.
+def get_content_extras(cursor, id, version,
+                       context_id=None, context_version=None):
+    """Return the uncacheable information about a module / collection.
 
-    Return the book's title, id, shortId, authors and revised date.
-    Raise HTTPNotFound if the page is not in the book.
+    This is the metadata, latest and head versions, publishers, state and
+    containing books of the content gathered in a single query.
+    Raise HTTPNotFound if the content does not exist
+    or if the page is not in the given context book.
     """
-    book_ident_hash = join_ident_hash(book_id, book_version)
-    page_ident_hash = join_ident_hash(page_id, page_version)
-    tree = get_tree(book_ident_hash, cursor)
-
-    # Check if the page appears in the book tree
-    if not tree or page_ident_hash not in flatten_tree_to_ident_hashes(tree):
+    args = dict(id=id, version=version,
+                context_id=context_id, context_version=context_version)
+    cursor.execute(SQL['get-content-extras'], args)
+    extras = cursor.fetchone()[0]
+    if extras['metadata'] is None or extras['latestVersion'] is None:
+        raise httpexceptions.HTTPNotFound()
+    if context_id and not extras['books']:
         # Return a 404 error if the page is not actually in the book tree
         raise httpexceptions.HTTPNotFound()
-
-    sql_statement = """
-    SELECT m.name as title,
-           ident_hash(m.uuid, m.major_version, m.minor_version)
-           as ident_hash,
-           short_ident_hash(m.uuid, m.major_version, m.minor_version)
-           as shortId, ARRAY(
-               SELECT row_to_json(user_row)
-               FROM (
-                   SELECT u.username, u.first_name as firstname,
-                        u.last_name as surname, u.full_name as fullname,
-                        u.title, u.suffix
-               ) as user_row
-           ) as authors,
-           m.revised
-    FROM modules m
-    JOIN users as u on u.username = ANY(m.authors)
-    WHERE ident_hash(m.uuid, m.major_version, m.minor_version) = %s
-    """
-    real_dict_cursor.execute(sql_statement, vars=(book_ident_hash,))
-    return real_dict_cursor.fetchone()
-
-
-# NOTE: Expects a normal cursor
-def get_portal_type(cursor, id, version):
-    """Return the module's portal_type."""
-    args = join_ident_hash(id, version)
-    sql_statement = """
-    SELECT m.portal_type
-    FROM modules as m
-    WHERE ident_hash(uuid, major_version, minor_version) = %s
-    """
-
-    cursor.execute(sql_statement, vars=(args,))
-    res = cursor.fetchone()
-    if res is None:
-        return None
-    else:
-        return res[0]
-
-
-def get_books_containing_page(cursor, uuid, version,
-                              context_uuid=None, context_version=None):
-    """Return a list of book names and UUIDs
-    that contain a given module UUID."""
-    with db_connect() as db_connection:
-        # Uses a RealDictCursor instead of the regular cursor
-        with db_connection.cursor(
-                    cursor_factory=psycopg2.extras.RealDictCursor
-                ) as real_dict_cursor:
-            # In the future the books-containing-page SQL might handle
-            # all of these cases. For now we branch the code out in here.
-            if context_uuid and context_version:
-                return [get_book_info(cursor, real_dict_cursor, context_uuid,
-                                      context_version, uuid, version)]
-            else:
-                portal_type = get_portal_type(cursor, uuid, version)
-                if portal_type == 'Module':
-                    real_dict_cursor.execute(SQL['get-books-containing-page'],
-                                             {'document_uuid': uuid,
-                                              'document_version': version})
-                    return real_dict_cursor.fetchall()
-                else:
-                    # Books are currently not in any other book
-                    return []
+    metadata = extras['metadata']
+    check_replica_state(cursor, metadata['stateid'])
+    metadata['mediaType'] = portaltype_to_mimetype(metadata['mediaType'])
+    return extras
 
 
 def get_canonical_url(metadata, request):
@@ -371,7 +342,8 @@ def get_canonical_url(metadata, request):
 def get_content(request):
     """Retrieve content using the ident-hash (uuid@version).
 
-    Depending on extension or HTTP_ACCEPT header return HTML or JSON.
+    Depending on extension or HTTP_ACCEPT header return HTML or JSON,
+    compressed depending on the Accept-Encoding header.
     """
     ext = request.matchdict.get('ext')
     accept = request.headers.get('ACCEPT', '')
@@ -387,8 +359,7 @@ def get_content(request):
     else:
         raise httpexceptions.HTTPNotFound()
 
-    if result['stateid'] not in [1, 8]:
-        # state 1 = current, state 8 = fallback
+    if result['stateid'] not in CACHEABLE_STATEIDS:
         cc = resp.cache_control
         cc.prevent_auto = True
         cc.no_cache = True
@@ -401,6 +372,14 @@ def get_content(request):
     resp.headerlist.append(
             ('Link', '<{}> ;rel="Canonical"'.format(result['canon_url'])))
 
+    # Content in a cacheable state doesn't change (its ETag would),
+    # so it's compressed once.
+    if result['stateid'] in CACHEABLE_STATEIDS:
+        key = resp.etag
+    else:
+        key = None
+    compress_response(resp, negotiate_encoding(request), key=key)
+
     return resp
 
 
@@ -426,21 +405,15 @@ def get_extra(request):
     else:
         context_id = context_version = None
         id, version = split_ident_hash(args['ident_hash'])
-    results = {}
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            results['downloads'] = \
-                list(get_export_allowable_types(cursor, exports_dirs,
-                                                id, version))
-            results['isLatest'] = is_latest(id, version)
-            results['latestVersion'] = get_latest_version(id)
-            results['headVersion'] = get_head_version(id)
-            results['canPublish'] = get_module_can_publish(cursor, id)
-            results['state'] = get_state(cursor, id, version)
-            results['books'] = get_books_containing_page(cursor, id, version,
-                                                         context_id,
-                                                         context_version)
-            formatAuthors(results['books'])
+    with db_cursor() as cursor:
+        results = get_content_extras(cursor, id, version,
+                                     context_id, context_version)
+        metadata = results.pop('metadata')
+        results['downloads'] = \
+            list(get_export_allowable_types(cursor, exports_dirs,
+                                            id, version, metadata=metadata))
+        results['isLatest'] = results['latestVersion'] == version
+        formatAuthors(results['books'])
 
     resp = request.response
     resp.content_type = 'application/json'
@@ -13,14 +13,19 @@ import urllib
 from pyramid import httpexceptions
 from pyramid.threadlocal import get_current_registry, get_current_request
 from pyramid.view import view_config
+from webob.static import FileIter
 
 from .. import config
-from ..database import db_connect
+from ..database import db_cursor
+from ..health import ExportIndex
 from ..utils import (
     slugify, fromtimestamp, split_ident_hash, safe_stat, MODULE_MIMETYPE,
     )
 from .helpers import get_content_metadata
 
+X_ACCEL_REDIRECT = 'x-accel-redirect'
+X_SENDFILE = 'x-sendfile'
+
 LEGACY_EXTENSION_MAP = {
     'epub': ['epub'],
     'pdf': ['pdf'],
@@ -48,25 +53,30 @@ class ExportError(Exception):
 @view_config(route_name='export', request_method='GET',
              http_cache=(60, {'public': True}))
 def get_export(request):
-    """Retrieve an export file."""
+    """Retrieve an export file.
+
+    The file is streamed from disk and ``Range`` requests are answered
+    with only the requested bytes, so interrupted downloads can resume.
+    With the ``exports-offload`` setting the front web server is told
+    to send the file instead (see ``offload_export``).
+    """
     settings = get_current_registry().settings
     exports_dirs = settings['exports-directories'].split()
     args = request.matchdict
     ident_hash, type = args['ident_hash'], args['type']
     id, version = split_ident_hash(ident_hash)
 
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            try:
-                results = get_export_files(cursor, id, version, [type],
-                                           exports_dirs, read_file=True)
-                if not results:
-                    raise httpexceptions.HTTPNotFound()
-                filename, mimetype, size, modtime, state, file_content \
-                    = results[0]
-            except ExportError as e:
-                logger.debug(str(e))
+    with db_cursor() as cursor:
+        try:
+            results = get_export_files(cursor, id, version, [type],
+                                       exports_dirs, open_file=True)
+            if not results:
                 raise httpexceptions.HTTPNotFound()
+            filename, mimetype, size, modtime, state, file_content \
+                = results[0]
+        except ExportError as e:
+            logger.debug(str(e))
+            raise httpexceptions.HTTPNotFound()
 
     if state == 'missing':
         raise httpexceptions.HTTPNotFound()
@@ -80,7 +90,21 @@ def get_export(request):
     resp.content_disposition = "attachment; filename={fname};" \
                                " filename*=UTF-8''{fname}".format(
                                        fname=encoded_filename)
-    resp.body = file_content
+    resp.last_modified = modtime
+    offload = settings.get(config.EXPORTS_OFFLOAD)
+    if offload:
+        offload_export(resp, file_content, offload,
+                       settings.get(config.EXPORTS_OFFLOAD_PREFIX, ''))
+    else:
+        file_wrapper = request.environ.get('wsgi.file_wrapper')
+        if file_wrapper is not None and 'Range' not in request.headers:
+            # Let the server send the file, e.g. with sendfile(2)
+            resp.app_iter = file_wrapper(file_content)
+        else:
+            resp.app_iter = FileIter(file_content)
+        resp.content_length = size
+        resp.accept_ranges = 'bytes'
+        resp.conditional_response = True
     #  Remove version and extension from filename, to recover title slug
     slug_title = '-'.join(encoded_filename.split('-')[:-1])
     resp.headerlist.append(
@@ -89,15 +113,62 @@ def get_export(request):
     return resp
 
 
-def get_export_files(cursor, id, version, types, exports_dirs, read_file=True):
-    """Retrieve files associated with document."""
+def offload_export(response, file, offload, prefix=''):
+    """Have the front web server send the export ``file``.
+
+    For ``x-accel-redirect`` the file's absolute path is appended to the
+    internal location ``prefix``; for ``x-sendfile`` the path is used as is.
+    """
+    path = os.path.abspath(file.name)
+    file.close()
+    if offload == X_ACCEL_REDIRECT:
+        response.headers['X-Accel-Redirect'] = prefix + urllib.quote(path)
+    elif offload == X_SENDFILE:
+        response.headers['X-Sendfile'] = path
+    else:
+        raise ValueError("unknown exports offload '{}'".format(offload))
+    # The web server supplies the body (and its length). An empty app_iter
+    # also keeps an ETag from being computed for the empty body.
+    response.app_iter = []
+    response.content_length = None
+
+
+def _open_export(filepath):
+    """Open the export file at ``filepath`` and return the open file
+    with its ``os.fstat`` result.
+    """
+    file = open(filepath, 'rb')
+    try:
+        return file, os.fstat(file.fileno())
+    except EnvironmentError:
+        file.close()
+        raise
+
+
+def get_export_files(cursor, id, version, types, exports_dirs, read_file=True,
+                     metadata=None, open_file=False):
+    """Retrieve files associated with document.
+
+    The document's ``metadata`` is looked up unless the caller already has it.
+    With ``open_file`` an open file object, which the caller must close,
+    is returned instead of the file's contents.
+    """
     request = get_current_request()
     type_info = dict(request.registry.settings['_type_info'])
-    metadata = get_content_metadata(id, version, cursor)
+    if metadata is None:
+        metadata = get_content_metadata(id, version, cursor)
     legacy_id = metadata['legacy_id']
     legacy_version = metadata['legacy_version']
 
-    reachable_dirs = [dir for dir in exports_dirs if safe_stat(dir)]
+    monitor = getattr(request.registry, 'exports_monitor', None)
+    if monitor is not None:
+        reachable = monitor.reachable
+        reachable_dirs = [dir for dir in exports_dirs if dir in reachable]
+    else:
+        reachable_dirs = [dir for dir in exports_dirs if safe_stat(dir)]
+    # Look for files in the export index rather than on disk, if there is one
+    index = monitor if isinstance(monitor, ExportIndex) else None
+    stat = os.stat if index is None else index.stat
 
     # 1 result per type, in the same order as the given types
     results = []
@@ -124,12 +195,16 @@ def get_export_files(cursor, id, version, types, exports_dirs, read_file=True):
         for dir in reachable_dirs:
             filepath = os.path.join(dir, filename)
             try:
-                if read_file:
+                if index is not None:
+                    index.stat(filepath)  # fails for files known to be missing
+                if open_file:
+                    contents, stats = _open_export(filepath)
+                elif read_file:
                     with open(filepath, 'r') as file:
                         stats = os.fstat(file.fileno())
                         contents = file.read()
                 else:
-                    stats = os.stat(filepath)
+                    stats = stat(filepath)
                     contents = None
                 modtime = fromtimestamp(int(stats.st_mtime))
                 results.append((slugify_title_filename, mimetype,
@@ -146,15 +221,23 @@ def get_export_files(cursor, id, version, types, exports_dirs, read_file=True):
                                     for fn in legacy_filenames]
                 for legacy_filepath in legacy_filepaths:
                     try:
-                        if read_file:
+                        if index is not None:
+                            index.stat(legacy_filepath)
+                        # Link first, so that no file is left open
+                        # when linking fails.
+                        os.link(legacy_filepath, filepath)
+                        if open_file:
+                            contents, stats = _open_export(legacy_filepath)
+                        elif read_file:
                             with open(legacy_filepath, 'r') as file:
                                 stats = os.fstat(file.fileno())
                                 contents = file.read()
                         else:
-                            stats = os.stat(legacy_filepath)
+                            stats = stat(legacy_filepath)
                             contents = None
                         modtime = fromtimestamp(stats.st_mtime)
-                        os.link(legacy_filepath, filepath)
+                        if index is not None:
+                            index.add(filepath, stats)
                         results.append((slugify_title_filename, mimetype,
                                         stats.st_size, modtime, 'good',
                                         contents))
@@ -6,16 +6,26 @@
 # See LICENCE.txt for details.
 # ###
 """Helpers Used in Multiple Views."""
+import json
 import logging
+import time
 
 from pyramid import httpexceptions
+from pyramid.threadlocal import get_current_registry
 
-from ..database import SQL, db_connect
+from ..database import (
+    CURRENT_STATEID, SQL, check_replica_state, db_connect, db_cursor,
+    execute_sql, get_content_cache,
+    )
 
 from ..utils import portaltype_to_mimetype
 
 logger = logging.getLogger('cnxarchive')
 
+# The number of seconds the latest version of a content is cached, in case
+# a change notification is missed
+LATEST_VERSION_EXPIRATION = 300
+
 
 # #################### #
 #   Helper functions   #
@@ -23,54 +33,77 @@ logger = logging.getLogger('cnxarchive')
 
 
 def get_uuid(shortid):
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            cursor.execute(SQL['get-module-uuid'], {'id': shortid})
-            try:
-                return cursor.fetchone()[0]
-            except (TypeError, IndexError,):  # None returned
-                logger.debug("Short ID was supplied and could not discover "
-                             "UUID.")
-                raise httpexceptions.HTTPNotFound()
+    with db_cursor() as cursor:
+        cursor.execute(SQL['get-module-uuid'], {'id': shortid})
+        try:
+            return cursor.fetchone()[0]
+        except (TypeError, IndexError,):  # None returned
+            logger.debug("Short ID was supplied and could not discover "
+                         "UUID.")
+            raise httpexceptions.HTTPNotFound()
+
+
+def _fetch_version(cursor):
+    try:
+        return cursor.fetchone()[0]
+    except (TypeError, IndexError,):  # None returned
+        raise httpexceptions.HTTPNotFound()
 
 
 def get_latest_version(uuid_, containing=None):
+    if containing is not None:
+        with db_cursor() as cursor:
+            cursor.execute(SQL['get-book-latest-version-with-page'],
+                           {'id': uuid_, 'p_id': containing})
+            return _fetch_version(cursor)
+
+    cache = get_content_cache(invalidated=True)
+    if cache is None:
+        with db_cursor() as cursor:
+            execute_sql(cursor, 'get-module-latest-version', {'id': uuid_})
+            return _fetch_version(cursor)
+
+    cache_key = ('latest', uuid_,)
+    cached = cache.get(cache_key)
+    if cached is not None and cached[0] > time.time():
+        return cached[1]
+    listener = get_current_registry().cache_invalidation
+    generation = listener.generation(uuid_)
+    # Read from the primary, where the change notifications come from,
+    # since a replica may not have the change that evicted the version yet.
     with db_connect() as db_connection:
         with db_connection.cursor() as cursor:
-            if containing is None:
-                cursor.execute(SQL['get-module-latest-version'], {'id': uuid_})
-            else:
-                cursor.execute(SQL['get-book-latest-version-with-page'],
-                               {'id': uuid_, 'p_id': containing})
-            try:
-                return cursor.fetchone()[0]
-            except (TypeError, IndexError,):  # None returned
-                raise httpexceptions.HTTPNotFound()
-
-
-def get_head_version(uuid_):
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            cursor.execute(SQL['get-module-head-version'], {'id': uuid_})
-            try:
-                return cursor.fetchone()[0]
-            except (TypeError, IndexError,):  # None returned
-                raise httpexceptions.HTTPNotFound()
+            execute_sql(cursor, 'get-module-latest-version', {'id': uuid_})
+            version = _fetch_version(cursor)
+    # Unless it changed (again) while being read
+    if listener.generation(uuid_) == generation:
+        cache.set(cache_key, (time.time() + LATEST_VERSION_EXPIRATION,
+                              version,),
+                  size=len(version))
+    return version
 
 
 def get_content_metadata(id, version, cursor):
     """Return metadata related to the content from the database."""
+    cache = get_content_cache()
+    cache_key = ('metadata', id, version,)
+    if cache is not None:
+        cached = cache.get(cache_key)
+        if cached is not None:
+            return json.loads(cached)
+
     # Do the module lookup
     args = dict(id=id, version=version)
     # FIXME We are doing two queries here that can hopefully be
     #       condensed into one.
-    cursor.execute(SQL['get-module-metadata'], args)
+    execute_sql(cursor, 'get-module-metadata', args)
     try:
         result = cursor.fetchone()[0]
         # version is what we want to return, but in the sql we're using
         # current_version because otherwise there's a "column reference is
         # ambiguous" error
         result['version'] = result.pop('current_version')
+        check_replica_state(cursor, result['stateid'])
 
         # FIXME We currently have legacy 'portal_type' names in the database.
         #       Future upgrades should replace the portal type with a mimetype
@@ -78,6 +111,8 @@ def get_content_metadata(id, version, cursor):
         #       Until then we will do the replacement here.
         result['mediaType'] = portaltype_to_mimetype(result['mediaType'])
 
+        if cache is not None and result['stateid'] == CURRENT_STATEID:
+            cache.set(cache_key, json.dumps(result))
         return result
     except (TypeError, IndexError,):  # None returned
         raise httpexceptions.HTTPNotFound()
@@ -8,13 +8,12 @@
 """Legacy Redirect Views."""
 import logging
 
-from cnxepub.models import flatten_tree_to_ident_hashes
 from pyramid import httpexceptions
 from pyramid.threadlocal import get_current_registry
 from pyramid.view import view_config
 
 from .. import config
-from ..database import SQL, db_connect
+from ..database import SQL, db_cursor, get_tree_index
 from ..utils import (
     join_ident_hash, split_legacy_hash
     )
@@ -30,10 +29,12 @@ logger = logging.getLogger('cnxarchive')
 def _get_page_in_book(page_uuid, page_version, book_uuid,
                       book_version, latest=False):
     book_ident_hash = join_ident_hash(book_uuid, book_version)
-    coltree = _get_content_json(ident_hash=book_ident_hash)['tree']
+    book = _get_content_json(ident_hash=book_ident_hash)
+    coltree = book['tree']
     if coltree is None:
         raise httpexceptions.HTTPNotFound()
-    pages = list(flatten_tree_to_ident_hashes(coltree))
+    pages = get_tree_index(book_ident_hash, coltree,
+                           as_collated=book['collated'])
     page_ident_hash = join_ident_hash(page_uuid, page_version)
     if page_ident_hash in pages:
         return book_uuid, '{}:{}'.format(
@@ -43,19 +44,18 @@ def _get_page_in_book(page_uuid, page_version, book_uuid,
 
 
 def _convert_legacy_id(objid, objver=None):
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            if objver:
-                args = dict(objid=objid, objver=objver)
-                cursor.execute(SQL['get-content-from-legacy-id-ver'], args)
-            else:
-                cursor.execute(SQL['get-content-from-legacy-id'],
-                               dict(objid=objid))
-            try:
-                id, version = cursor.fetchone()
-                return (id, version)
-            except TypeError:  # None returned
-                return (None, None)
+    with db_cursor() as cursor:
+        if objver:
+            args = dict(objid=objid, objver=objver)
+            cursor.execute(SQL['get-content-from-legacy-id-ver'], args)
+        else:
+            cursor.execute(SQL['get-content-from-legacy-id'],
+                           dict(objid=objid))
+        try:
+            id, version = cursor.fetchone()
+            return (id, version)
+        except TypeError:  # None returned
+            return (None, None)
 
 
 # ######### #
@@ -90,20 +90,19 @@ def redirect_legacy_content(request):
     # legacy collection versions don't include the minor version,
     # so the latest archive url could change
     if filename:
-        with db_connect() as db_connection:
-            with db_connection.cursor() as cursor:
-                args = dict(id=id, version=version, filename=filename)
-                cursor.execute(SQL['get-resourceid-by-filename'], args)
-                try:
-                    res = cursor.fetchone()
-                    resourceid = res[0]
-
-                    raise httpexceptions.HTTPMovedPermanently(
-                         request.route_path('resource', hash=resourceid,
-                                            ignore=u'/{}'.format(filename)),
-                         headers=[("Cache-Control", "max-age=60, public")])
-                except TypeError:  # None returned
-                    raise httpexceptions.HTTPNotFound()
+        with db_cursor() as cursor:
+            args = dict(id=id, version=version, filename=filename)
+            cursor.execute(SQL['get-resourceid-by-filename'], args)
+            try:
+                res = cursor.fetchone()
+                resourceid = res[0]
+
+                raise httpexceptions.HTTPMovedPermanently(
+                     request.route_path('resource', hash=resourceid,
+                                        ignore=u'/{}'.format(filename)),
+                     headers=[("Cache-Control", "max-age=60, public")])
+            except TypeError:  # None returned
+                raise httpexceptions.HTTPNotFound()
 
     ident_hash = join_ident_hash(id, version)
     params = request.params
@@ -11,17 +11,60 @@ import logging
 from pyramid import httpexceptions
 from pyramid.threadlocal import get_current_registry
 from pyramid.view import view_config
+from webob.etag import ETagMatcher
 
 from .. import config
-from ..database import SQL, db_connect
+from ..compression import compress_response, negotiate_encoding
+from ..database import StaleReplicaRead, db_connect, db_cursor, execute_sql
+from ..replicas import is_replica_connection, replication_lag
 
 logger = logging.getLogger('cnxarchive')
 
+DEFAULT_CHUNK_SIZE = 1024 * 1024  # bytes
+
 # #################### #
 #   Helper functions   #
 # #################### #
 
 
+class ResourceIter(object):
+    """Iterate over the data of the file ``fileid`` in ``chunk_size`` pieces,
+    optionally limited to the bytes from ``start`` up to ``stop``.
+
+    Each piece is read with its own (pooled) connection, because the
+    request's connection is released before the response is sent and
+    a slow client shouldn't hold on to a connection. The pieces are read
+    from a read replica with ``replica``, when the file was found on one.
+    """
+
+    def __init__(self, registry, fileid, size, chunk_size,
+                 start=0, stop=None, replica=False):
+        self.registry = registry
+        self.fileid = fileid
+        self.size = size
+        self.chunk_size = chunk_size
+        self.start = start
+        self.stop = size if stop is None else min(stop, size)
+        self.replica = replica
+
+    def __iter__(self):
+        for offset in range(self.start, self.stop, self.chunk_size):
+            with db_connect(registry=self.registry,
+                            replica=self.replica) as db_connection:
+                with db_connection.cursor() as cursor:
+                    args = dict(fileid=self.fileid, offset=offset,
+                                size=min(self.chunk_size, self.stop - offset))
+                    execute_sql(cursor, 'get-resource-chunk', args)
+                    chunk = cursor.fetchone()[0][:]
+            # The connection is returned before the chunk is sent.
+            yield chunk
+
+    def app_iter_range(self, start, stop):
+        """Used by WebOb to answer ``Range`` requests."""
+        return self.__class__(self.registry, self.fileid, self.size,
+                              self.chunk_size, start, stop, self.replica)
+
+
 # ######### #
 #   Views   #
 # ######### #
@@ -30,21 +73,67 @@ logger = logging.getLogger('cnxarchive')
 @view_config(route_name='resource', request_method='GET',
              http_cache=(31536000, {'public': True}))
 def get_resource(request):
-    """Retrieve a file's data."""
+    """Retrieve a file's data.
+
+    Files larger than the ``resource-chunk-size`` setting are streamed,
+    smaller ones that compress well are sent compressed when the client
+    accepts it. ``Range`` requests are answered with only the requested
+    bytes.
+    """
     hash = request.matchdict['hash']
+    encoding = negotiate_encoding(request)
+    # The hash identifies the file's contents, making it a strong ETag,
+    # which is suffixed with the encoding of a compressed variant.
+    etags = [hash]
+    if encoding is not None:
+        etags.append('{}-{}'.format(hash, encoding))
+    # A client that has the file is answered without a database lookup.
+    resp = request.response
+    if_none_match = request.headers.get('If-None-Match')
+    if if_none_match:
+        matcher = ETagMatcher.parse(if_none_match)
+        for etag in etags:
+            if etag in matcher:
+                resp.status = "304 Not Modified"
+                resp.etag = etag
+                if etag != hash:
+                    resp.vary = ('Accept-Encoding',)
+                return resp
+
+    settings = request.registry.settings
+    chunk_size = int(settings.get(config.RESOURCE_CHUNK_SIZE,
+                                  DEFAULT_CHUNK_SIZE))
 
     # Do the file lookup
-    with db_connect() as db_connection:
-        with db_connection.cursor() as cursor:
-            args = dict(hash=hash)
-            cursor.execute(SQL['get-resource'], args)
-            try:
-                mimetype, file = cursor.fetchone()
-            except TypeError:  # None returned
-                raise httpexceptions.HTTPNotFound()
+    with db_cursor() as cursor:
+        args = dict(hash=hash, max_size=chunk_size)
+        execute_sql(cursor, 'get-resource-info', args)
+        row = cursor.fetchone()
+        from_replica = is_replica_connection(cursor.connection)
+        # The file may not have been replicated yet, but only a replica
+        # that's behind is left to the primary to answer.
+        stale = (row is None and from_replica and
+                 replication_lag(cursor.connection) > 0)
+    if stale:
+        raise StaleReplicaRead()
+    if row is None:
+        raise httpexceptions.HTTPNotFound()
+    fileid, mimetype, size, file = row
+    if size is None:  # The file's data is missing
+        raise httpexceptions.HTTPNotFound()
 
-    resp = request.response
     resp.status = "200 OK"
     resp.content_type = mimetype
-    resp.body = file[:]
+    resp.etag = hash
+    if file is not None:
+        resp.body = file[:]
+        compress_response(resp, encoding, key=hash)
+        if resp.content_encoding:
+            resp.etag = '{}-{}'.format(hash, resp.content_encoding)
+    else:
+        resp.app_iter = ResourceIter(request.registry, fileid, size,
+                                     chunk_size, replica=from_replica)
+        resp.content_length = size
+    resp.accept_ranges = 'bytes'
+    resp.conditional_response = True
     return resp
@@ -79,9 +79,9 @@ def search(request):
         resp.body = empty_response
         return resp
 
-    db_results = cache.search(
-        query, query_type,
-        nocache=params.get('nocache', '').lower() == 'true')
+    nocache = params.get('nocache', '').lower() == 'true'
+    db_results = cache.search(query, query_type, nocache=nocache)
+    cache.search_facets(db_results, nocache=nocache)
 
     authors = db_results.auxiliary['authors']
     # create a mapping for author id to index in auxiliary authors list
@@ -103,7 +103,9 @@ def search(request):
         }
     results['results'] = {'total': len(db_results), 'items': []}
 
-    for record in db_results[((page - 1) * per_page):(page * per_page)]:
+    records = cache.search_page(db_results, (page - 1) * per_page,
+                                page * per_page, nocache=nocache)
+    for record in records:
         results['results']['items'].append({
             'id': '{}@{}'.format(record['id'], record['version']),
             'mediaType': record['mediaType'],
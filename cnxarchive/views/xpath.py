@@ -5,7 +5,7 @@ from psycopg2.extras import RealDictCursor
 from pyramid import httpexceptions
 from pyramid.view import view_config
 
-from ..database import SQL, db_connect
+from ..database import SQL, db_cursor
 from ..utils import (
     IdentHashSyntaxError,
     join_ident_hash,
@@ -51,22 +51,21 @@ def lookup_documents_to_query(ident_hash, as_collated=False):
         'ident_hash': ident_hash,
         'is_collated': as_collated,
     }
-    with db_connect() as db_conn:
-        with db_conn.cursor(cursor_factory=RealDictCursor) as cursor:
-            # Lookup base information about the module
-            cursor.execute(SQL['get-core-info'], params)
-            row = cursor.fetchone()
-
-            type_ = row['type']
-
-            if 'Module' in type_:
-                results = [dict(row.items())]
-            else:
-                cursor.execute(
-                    SQL['get-book-core-info'],
-                    params,
-                )
-                results = [dict(row.items()) for row in cursor]
+    with db_cursor(cursor_factory=RealDictCursor) as cursor:
+        # Lookup base information about the module
+        cursor.execute(SQL['get-core-info'], params)
+        row = cursor.fetchone()
+
+        type_ = row['type']
+
+        if 'Module' in type_:
+            results = [dict(row.items())]
+        else:
+            cursor.execute(
+                SQL['get-book-core-info'],
+                params,
+            )
+            results = [dict(row.items()) for row in cursor]
 
     return results
 
@@ -85,10 +84,9 @@ def _xpath_query(docs, xpath, extension):
         'idents': list(docs),
         'xpath': xpath,
     }
-    with db_connect() as db_conn:
-        with db_conn.cursor() as cursor:
-            cursor.execute(SQL['query-module_files-by-xpath'], params)
-            return cursor.fetchall()
+    with db_cursor() as cursor:
+        cursor.execute(SQL['query-module_files-by-xpath'], params)
+        return cursor.fetchall()
 
 
 def _collated_xpath_query(docs, xpath, context):
@@ -105,11 +103,10 @@ def _collated_xpath_query(docs, xpath, context):
         'idents': list(docs),
         'xpath': xpath,
     }
-    with db_connect() as db_conn:
-        with db_conn.cursor() as cursor:
-            sql = SQL['query-collated_file_associations-by-xpath']
-            cursor.execute(sql, params)
-            return cursor.fetchall()
+    with db_cursor() as cursor:
+        sql = SQL['query-collated_file_associations-by-xpath']
+        cursor.execute(sql, params)
+        return cursor.fetchall()
 
 
 def query_documents_by_xpath(docs, xpath, type_=DEFAULT_DOC_TYPE,
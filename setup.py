@@ -63,6 +63,7 @@ setup(
     cnx-archive-hits_counter = cnxarchive.scripts.hits_counter:main
     cnx-archive-inject_resource = cnxarchive.scripts.inject_resource:main
     cnx-archive-export_epub = cnxarchive.scripts.export_epub.main:main
+    cnx-archive-benchmark_query_parsing = cnxarchive.scripts.benchmark_query_parsing:main
     [dbmigrator]
     migrations_directory = cnxarchive:find_migrations_directory
     """,